@@ -0,0 +1,108 @@
+"""
+Message-ID deduplication store – one row per (account, normalized Message-ID
+digest) in processed_messages, kept for DEDUP_RETENTION_DAYS.
+
+A poll only reads the digests of its candidate messages: the mail clients
+prefetch() each batch of Message-IDs with one primary-key lookup, and the
+Message-IDs it processed are written as one batched INSERT per checkpoint.
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from app.extensions import db, insert_ignore
+from app.models import ProcessedMessage
+
+logger = logging.getLogger(__name__)
+
+# Must outlast the IMAP search window (one day before the date cursor) with a
+# good margin; older messages are excluded by the date cursor anyway
+DEDUP_RETENTION_DAYS = int(os.environ.get("DEDUP_RETENTION_DAYS", "7"))
+
+# Digests per "message_hash IN (...)" query
+LOOKUP_BATCH_SIZE = 500
+
+
+def normalize_message_id(message_id: str) -> str:
+    """Canonical form of a Message-ID header: no surrounding whitespace or angle brackets, lowercased."""
+    return message_id.strip().strip("<>").strip().lower()
+
+
+def message_hash(message_id: str) -> str:
+    """Fixed-size key for *message_id* (32 hex characters)."""
+    normalized = normalize_message_id(message_id)
+    return hashlib.blake2b(normalized.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class ProcessedMessages:
+    """
+    The processed Message-IDs of one account. Supports ``message_id in store``;
+    digests are read lazily – a batch at a time through prefetch(), or one by
+    one for Message-IDs that were not prefetched. Additions are buffered until
+    flush(), which the caller commits together with the cursor.
+    """
+
+    def __init__(self, account_id: int, hashes: Iterable[str] = ()):
+        self.account_id = account_id
+        self._seen = set(hashes)
+        self._checked = set(self._seen)  # digests whose presence is known
+        self._pending: List[str] = []
+
+    def prefetch(self, message_ids: Iterable[Optional[str]]):
+        """Look up the digests of *message_ids* not checked yet, LOOKUP_BATCH_SIZE per query."""
+        digests = sorted({message_hash(mid) for mid in message_ids if mid} - self._checked)
+        for offset in range(0, len(digests), LOOKUP_BATCH_SIZE):
+            batch = digests[offset:offset + LOOKUP_BATCH_SIZE]
+            rows = db.session.query(ProcessedMessage.message_hash).filter(
+                ProcessedMessage.account_id == self.account_id,
+                ProcessedMessage.message_hash.in_(batch),
+            )
+            self._seen.update(row.message_hash for row in rows)
+            self._checked.update(batch)
+
+    def __contains__(self, message_id: Optional[str]) -> bool:
+        if not message_id:
+            return False
+        digest = message_hash(message_id)
+        if digest not in self._checked:
+            self.prefetch([message_id])
+        return digest in self._seen
+
+    def __len__(self) -> int:
+        """Processed Message-IDs known to this poll (looked up or added)."""
+        return len(self._seen)
+
+    def add(self, message_id: Optional[str]):
+        if not message_id:
+            return
+        digest = message_hash(message_id)
+        self._checked.add(digest)
+        if digest not in self._seen:
+            self._seen.add(digest)
+            self._pending.append(digest)
+
+    def flush(self) -> bool:
+        """Stage the buffered additions in the session; returns True if there were any."""
+        if not self._pending:
+            return False
+        now = datetime.now(timezone.utc)
+        insert_ignore(ProcessedMessage, [
+            {"account_id": self.account_id, "message_hash": digest, "seen_at": now}
+            for digest in self._pending
+        ])
+        self._pending.clear()
+        return True
+
+
+def forget_account(account_id: int):
+    """Drop the account's processed Message-IDs (e.g. when its cursor is reset)."""
+    ProcessedMessage.query.filter_by(account_id=account_id).delete(synchronize_session=False)
+
+
+def purge_expired() -> int:
+    """Delete entries older than DEDUP_RETENTION_DAYS; returns the number deleted."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=DEDUP_RETENTION_DAYS)
+    return ProcessedMessage.query.filter(ProcessedMessage.seen_at < cutoff).delete(synchronize_session=False)
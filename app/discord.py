@@ -1,11 +1,147 @@
-"""Discord webhook delivery."""
+"""Discord webhook delivery over pooled keep-alive HTTP sessions (one per webhook host)."""
 
 import logging
+import os
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.metrics import DISCORD_REQUEST_SECONDS, DISCORD_RESPONSES
+from app.tracing import span
 
 logger = logging.getLogger(__name__)
 
-TIMEOUT = 10  # seconds
+# Connect and read timeouts are separate: a dead host fails fast, a slow Discord response may take longer
+CONNECT_TIMEOUT = float(os.environ.get("DISCORD_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("DISCORD_READ_TIMEOUT", "10"))
+
+# Keep-alive connections kept per webhook host (should cover OUTBOX_WORKERS)
+POOL_SIZE = int(os.environ.get("DISCORD_POOL_SIZE", "10"))
+
+# Transparent retries of failed connection attempts only: a request that may
+# have reached Discord is never re-sent here (the outbox retries it instead)
+CONNECT_RETRIES = int(os.environ.get("DISCORD_CONNECT_RETRIES", "2"))
+
+# Discord limits per webhook message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+EMBED_TITLE = "📬 新着メール通知"
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _session_for(url: str) -> requests.Session:
+    """Shared, thread-safe session for the scheme://host of *url*."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = Retry(
+                total=CONNECT_RETRIES,
+                connect=CONNECT_RETRIES,
+                read=0,
+                status=0,
+                other=0,
+                backoff_factor=0.3,
+                allowed_methods=None,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount(key + "/", adapter)
+            _sessions[key] = session
+        return session
+
+
+def connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Requests sent and TCP/TLS connections opened per webhook host; the
+    difference is the number of requests that reused a kept-alive connection.
+    """
+    stats = {}
+    with _sessions_lock:
+        sessions = list(_sessions.items())
+    for key, session in sessions:
+        requests_sent = connections = 0
+        for adapter in session.adapters.values():
+            poolmanager = getattr(adapter, "poolmanager", None)
+            if poolmanager is None:
+                continue
+            for pool_key in list(poolmanager.pools.keys()):
+                pool = poolmanager.pools.get(pool_key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+        if requests_sent:
+            stats[key] = {
+                "requests": requests_sent,
+                "connections": connections,
+                "reused": max(requests_sent - connections, 0),
+            }
+    return stats
+
+
+class DiscordRateLimited(Exception):
+    """Discord answered 429; retry after *retry_after* seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def _retry_after(resp: requests.Response) -> float:
+    """Seconds to wait from a 429 response (JSON body ``retry_after`` or the Retry-After header)."""
+    try:
+        return float(resp.json()["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        return float(resp.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+
+def build_embed(rendered_message: str) -> dict:
+    """The rich embed used for one mail notification."""
+    return {
+        "title": EMBED_TITLE,
+        "color": 0x5865F2,
+        "description": rendered_message,
+    }
+
+
+def embed_size(embed: dict) -> int:
+    """Characters counted by Discord towards the per-message embed limit."""
+    return len(embed.get("title", "")) + len(embed.get("description", ""))
+
+
+@span("discord")
+def send_embeds(webhook_url: str, embeds: List[dict]) -> None:
+    """
+    Post up to MAX_EMBEDS_PER_MESSAGE embeds in a single webhook message.
+    Raises DiscordRateLimited on 429 and requests exceptions on other HTTP
+    errors so the caller can retry or log failures.
+    """
+    payload = {"embeds": embeds}
+    start = time.perf_counter()
+    try:
+        resp = _session_for(webhook_url).post(webhook_url, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except requests.RequestException:
+        DISCORD_RESPONSES.inc(status="error")
+        raise
+    finally:
+        DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - start)
+    DISCORD_RESPONSES.inc(status=resp.status_code)
+    if resp.status_code == 429:
+        raise DiscordRateLimited(_retry_after(resp))
+    resp.raise_for_status()
 
 
 def send_notification(
@@ -17,14 +153,8 @@ def send_notification(
 ) -> None:
     """
     Post a rich embed to a Discord webhook.
-    Raises on HTTP errors so the caller can log failures.
+    Raises DiscordRateLimited on 429 and requests exceptions on other HTTP
+    errors so the caller can retry or log failures.
     """
-    embed = {
-        "title": "📬 新着メール通知",
-        "color": 0x5865F2,
-        "description": rendered_message,
-    }
-    payload = {"embeds": [embed]}
-    resp = requests.post(webhook_url, json=payload, timeout=TIMEOUT)
-    resp.raise_for_status()
+    send_embeds(webhook_url, [build_embed(rendered_message)])
     logger.info("Discord notification sent for rule=%s subject=%s", rule_name, subject)
@@ -0,0 +1,144 @@
+"""
+Worker wakeups – the web routes NOTIFY the worker through PostgreSQL, and the
+worker LISTENs instead of only sleeping until its next loop.
+
+Events are hints, not messages: the worker re-reads triggers, worker_state and
+accounts from the database when woken, so a lost notification only delays a
+change until the next regular loop. On other databases (SQLite in
+development) notify_worker() does nothing and no listener is started.
+"""
+
+import logging
+import select
+import threading
+from typing import Callable, Optional, Set
+
+from sqlalchemy import text
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "mail_notifier_worker"
+
+# Event payloads
+EVENT_TRIGGER = "trigger"  # "receive now" requested for an account
+EVENT_STATE = "state"  # pause / resume / interval changed
+EVENT_ACCOUNTS = "accounts"  # account added, edited or deleted
+EVENT_RULES = "rules"  # rules, webhooks or notification formats changed
+
+# Reconnect backoff of the listener after its connection dropped
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+
+# Upper bound for one select() on the listening connection, so stop() is noticed
+LISTEN_CHECK_SECONDS = 5
+
+
+def notify_worker(event: str):
+    """
+    Wake the worker for *event*. Sent with the caller's transaction: call this
+    before committing, and nothing is delivered if the transaction rolls back.
+    """
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    db.session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": event})
+
+
+class WorkerEventListener(threading.Thread):
+    """
+    Holds a dedicated autocommit connection in LISTEN and calls
+    *on_events(payloads)* once per burst of notifications (duplicates merged).
+    """
+
+    def __init__(self, engine, on_events: Callable[[Set[str]], None]):
+        super().__init__(name="event-listener", daemon=True)
+        self._engine = engine
+        self._on_events = on_events
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = RECONNECT_MIN_SECONDS
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+                backoff = RECONNECT_MIN_SECONDS
+            except Exception as exc:
+                logger.warning("Worker event listener lost its connection: %s (retry in %ds)", exc, backoff)
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+
+    def _listen(self):
+        raw = self._engine.raw_connection()
+        try:
+            conn = raw.driver_connection  # psycopg2 connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            logger.info("Listening for worker events on channel %s", CHANNEL)
+            # Changes made while not listening are only seen by the next regular loop
+            self._on_events({EVENT_STATE})
+
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([conn], [], [], LISTEN_CHECK_SECONDS)
+                if not readable:
+                    continue
+                conn.poll()
+                payloads = set()
+                while conn.notifies:
+                    payloads.add(conn.notifies.pop(0).payload)
+                if payloads:
+                    logger.debug("Worker events: %s", ", ".join(sorted(payloads)))
+                    self._on_events(payloads)
+        finally:
+            try:
+                raw.invalidate()  # never hand a LISTENing connection back to the pool
+            except Exception:
+                pass
+
+
+class WorkerEvents:
+    """Events received by the listener, collected until the worker's main loop takes them."""
+
+    def __init__(self, on_wake: Callable[[], None] = None):
+        self._on_wake = on_wake
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._listener: Optional[WorkerEventListener] = None
+
+    def start(self, engine) -> bool:
+        """Start listening if the database supports LISTEN/NOTIFY; returns True if it does."""
+        if engine.dialect.name != "postgresql":
+            logger.info("Database does not support LISTEN/NOTIFY – worker changes are picked up by polling")
+            return False
+        self._listener = WorkerEventListener(engine, self.put)
+        self._listener.start()
+        return True
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener.join()
+            self._listener = None
+
+    def put(self, payloads: Set[str]):
+        with self._lock:
+            self._pending |= payloads
+        self._event.set()
+        if self._on_wake is not None:
+            self._on_wake()
+
+    def take(self) -> Set[str]:
+        """Return and clear the events received since the last call."""
+        with self._lock:
+            payloads, self._pending = self._pending, set()
+            self._event.clear()
+        return payloads
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to *timeout* seconds for an event; returns True if one arrived."""
+        return self._event.wait(max(timeout, 0))
@@ -1,5 +1,21 @@
+from typing import List
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
 db = SQLAlchemy()
 migrate = Migrate()
+
+
+def insert_ignore(model, rows: List[dict]):
+    """INSERT *rows* into *model*'s table, silently skipping unique-key conflicts."""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"insert_ignore is not supported on {dialect}")
+    db.session.execute(insert(model.__table__).values(rows).on_conflict_do_nothing())
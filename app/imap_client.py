@@ -1,16 +1,50 @@
-"""IMAP helper – fetch new messages from a mailbox using INTERNALDATE-based cursor."""
+"""IMAP helper – stream new messages from one or more mailboxes using UID and INTERNALDATE-based cursors."""
 
 import email
 import email.header
+import email.parser
 import email.utils
+import heapq
 import imaplib
 import logging
+import os
+import re
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Iterator, Optional
+from typing import TYPE_CHECKING, Container, Dict, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.metrics import DEDUP_SKIPPED, current_account, fetch_phase
+from app.tracing import span
+
+if TYPE_CHECKING:
+    from app.imap_pool import ImapConnectionPool
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of UIDs requested by a single UID FETCH command
+FETCH_BATCH_SIZE = int(os.environ.get("IMAP_FETCH_BATCH_SIZE", "200"))
+
+# Headers read into MailMessage – the only ones rule conditions (From/To/Subject),
+# notification templates (From/Subject/Date), deduplication (Message-ID) and the
+# INTERNALDATE fallback (Date) ever look at. Everything else is never downloaded.
+HEADER_FIELDS = ("From", "To", "Subject", "Date", "Message-ID")
+FETCH_ITEMS = f"(UID INTERNALDATE BODY.PEEK[HEADER.FIELDS ({' '.join(HEADER_FIELDS).upper()})])"
+
+# First-pass items when already-processed Message-IDs are skipped before fetching headers
+DATE_ITEMS = "(UID INTERNALDATE)"
+DATE_AND_MESSAGE_ID_ITEMS = "(UID INTERNALDATE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])"
+# ...and the Date header of the few messages the server gave no INTERNALDATE for
+DATE_HEADER_ITEMS = "(UID BODY.PEEK[HEADER.FIELDS (DATE)])"
+
+_HEADER_FIELD_NAMES = {name.lower().encode("ascii") for name in HEADER_FIELDS}
+_HEADER_PARSER = email.parser.BytesHeaderParser()
+
+_UID_RE = re.compile(r"\bUID (\d+)")
+_INTERNALDATE_RE = re.compile(r'INTERNALDATE "([^"]+)"')
+_STATUS_ITEM_RE = re.compile(r"([A-Za-z]+) (\d+)")
+
 
 @dataclass
 class MailMessage:
@@ -21,6 +55,30 @@ class MailMessage:
     date: str
     message_id: str
     internal_date: datetime  # INTERNALDATE from IMAP server (UTC)
+    mailbox: Optional[str] = None  # IMAP folder the message was found in
+
+
+@dataclass
+class MailboxCursor:
+    """
+    UID high-water mark for a mailbox.
+    *last_uid* is only meaningful while the server reports the same *uidvalidity*.
+    fetch_new_messages() updates all fields in place.
+    """
+    uidvalidity: int = 0
+    last_uid: int = 0
+    # Mailbox STATUS as of the last complete poll; unchanged values mean nothing is new
+    uidnext: int = 0
+    messages: int = 0
+    highestmodseq: int = 0
+
+
+@dataclass
+class MailboxPoll:
+    """One folder to poll with fetch_mailboxes(), with its own cursors."""
+    name: str
+    last_processed_date: Optional[datetime]  # None: initialization mode, nothing is fetched
+    uid_cursor: Optional[MailboxCursor] = None
 
 
 def decode_header_value(raw: str) -> str:
@@ -37,6 +95,28 @@ def decode_header_value(raw: str) -> str:
     return "".join(decoded)
 
 
+def trim_headers(raw_header: bytes) -> bytes:
+    """Keep only HEADER_FIELDS (with their folded continuation lines) from a raw header block."""
+    kept = []
+    keep = False
+    for line in raw_header.split(b"\n"):
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                kept.append(line)
+            continue
+        if not line.strip(b"\r"):
+            break  # end of the header block
+        keep = line.split(b":", 1)[0].strip().lower() in _HEADER_FIELD_NAMES
+        if keep:
+            kept.append(line)
+    return b"\n".join(kept) + b"\n\n"
+
+
+def parse_headers(raw_header: bytes) -> email.message.Message:
+    """Parse the HEADER_FIELDS of a raw header block (IMAP FETCH or POP3 TOP)."""
+    return _HEADER_PARSER.parsebytes(trim_headers(raw_header))
+
+
 def parse_internal_date(date_str: str) -> datetime:
     """
     Parse IMAP INTERNALDATE string to UTC datetime.
@@ -53,32 +133,87 @@ def parse_internal_date(date_str: str) -> datetime:
         return datetime.now(timezone.utc)
 
 
-def fetch_new_messages(
-    host: str,
-    port: int,
-    user: str,
-    password: str,
-    use_ssl: bool,
-    last_processed_date: Optional[datetime] = None,
-    mailbox_name: str = "INBOX",
-    ssl_mode: str = None,
-) -> Iterator[MailMessage]:
+def format_uid_set(uids) -> str:
     """
-    Connect via IMAP and fetch messages using INTERNALDATE-based cursor.
-    
-    Logic:
-    1. Search for messages since (last_processed_date - 1 day) to account for timezone drift
-    2. Fetch INTERNALDATE and headers for each message
-    3. Client-side filter: only yield messages with internal_date > last_processed_date
-    
-    Args:
-        last_processed_date: High-water mark (UTC datetime). If None, fetches nothing (initialization mode).
-        ssl_mode: "none", "starttls", or "ssl"
-    
+    Compress UIDs into an IMAP sequence set.
+    Example: [1, 2, 3, 7, 9, 10] -> "1:3,7,9:10"
+    """
+    parts = []
+    start = prev = None
+    for uid in sorted(set(uids)):
+        if start is None:
+            start = prev = uid
+        elif uid == prev + 1:
+            prev = uid
+        else:
+            parts.append(f"{start}:{prev}" if start != prev else str(start))
+            start = prev = uid
+    if start is not None:
+        parts.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(parts)
+
+
+def parse_fetch_response(msg_data) -> Dict[int, Tuple[Optional[str], Optional[bytes]]]:
+    """
+    Demultiplex a multi-message UID FETCH reply.
+
+    imaplib returns one entry per untagged FETCH response. A response that
+    carries a literal is split into a ``(metadata, literal)`` tuple followed by
+    the bytes remaining after the literal, whose position varies by server:
+        Gmail:  [(b'1 (UID 123 BODY[HEADER.FIELDS (...)] {size}', b'header data'), b' INTERNALDATE "...")']
+        Others: [(b'1 (UID 123 INTERNALDATE "..." BODY[HEADER.FIELDS (...)] {size}', b'header data'), b')']
+
     Returns:
-        Iterator of MailMessage objects sorted by INTERNALDATE
+        Mapping of UID -> (INTERNALDATE string or None, raw header bytes or None).
+        Unsolicited FETCH responses without a UID (e.g. flag updates) are ignored.
     """
+    result = {}
+    i = 0
+    while i < len(msg_data):
+        item = msg_data[i]
+        i += 1
+        if isinstance(item, tuple) and len(item) >= 2:
+            metadata, raw_header = item[0], item[1]
+            # The remainder of the response line follows the literal
+            if i < len(msg_data) and isinstance(msg_data[i], bytes):
+                metadata = metadata + b" " + msg_data[i]
+                i += 1
+        elif isinstance(item, bytes):
+            metadata, raw_header = item, None
+        else:
+            continue
+
+        metadata_str = metadata.decode("utf-8", errors="ignore")
+        uid_match = _UID_RE.search(metadata_str)
+        if not uid_match:
+            logger.debug("Ignoring FETCH response without UID: %s", metadata_str[:200])
+            continue
+
+        date_match = _INTERNALDATE_RE.search(metadata_str)
+        result[int(uid_match.group(1))] = (
+            date_match.group(1) if date_match else None,
+            raw_header,
+        )
+    return result
+
+
+def untagged_int(conn, name: str) -> Optional[int]:
+    """Pop the last integer value of an untagged response code (e.g. UIDVALIDITY) from *conn*."""
+    _, data = conn.response(name)
+    if not data or data[-1] is None:
+        return None
     try:
+        return int(data[-1])
+    except (TypeError, ValueError):
+        return None
+
+
+def connect(host: str, port: int, user: str, password: str, use_ssl: bool, ssl_mode: str = None) -> imaplib.IMAP4:
+    """
+    Open an authenticated IMAP connection.
+    ssl_mode: "none", "starttls", or "ssl" (if None, falls back to use_ssl+port logic)
+    """
+    with fetch_phase("connect"):
         # Determine connection mode
         if ssl_mode:
             if ssl_mode == "ssl":
@@ -99,130 +234,553 @@ def fetch_new_messages(
             else:
                 conn = imaplib.IMAP4(host, port)
 
+    with fetch_phase("login"):
         conn.login(user, password)
-        status, _ = conn.select(mailbox_name, readonly=True)
-        if status != "OK":
-            raise RuntimeError(f"IMAPフォルダ選択に失敗しました: {mailbox_name}")
 
-        # Initialization mode: don't fetch anything on first run
-        if last_processed_date is None:
-            logger.info("初回実行モード: メールを取得しません（カーソルを初期化してください）")
+        # Servers may advertise more (e.g. CONDSTORE) once authenticated
+        status, data = conn.capability()
+    if status == "OK" and data and data[-1]:
+        conn.capabilities = tuple(data[-1].decode("ascii", errors="ignore").upper().split())
+    return conn
+
+
+def select_mailbox(conn, mailbox_name: str) -> Tuple[Optional[int], Optional[int]]:
+    """SELECT *mailbox_name* read-only; returns (UIDVALIDITY, UIDNEXT) as reported by the server."""
+    status, _ = conn.select(mailbox_name, readonly=True)
+    if status != "OK":
+        raise RuntimeError(f"IMAPフォルダ選択に失敗しました: {mailbox_name}")
+    return untagged_int(conn, "UIDVALIDITY"), untagged_int(conn, "UIDNEXT")
+
+
+def mailbox_status(conn, mailbox_name: str) -> Optional[Dict[str, int]]:
+    """
+    Run a single STATUS command for *mailbox_name*.
+    Returns e.g. {"MESSAGES": 5, "UIDNEXT": 6, "UIDVALIDITY": 1, "HIGHESTMODSEQ": 42}
+    (HIGHESTMODSEQ only when the server supports CONDSTORE), or None on failure.
+    """
+    items = "MESSAGES UIDNEXT UIDVALIDITY"
+    if "CONDSTORE" in conn.capabilities:
+        items += " HIGHESTMODSEQ"
+    try:
+        status, data = conn.status(mailbox_name, f"({items})")
+    except conn.error as exc:
+        logger.debug("STATUS %s failed: %s", mailbox_name, exc)
+        return None
+    if status != "OK" or not data or not data[-1]:
+        return None
+    text = data[-1].decode("utf-8", errors="ignore") if isinstance(data[-1], bytes) else str(data[-1])
+    paren = text.rfind("(")
+    return {name.upper(): int(value) for name, value in _STATUS_ITEM_RE.findall(text[paren:])}
+
+
+def prefetch_seen(seen: Optional[Container[str]], message_ids: Iterable[Optional[str]]):
+    """
+    Hand a batch of *message_ids* to seen.prefetch() if *seen* has one (e.g. a
+    store backed by the database), so it can look them up together rather than
+    one ``in`` check at a time; plain containers need nothing.
+    """
+    prefetch = getattr(seen, "prefetch", None)
+    if prefetch is not None:
+        prefetch(message_ids)
+
+
+def logout(conn):
+    """Close the mailbox and log out, ignoring errors from an already broken connection."""
+    try:
+        if conn.state == "SELECTED":
             conn.close()
-            conn.logout()
-            return iter([])
+        conn.logout()
+    except Exception:
+        pass
+
+
+class MailboxSession:
+    """An authenticated IMAP connection and the mailbox currently selected on it."""
+
+    def __init__(self, conn: imaplib.IMAP4):
+        self.conn = conn
+        self.mailbox: Optional[str] = None
+        self.uidvalidity: Optional[int] = None
+        # State of the selected mailbox as of the last SELECT or changed_since_check()
+        self.uidnext: Optional[int] = None
+        self.exists: Optional[int] = None
+        self.highestmodseq: Optional[int] = None
+        self.last_used = time.monotonic()
+
+    def select(self, mailbox_name: str, force: bool = False) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Make *mailbox_name* the selected mailbox; returns (UIDVALIDITY, UIDNEXT).
+        UIDNEXT is None when the mailbox was already selected (no SELECT was
+        sent); *force* sends SELECT anyway to refresh the mailbox state.
+        """
+        if self.mailbox == mailbox_name and not force:
+            # Pick up a UIDVALIDITY change reported since the last command
+            changed = untagged_int(self.conn, "UIDVALIDITY")
+            if changed is not None:
+                self.uidvalidity = changed
+            uidnext = None
+        else:
+            self.mailbox = None
+            self.uidvalidity, uidnext = select_mailbox(self.conn, mailbox_name)
+            self.mailbox = mailbox_name
+            self.uidnext = uidnext
+            self.exists = untagged_int(self.conn, "EXISTS")
+            self.highestmodseq = untagged_int(self.conn, "HIGHESTMODSEQ")
+        # Drop EXISTS/RECENT/FLAGS updates so they don't accumulate on a long-lived connection
+        self.conn.untagged_responses.clear()
+        return self.uidvalidity, uidnext
+
+    def changed_since_check(self) -> bool:
+        """
+        NOOP on the selected mailbox; True if the server reported new, expunged
+        or renumbered messages since the last SELECT or check (EXISTS responses
+        received while fetching count too). This replaces STATUS, which RFC 3501
+        (6.3.10) says must not be used on the selected mailbox.
+        """
+        status, _ = self.conn.noop()
+        changed = status != "OK"
+        exists = untagged_int(self.conn, "EXISTS")
+        if exists is not None and exists != self.exists:
+            self.exists = exists
+            changed = True
+        _, expunged = self.conn.response("EXPUNGE")
+        if expunged and expunged[-1] is not None:
+            changed = True
+        uidvalidity = untagged_int(self.conn, "UIDVALIDITY")
+        if uidvalidity is not None and uidvalidity != self.uidvalidity:
+            self.uidvalidity = uidvalidity
+            changed = True
+        self.conn.untagged_responses.clear()
+        return changed
+
+    def status(self) -> Dict[str, int]:
+        """The selected mailbox's state as of the last SELECT, in the form mailbox_status() returns."""
+        values = {
+            "UIDVALIDITY": self.uidvalidity,
+            "UIDNEXT": self.uidnext,
+            "MESSAGES": self.exists,
+            "HIGHESTMODSEQ": self.highestmodseq,
+        }
+        return {name: value for name, value in values.items() if value is not None}
+
+
+@contextmanager
+def _open_session(host, port, user, password, use_ssl, ssl_mode, pool):
+    """Yield a MailboxSession, taken from *pool* or connected just for this call."""
+    if pool is not None:
+        key = (host, port, user, password, use_ssl, ssl_mode)
+        with pool.connection(key, lambda: connect(host, port, user, password, use_ssl, ssl_mode)) as session:
+            yield session
+        return
+
+    session = MailboxSession(connect(host, port, user, password, use_ssl, ssl_mode))
+    try:
+        yield session
+    finally:
+        logout(session.conn)
+
+
+def _mailbox_unchanged(cursor: MailboxCursor, status: Dict[str, int]) -> bool:
+    """True if STATUS matches the snapshot stored after the last complete poll."""
+    if not cursor.uidvalidity or status.get("UIDVALIDITY") != cursor.uidvalidity:
+        return False
+    if cursor.highestmodseq and status.get("HIGHESTMODSEQ"):
+        # CONDSTORE: any change to the mailbox raises HIGHESTMODSEQ
+        return status["HIGHESTMODSEQ"] == cursor.highestmodseq
+    return (
+        cursor.uidnext > 0
+        and status.get("UIDNEXT") == cursor.uidnext
+        and status.get("MESSAGES") == cursor.messages
+    )
+
+
+def _snapshot_current(cursor: MailboxCursor, session: MailboxSession) -> bool:
+    """True if the last poll of the selected mailbox completed (its STATUS snapshot is valid)."""
+    return (
+        bool(cursor.uidvalidity)
+        and cursor.uidvalidity == session.uidvalidity
+        and (cursor.uidnext > 0 or cursor.highestmodseq > 0)
+    )
+
+
+def fetch_new_messages(
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    use_ssl: bool,
+    last_processed_date: Optional[datetime] = None,
+    mailbox_name: str = "INBOX",
+    ssl_mode: str = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+    uid_cursor: Optional[MailboxCursor] = None,
+    pool: Optional["ImapConnectionPool"] = None,
+) -> Iterator[MailMessage]:
+    """
+    Connect via IMAP and stream messages using INTERNALDATE-based cursor.
+    
+    Logic:
+    0. If *uid_cursor* is given, run STATUS and return nothing when UIDNEXT/MESSAGES
+       (or HIGHESTMODSEQ with CONDSTORE) are unchanged since the last complete poll;
+       for a mailbox already selected on a pooled connection, NOOP instead and
+       return nothing when the server reported no change
+    1. If *uid_cursor* holds a UID for the current UIDVALIDITY, search "UID last_uid+1:*";
+       otherwise search for messages since (last_processed_date - 1 day) to account for timezone drift
+    2. Fetch INTERNALDATE only for the matches (the Date header where the server
+       returns none) and drop those <= last_processed_date
+    3. Fetch HEADER_FIELDS in INTERNALDATE order, *batch_size* UIDs per UID FETCH,
+       and yield each chunk before fetching the next
+    
+    This is a generator: the connection stays open while the caller processes
+    messages, and IMAP errors surface while iterating.
+    
+    Args:
+        last_processed_date: High-water mark (UTC datetime). If None, fetches nothing (initialization mode).
+        ssl_mode: "none", "starttls", or "ssl"
+        batch_size: Maximum number of UIDs per UID FETCH command
+        uid_cursor: UID high-water mark, updated in place as messages are consumed.
+            At any point between two yielded messages it only covers UIDs that were
+            already yielded (and thus handled by the caller) or skipped, so it can be
+            checkpointed mid-stream. Falls back to the INTERNALDATE search when
+            UIDVALIDITY has changed.
+        pool: Reuse an authenticated, selected connection across calls instead of
+            connecting and logging out every time.
+    
+    Yields:
+        MailMessage objects in INTERNALDATE order
+    """
+    yield from fetch_mailboxes(
+        host, port, user, password, use_ssl,
+        [MailboxPoll(mailbox_name, last_processed_date, uid_cursor)],
+        ssl_mode=ssl_mode, batch_size=batch_size, pool=pool,
+    )
+
+
+def fetch_mailboxes(
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    use_ssl: bool,
+    mailboxes: Sequence[MailboxPoll],
+    ssl_mode: str = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+    pool: Optional["ImapConnectionPool"] = None,
+    seen: Optional[Container[str]] = None,
+) -> Iterator[MailMessage]:
+    """
+    Stream new messages of several folders, one after the other, over a single
+    authenticated connection; each folder is polled as in fetch_new_messages()
+    and its messages carry its name in MailMessage.mailbox.
+
+    *seen* holds Message-IDs that are already processed. Messages found in it
+    are skipped after the INTERNALDATE pass, before their headers are fetched;
+    when the caller adds the Message-IDs it handles to *seen*, a message stored
+    in several folders (e.g. Proton Mail Bridge labels) is fetched only once.
+    If *seen* has a prefetch() method, it is called with each batch of
+    Message-IDs before they are checked.
+    """
+    try:
+        with _open_session(host, port, user, password, use_ssl, ssl_mode, pool) as session:
+            for mailbox in mailboxes:
+                yield from _poll_mailbox(session, mailbox, batch_size, seen)
+    except Exception:
+        logger.exception("IMAP fetch failed for %s@%s:%s", user, host, port)
+        raise
+
+
+def _poll_mailbox(
+    session: MailboxSession,
+    mailbox: MailboxPoll,
+    batch_size: int,
+    seen: Optional[Container[str]],
+) -> Generator[MailMessage, None, None]:
+    mailbox_name = mailbox.name
+    last_processed_date = mailbox.last_processed_date
+    uid_cursor = mailbox.uid_cursor
+
+    # Initialization mode: don't fetch anything on first run
+    if last_processed_date is None:
+        session.select(mailbox_name)
+        logger.info("初回実行モード: メールを取得しません（カーソルを初期化してください）")
+        return
+
+    # Cheap change detection: one STATUS instead of SELECT + SEARCH + FETCH
+    status = None
+    if uid_cursor is not None and session.mailbox == mailbox_name:
+        # Already selected on a pooled connection: STATUS may be stale here, but
+        # the server reports every change to the selected mailbox on NOOP
+        if not session.changed_since_check() and _snapshot_current(uid_cursor, session):
+            logger.debug("Mailbox %s unchanged since last poll (selected, NOOP)", mailbox_name)
+            return
+        session.select(mailbox_name, force=True)
+        status = session.status()
+    elif uid_cursor is not None:
+        status = mailbox_status(session.conn, mailbox_name)
+        if status and _mailbox_unchanged(uid_cursor, status):
+            logger.debug("Mailbox %s unchanged since last poll (STATUS %s)", mailbox_name, status)
+            return
+
+    if uid_cursor is not None:
+        # Invalidate the snapshot until this poll has completed
+        uid_cursor.uidnext = uid_cursor.messages = uid_cursor.highestmodseq = 0
+
+    uidvalidity, uidnext = session.select(mailbox_name)
+    if uidnext is None and status:
+        uidnext = status.get("UIDNEXT")
+
+    count = yield from _search_and_fetch(
+        session.conn, mailbox_name, uidvalidity, uidnext, last_processed_date, batch_size, uid_cursor, seen
+    )
+
+    if uid_cursor is not None:
+        # Remember STATUS only once every UID below UIDNEXT has been examined,
+        # otherwise the next poll must not be skipped
+        complete = (
+            status is not None
+            and status.get("UIDVALIDITY") == uid_cursor.uidvalidity
+            and uid_cursor.last_uid >= status.get("UIDNEXT", 0) - 1
+        )
+        if complete:
+            uid_cursor.uidnext = status.get("UIDNEXT", 0)
+            uid_cursor.messages = status.get("MESSAGES", 0)
+            uid_cursor.highestmodseq = status.get("HIGHESTMODSEQ", 0)
+
+    logger.info("Found %d new message(s) in %s after %s", count, mailbox_name, last_processed_date.isoformat())
+
+
+class _UidProgress:
+    """Tracks the highest UID at or below which every candidate UID has been handled."""
+
+    def __init__(self, uids: List[int]):
+        self._pending = list(uids)
+        heapq.heapify(self._pending)
+        self._handled = set()
+
+    def handled(self, uid: int):
+        self._handled.add(uid)
+
+    def safe_last_uid(self) -> Optional[int]:
+        """Highest safe UID, or None once every candidate has been handled."""
+        while self._pending and self._pending[0] in self._handled:
+            self._handled.discard(heapq.heappop(self._pending))
+        return self._pending[0] - 1 if self._pending else None
+
+
+def _header_dates(
+    conn,
+    uids: List[int],
+    batch_size: int,
+    last_processed_date: datetime,
+    progress: _UidProgress,
+) -> List[Tuple[datetime, int]]:
+    """(Date header, UID) of messages the server returned no INTERNALDATE for, newer than the cursor."""
+    dated = []
+    for offset in range(0, len(uids), batch_size):
+        chunk = uids[offset:offset + batch_size]
+        uid_set = format_uid_set(chunk)
+        with fetch_phase("fetch"):
+            status, msg_data = conn.uid("fetch", uid_set, DATE_HEADER_ITEMS)
+        if status != "OK" or not msg_data:
+            logger.warning("UID FETCH %s (Date) failed or empty response", uid_set)
+            continue
+
+        fetched = parse_fetch_response(msg_data)
+        for uid in chunk:
+            if uid not in fetched:
+                logger.warning("UID %d: missing from FETCH response", uid)
+                continue
+            _, raw_header = fetched[uid]
+            date_header = parse_headers(raw_header).get("Date", "") if raw_header else ""
+            logger.debug("UID %d: INTERNALDATE not found, using Date header: %s", uid, date_header)
+            if not date_header:
+                logger.warning("UID %d: Neither INTERNALDATE nor Date header found, skipping", uid)
+                progress.handled(uid)
+                continue
+            internal_date = parse_internal_date(date_header)
+            if internal_date <= last_processed_date:
+                logger.debug("UID %d: internal_date %s <= cursor, skipping", uid, internal_date.isoformat())
+                progress.handled(uid)
+                continue
+            dated.append((internal_date, uid))
+    return dated
+
+
+def _search_and_fetch(
+    conn,
+    mailbox_name: str,
+    uidvalidity: Optional[int],
+    uidnext: Optional[int],
+    last_processed_date: datetime,
+    batch_size: int,
+    uid_cursor: Optional[MailboxCursor],
+    seen: Optional[Container[str]] = None,
+) -> Generator[MailMessage, None, int]:
+    """Search the selected mailbox for new UIDs and stream them; see fetch_mailboxes()."""
+    use_uid_search = (
+        uid_cursor is not None
+        and uidvalidity is not None
+        and uid_cursor.uidvalidity == uidvalidity
+        and uid_cursor.last_uid > 0
+    )
+
+    if use_uid_search:
+        last_uid = uid_cursor.last_uid
+        logger.debug("Searching messages UID %d:* (UIDVALIDITY %d)", last_uid + 1, uidvalidity)
+        with fetch_phase("search"):
+            status, data = conn.uid("search", None, f"UID {last_uid + 1}:*")
+    else:
+        last_uid = 0
+        if uid_cursor is not None and uid_cursor.uidvalidity and uid_cursor.uidvalidity != uidvalidity:
+            logger.warning(
+                "UIDVALIDITY changed (%s -> %s): falling back to INTERNALDATE search",
+                uid_cursor.uidvalidity, uidvalidity,
+            )
 
         # Calculate search date: 1 day before last_processed_date to handle timezone drift
         search_date = (last_processed_date - timedelta(days=1)).date()
         search_criterion = search_date.strftime("%d-%b-%Y")
-        
+
         logger.debug("Searching messages SINCE %s (last_processed: %s)", search_criterion, last_processed_date.isoformat())
-        
-        status, data = conn.uid("search", None, f"SINCE {search_criterion}")
 
-        if status != "OK" or not data[0]:
-            conn.close()
-            conn.logout()
-            return iter([])
+        with fetch_phase("search"):
+            status, data = conn.uid("search", None, f"SINCE {search_criterion}")
 
-        uid_list = data[0].split()
-        messages = []
+    if status != "OK":
+        return 0
 
-        for uid_bytes in uid_list:
-            uid = int(uid_bytes)
+    # "UID n:*" always returns the highest UID even when it is below n
+    uid_list = sorted(u for u in (int(u) for u in (data[0] or b"").split()) if u > last_uid)
 
-            # Fetch INTERNALDATE and headers
-            status, msg_data = conn.uid("fetch", uid_bytes, "(INTERNALDATE RFC822.HEADER)")
-            if status != "OK" or not msg_data or not msg_data[0]:
-                logger.warning("UID %d: fetch failed or empty response", uid)
-                continue
+    # Everything below UIDNEXT at SELECT time is either in uid_list or older
+    # than the search window, so it never needs to be searched again.
+    high_water = max(uid_list[-1] if uid_list else 0, (uidnext or 1) - 1, last_uid)
+
+    track_uids = uid_cursor is not None and uidvalidity is not None
+    progress = _UidProgress(uid_list)
+
+    def advance_cursor():
+        if track_uids:
+            safe = progress.safe_last_uid()
+            uid_cursor.uidvalidity = uidvalidity
+            # UIDs that failed to fetch are never handled, so they stay above the mark
+            uid_cursor.last_uid = high_water if safe is None else max(last_uid, safe)
 
-            # Debug: log the raw response structure
-            logger.debug("UID %d: msg_data type=%s, len=%d", uid, type(msg_data), len(msg_data))
-            if msg_data and len(msg_data) > 0:
-                logger.debug("UID %d: msg_data[0] type=%s", uid, type(msg_data[0]))
-
-            # Parse INTERNALDATE from response
-            # msg_data structure varies by server:
-            # Gmail: [(b'123 (RFC822.HEADER {size}', b'header data'), b')']
-            # Others: [(b'123 (INTERNALDATE "..." RFC822.HEADER {size}', b'header data')]
-            internal_date_str = None
-            raw_header = None
-            
-            # Extract from first element (which is usually a tuple)
-            first_elem = msg_data[0]
-            if isinstance(first_elem, tuple) and len(first_elem) >= 2:
-                # Standard format: (metadata_bytes, header_bytes)
-                metadata = first_elem[0]
-                raw_header = first_elem[1]
-                
-                if isinstance(metadata, bytes):
-                    metadata_str = metadata.decode('utf-8', errors='ignore')
-                    logger.debug("UID %d: metadata=%s", uid, metadata_str[:200])
-                    import re
-                    match = re.search(r'INTERNALDATE "([^"]+)"', metadata_str)
-                    if match:
-                        internal_date_str = match.group(1)
-            elif isinstance(first_elem, bytes):
-                # Fallback: try to parse from bytes directly
-                metadata_str = first_elem.decode('utf-8', errors='ignore')
-                logger.debug("UID %d: metadata (bytes)=%s", uid, metadata_str[:200])
-                import re
-                match = re.search(r'INTERNALDATE "([^"]+)"', metadata_str)
-                if match:
-                    internal_date_str = match.group(1)
-                # Try to get header from next element
-                if len(msg_data) > 1 and isinstance(msg_data[1], bytes):
-                    raw_header = msg_data[1]
-            
-            if not raw_header:
-                logger.warning("UID %d: header data not found in response", uid)
+    # Phase 1: INTERNALDATE (and Message-ID, to skip processed mail) of every match,
+    # so the stream can be ordered and old mail dropped before its headers are fetched
+    first_pass_items = DATE_ITEMS if seen is None else DATE_AND_MESSAGE_ID_ITEMS
+    dated = []  # (internal_date, uid)
+    undated = []
+    for offset in range(0, len(uid_list), batch_size):
+        chunk = uid_list[offset:offset + batch_size]
+        uid_set = format_uid_set(chunk)
+        with fetch_phase("fetch"):
+            status, msg_data = conn.uid("fetch", uid_set, first_pass_items)
+        if status != "OK" or not msg_data:
+            logger.warning("UID FETCH %s (INTERNALDATE) failed or empty response", uid_set)
+            continue
+
+        fetched = parse_fetch_response(msg_data)
+        message_ids = {}
+        if seen is not None:
+            message_ids = {
+                uid: parse_headers(raw_message_id).get("Message-ID", "").strip()
+                for uid, (_, raw_message_id) in fetched.items() if raw_message_id
+            }
+            # One lookup for the batch rather than one per message
+            prefetch_seen(seen, message_ids.values())
+        for uid in chunk:
+            if uid not in fetched:
+                logger.warning("UID %d: missing from FETCH response", uid)
+                continue
+            internal_date_str, _ = fetched[uid]
+            if message_ids.get(uid) and message_ids[uid] in seen:
+                logger.debug("UID %d: Message-ID already processed, skipping", uid)
+                DEDUP_SKIPPED.inc(account=current_account())
+                progress.handled(uid)
                 continue
-            
-            # Parse message headers first
-            msg = email.message_from_bytes(raw_header)
-            
-            # If INTERNALDATE not found, fall back to Date header
             if not internal_date_str:
-                date_header = msg.get("Date", "")
-                logger.debug("UID %d: INTERNALDATE not found, using Date header: %s", uid, date_header)
-                if date_header:
-                    internal_date_str = date_header
-                else:
-                    logger.warning("UID %d: Neither INTERNALDATE nor Date header found, skipping", uid)
-                    continue
-            
+                undated.append(uid)
+                continue
             internal_date = parse_internal_date(internal_date_str)
-            
             # Client-side filter: skip if not newer than cursor
             if internal_date <= last_processed_date:
                 logger.debug("UID %d: internal_date %s <= cursor, skipping", uid, internal_date.isoformat())
+                progress.handled(uid)
                 continue
+            dated.append((internal_date, uid))
 
-            from_addr = decode_header_value(msg.get("From", ""))
-            to_addr = decode_header_value(msg.get("To", ""))
-            subj = decode_header_value(msg.get("Subject", ""))
-            date_str = msg.get("Date", "")
-            message_id = msg.get("Message-ID", "").strip()
-
-            messages.append(MailMessage(
-                uid=uid,
-                from_address=from_addr,
-                to_address=to_addr,
-                subject=subj,
-                date=date_str,
-                message_id=message_id,
-                internal_date=internal_date,
-            ))
-
-        conn.close()
-        conn.logout()
+    if undated:
+        # Dated from their Date header before sorting, so they take their place in
+        # the stream: the checkpoint cursor assumes it is in date order
+        dated.extend(_header_dates(conn, undated, batch_size, last_processed_date, progress))
+    dated.sort()
+    advance_cursor()
 
-        # Sort by INTERNALDATE to ensure chronological processing
-        messages.sort(key=lambda m: m.internal_date)
-        
-        logger.info("Found %d new message(s) after %s", len(messages), last_processed_date.isoformat())
-        return iter(messages)
+    # Phase 2: headers in INTERNALDATE order, one chunk in memory at a time
+    ordered = [uid for _, uid in dated]
+    internal_dates = {uid: internal_date for internal_date, uid in dated}
+    count = 0
 
-    except Exception:
-        logger.exception("IMAP fetch failed for %s@%s:%s", user, host, port)
-        raise
+    for offset in range(0, len(ordered), batch_size):
+        chunk = ordered[offset:offset + batch_size]
+        uid_set = format_uid_set(chunk)
+
+        # Fetch headers for the whole chunk in one round-trip
+        with fetch_phase("fetch"):
+            status, msg_data = conn.uid("fetch", uid_set, FETCH_ITEMS)
+        if status != "OK" or not msg_data:
+            logger.warning("UID FETCH %s failed or empty response", uid_set)
+            continue
+
+        # Header parsing and decoding, timed separately from the FETCH round-trip
+        with span("parse"):
+            fetched = parse_fetch_response(msg_data)
+            logger.debug("UID FETCH %s: %d of %d message(s) returned", uid_set, len(fetched), len(chunk))
+
+            batch = []
+            for uid in chunk:
+                if uid not in fetched:
+                    logger.warning("UID %d: missing from FETCH response", uid)
+                    continue
+                _, raw_header = fetched[uid]
+
+                if not raw_header:
+                    logger.warning("UID %d: header data not found in response", uid)
+                    progress.handled(uid)
+                    continue
+
+                # Parse message headers first
+                msg = parse_headers(raw_header)
+
+                internal_date = internal_dates[uid]
+
+                from_addr = decode_header_value(msg.get("From", ""))
+                to_addr = decode_header_value(msg.get("To", ""))
+                subj = decode_header_value(msg.get("Subject", ""))
+                date_str = msg.get("Date", "")
+                message_id = msg.get("Message-ID", "").strip()
+
+                batch.append(MailMessage(
+                    uid=uid,
+                    from_address=from_addr,
+                    to_address=to_addr,
+                    subject=subj,
+                    date=date_str,
+                    message_id=message_id,
+                    internal_date=internal_date,
+                    mailbox=mailbox_name,
+                ))
+
+            # Sort by INTERNALDATE to ensure chronological processing
+            batch.sort(key=lambda m: m.internal_date)
+        advance_cursor()
+        for mail in batch:
+            yield mail
+            # Resumed: the caller has finished with *mail*
+            progress.handled(mail.uid)
+            advance_cursor()
+            count += 1
+
+    advance_cursor()
+    return count
@@ -0,0 +1,214 @@
+"""IMAP IDLE watchers – hold a connection open per account and wake the worker on new mail."""
+
+import logging
+import os
+import queue
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Set
+
+import imapclient
+
+logger = logging.getLogger(__name__)
+
+# Servers drop IDLE after 29 minutes (RFC 2177); re-issue it well before that
+IDLE_RENEW_SECONDS = int(os.environ.get("IMAP_IDLE_RENEW_SECONDS", "1500"))
+
+# How long a single idle_check() blocks, bounding how quickly a watcher notices stop()
+IDLE_CHECK_SECONDS = 30
+
+# Reconnect backoff after a dropped connection
+RECONNECT_MIN_SECONDS = 5
+RECONNECT_MAX_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class IdleTarget:
+    """Connection parameters of a watched mailbox; a change restarts the watcher."""
+    account_id: int
+    host: str
+    port: int
+    user: str
+    password: str
+    use_ssl: bool
+    ssl_mode: str
+    mailbox_name: str
+
+    @classmethod
+    def from_account(cls, account) -> "IdleTarget":
+        return cls(
+            account_id=account.id,
+            host=account.imap_host,
+            port=account.imap_port,
+            user=account.imap_user,
+            password=account.imap_password,
+            use_ssl=account.use_ssl,
+            ssl_mode=getattr(account, "ssl_mode", None),
+            mailbox_name=account.mailbox_name or "INBOX",
+        )
+
+
+class IdleNotSupported(Exception):
+    """The server does not advertise the IDLE capability."""
+
+
+def _connect(target: IdleTarget) -> imapclient.IMAPClient:
+    """Open an authenticated IMAPClient using the same ssl_mode rules as imap_client."""
+    # Match imaplib's defaults used by the polling path (no certificate
+    # verification), which Proton Bridge's self-signed certificate relies on.
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    if target.ssl_mode:
+        implicit_tls = target.ssl_mode == "ssl"
+        starttls = target.ssl_mode == "starttls"
+    else:
+        # Legacy: use_ssl + port-based logic
+        implicit_tls = target.use_ssl and target.port == 993
+        starttls = target.use_ssl and target.port != 993
+
+    client = imapclient.IMAPClient(
+        target.host, port=target.port, ssl=implicit_tls, ssl_context=context, timeout=60
+    )
+    if starttls:
+        client.starttls(context)
+    client.login(target.user, target.password)
+    return client
+
+
+class IdleWatcher(threading.Thread):
+    """
+    Keeps one account's mailbox in IDLE and puts its account ID on *wake_queue*
+    whenever the server reports EXISTS (and once after every (re)connect, so
+    mail delivered while disconnected is not missed).
+    """
+
+    def __init__(self, target: IdleTarget, wake_queue: "queue.Queue[int]"):
+        super().__init__(name=f"idle-{target.account_id}", daemon=True)
+        self.target = target
+        self.wake_queue = wake_queue
+        self.active = False  # True while the mailbox is in IDLE
+        self.supported = True  # False once the server turned out not to support IDLE
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = RECONNECT_MIN_SECONDS
+        while not self._stop_event.is_set():
+            try:
+                self._watch()
+                backoff = RECONNECT_MIN_SECONDS
+            except IdleNotSupported:
+                logger.info("IDLE not supported by %s – polling account %d instead",
+                            self.target.host, self.target.account_id)
+                self.supported = False
+                return
+            except Exception as exc:
+                logger.warning("IDLE connection for account %d lost: %s (retry in %ds)",
+                               self.target.account_id, exc, backoff)
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+            finally:
+                self.active = False
+
+    def _watch(self):
+        client = _connect(self.target)
+        try:
+            if not client.has_capability("IDLE"):
+                raise IdleNotSupported()
+            client.select_folder(self.target.mailbox_name, readonly=True)
+            self.active = True
+            self.wake_queue.put(self.target.account_id)
+
+            while not self._stop_event.is_set():
+                client.idle()
+                started = time.monotonic()
+                new_mail = False
+                try:
+                    while not self._stop_event.is_set() and time.monotonic() - started < IDLE_RENEW_SECONDS:
+                        responses = client.idle_check(timeout=IDLE_CHECK_SECONDS)
+                        if any(len(r) >= 2 and r[1] == b"EXISTS" for r in responses):
+                            new_mail = True
+                            break
+                finally:
+                    client.idle_done()
+                if new_mail:
+                    logger.debug("IDLE: new mail for account %d", self.target.account_id)
+                    self.wake_queue.put(self.target.account_id)
+        finally:
+            self.active = False
+            try:
+                client.logout()
+            except Exception:
+                pass
+
+
+class IdleManager:
+    """Starts, restarts and stops IdleWatchers to match the IDLE-enabled accounts."""
+
+    # Put on wake_queue by interrupt(): ends a wait() without waking an account
+    INTERRUPT = 0
+
+    def __init__(self):
+        self.wake_queue: "queue.Queue[int]" = queue.Queue()
+        self._watchers: Dict[int, IdleWatcher] = {}
+
+    def sync(self, accounts: Iterable):
+        """Reconcile watchers with *accounts* (enabled IMAP accounts with use_idle set)."""
+        wanted = {}
+        for account in accounts:
+            protocol = getattr(account, "protocol_type", "imap") or "imap"
+            if account.enabled and protocol == "imap" and account.use_idle:
+                wanted[account.id] = IdleTarget.from_account(account)
+
+        for account_id in list(self._watchers):
+            watcher = self._watchers[account_id]
+            if wanted.get(account_id) != watcher.target:
+                watcher.stop()
+                del self._watchers[account_id]
+
+        for account_id, target in wanted.items():
+            if account_id not in self._watchers:
+                watcher = IdleWatcher(target, self.wake_queue)
+                watcher.start()
+                self._watchers[account_id] = watcher
+                logger.info("IDLE watcher started for account %d", account_id)
+
+    def is_active(self, account_id: int) -> bool:
+        """True if the account is currently covered by a live IDLE connection."""
+        watcher = self._watchers.get(account_id)
+        return bool(watcher and watcher.active)
+
+    def interrupt(self):
+        """Make the current (or next) wait() return early, e.g. because the worker settings changed."""
+        self.wake_queue.put(self.INTERRUPT)
+
+    def wait(self, timeout: float) -> Set[int]:
+        """
+        Block up to *timeout* seconds for wakeups; return the (coalesced) account
+        IDs, including INTERRUPT if interrupt() was called.
+        """
+        try:
+            account_ids = {self.wake_queue.get(timeout=max(timeout, 0))}
+        except queue.Empty:
+            return set()
+        while True:
+            try:
+                account_ids.add(self.wake_queue.get_nowait())
+            except queue.Empty:
+                return account_ids
+
+    def stop_all(self, timeout: float = 5.0):
+        """Stop every watcher and give them up to *timeout* seconds in total to leave IDLE and log out."""
+        watchers = list(self._watchers.values())
+        self._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
+        deadline = time.monotonic() + timeout
+        for watcher in watchers:
+            watcher.join(max(0.0, deadline - time.monotonic()))
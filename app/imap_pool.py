@@ -0,0 +1,78 @@
+"""Persistent IMAP connection pool – keeps authenticated, selected sessions between worker cycles."""
+
+import imaplib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable
+
+from app.imap_client import MailboxSession, logout
+
+logger = logging.getLogger(__name__)
+
+# Connections unused for longer than this are logged out (IMAP servers autologout after 30 min)
+POOL_MAX_IDLE_SECONDS = int(os.environ.get("IMAP_POOL_MAX_IDLE_SECONDS", "900"))
+
+
+class ImapConnectionPool:
+    """
+    One idle connection per key (host, port, user, password, ssl settings).
+
+    A connection is checked out exclusively for the duration of a
+    ``with pool.connection(...)`` block, verified with NOOP on reuse and
+    replaced transparently if the server dropped it. Any exception inside the
+    block discards the connection instead of returning it to the pool.
+    """
+
+    def __init__(self, max_idle_seconds: int = POOL_MAX_IDLE_SECONDS):
+        self.max_idle_seconds = max_idle_seconds
+        self._idle: Dict[Hashable, MailboxSession] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, key: Hashable, connect: Callable[[], imaplib.IMAP4]):
+        pooled = self._checkout(key, connect)
+        try:
+            yield pooled
+        except BaseException:
+            logout(pooled.conn)
+            raise
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            previous = self._idle.pop(key, None)
+            self._idle[key] = pooled
+        if previous is not None:
+            logout(previous.conn)
+
+    def _checkout(self, key: Hashable, connect: Callable[[], imaplib.IMAP4]) -> MailboxSession:
+        with self._lock:
+            pooled = self._idle.pop(key, None)
+        if pooled is not None:
+            try:
+                status, _ = pooled.conn.noop()
+                if status == "OK":
+                    return pooled
+            except (imaplib.IMAP4.error, OSError) as exc:
+                logger.info("Pooled IMAP connection is dead (%s) – reconnecting", exc)
+            logout(pooled.conn)
+        return MailboxSession(connect())
+
+    def evict_idle(self):
+        """Log out connections that have not been used for max_idle_seconds."""
+        cutoff = time.monotonic() - self.max_idle_seconds
+        with self._lock:
+            expired = [key for key, pooled in self._idle.items() if pooled.last_used < cutoff]
+            evicted = [self._idle.pop(key) for key in expired]
+        for pooled in evicted:
+            logout(pooled.conn)
+        if evicted:
+            logger.debug("Evicted %d idle IMAP connection(s)", len(evicted))
+
+    def close_all(self):
+        with self._lock:
+            evicted = list(self._idle.values())
+            self._idle.clear()
+        for pooled in evicted:
+            logout(pooled.conn)
@@ -0,0 +1,169 @@
+"""
+Account leases – lets several worker processes split the accounts between them.
+
+Every worker registers itself in worker_nodes and heartbeats every
+WORKER_HEARTBEAT_SECONDS, renewing the leases (accounts.lease_owner /
+lease_expires_at) of the accounts it polls. At the top of each loop it
+rebalances: with N live workers it keeps ceil(enabled accounts / N) leases,
+releasing the surplus and claiming unowned or expired ones (FOR UPDATE SKIP
+LOCKED plus a compare-and-set, as the outbox claims rows). A worker that dies
+stops heartbeating, its leases expire after WORKER_LEASE_SECONDS and the
+others take its accounts over.
+
+A handover can overlap with a poll still running on the previous owner; the
+outbox and processed-Message-ID unique keys keep that from notifying twice.
+"""
+
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Set
+
+from sqlalchemy import or_
+
+from app import metrics
+from app.extensions import db
+from app.models import Account, WorkerNode
+
+logger = logging.getLogger(__name__)
+
+WORKER_LEASE_SECONDS = int(os.environ.get("WORKER_LEASE_SECONDS", "60"))
+WORKER_HEARTBEAT_SECONDS = int(os.environ.get("WORKER_HEARTBEAT_SECONDS", "15"))
+
+# Rows of workers that have not heartbeated for this long are deleted
+NODE_RETENTION = timedelta(days=1)
+
+
+def default_node_id() -> str:
+    """WORKER_NODE_ID, or hostname + PID + a random suffix (unique per process)."""
+    return os.environ.get("WORKER_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class LeaseManager:
+    """Heartbeats this worker and holds its fair share of account leases."""
+
+    def __init__(self, app, node_id: str = None):
+        self._app = app
+        self.node_id = (node_id or default_node_id())[:100]
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Register the node and start the heartbeat thread (which has its own app context)."""
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info("Worker node %s started (lease %ds, heartbeat %ds)",
+                    self.node_id, WORKER_LEASE_SECONDS, WORKER_HEARTBEAT_SECONDS)
+
+    def stop(self):
+        """Stop heartbeating and hand all leases back so other workers take over at once."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        Account.query.filter_by(lease_owner=self.node_id).update(
+            {"lease_owner": None, "lease_expires_at": None, "updated_at": Account.updated_at},
+            synchronize_session=False,
+        )
+        WorkerNode.query.filter_by(id=self.node_id).delete(synchronize_session=False)
+        db.session.commit()
+        logger.info("Worker node %s stopped, leases released", self.node_id)
+
+    def _run(self):
+        with self._app.app_context():
+            while not self._stop_event.wait(WORKER_HEARTBEAT_SECONDS):
+                try:
+                    self.heartbeat()
+                except Exception:
+                    logger.exception("Worker heartbeat failed")
+                    db.session.rollback()
+
+    def heartbeat(self):
+        """Mark this node alive, publish its metrics snapshot and extend all of its leases."""
+        now = datetime.now(timezone.utc)
+        node = db.session.get(WorkerNode, self.node_id)
+        if node is None:
+            node = WorkerNode(id=self.node_id, started_at=now)
+            db.session.add(node)
+        node.heartbeat_at = now
+        node.metrics = json.dumps(metrics.snapshot())
+        # Keep updated_at: leases are not an edit of the account
+        Account.query.filter_by(lease_owner=self.node_id).update(
+            {"lease_expires_at": now + timedelta(seconds=WORKER_LEASE_SECONDS), "updated_at": Account.updated_at},
+            synchronize_session=False,
+        )
+        WorkerNode.query.filter(WorkerNode.heartbeat_at < now - NODE_RETENTION).delete(synchronize_session=False)
+        db.session.commit()
+
+    def rebalance(self) -> Set[int]:
+        """Release or claim leases to hold this node's fair share; returns the IDs of the leased accounts."""
+        now = datetime.now(timezone.utc)
+        live_nodes = WorkerNode.query.filter(
+            WorkerNode.heartbeat_at >= now - timedelta(seconds=WORKER_LEASE_SECONDS)
+        ).count()
+        enabled = db.session.query(Account.id).filter(Account.enabled.is_(True)).count()
+        share = math.ceil(enabled / max(live_nodes, 1))
+
+        owned: List[int] = [
+            account_id for (account_id,) in db.session.query(Account.id).filter(
+                Account.lease_owner == self.node_id,
+                Account.lease_expires_at > now,
+                Account.enabled.is_(True),
+            ).order_by(Account.id)
+        ]
+
+        # Disabled accounts need no poller
+        Account.query.filter(Account.lease_owner == self.node_id, Account.enabled.is_(False)).update(
+            {"lease_owner": None, "lease_expires_at": None, "updated_at": Account.updated_at},
+            synchronize_session=False,
+        )
+
+        if len(owned) > share:
+            # More workers than before: hand the surplus over to them
+            released = owned[share:]
+            owned = owned[:share]
+            Account.query.filter(Account.id.in_(released), Account.lease_owner == self.node_id).update(
+                {"lease_owner": None, "lease_expires_at": None, "updated_at": Account.updated_at},
+                synchronize_session=False,
+            )
+            logger.info("Released %d account lease(s) for rebalancing (%d worker(s) alive)",
+                        len(released), live_nodes)
+        elif len(owned) < share:
+            claimed = self._claim(share - len(owned), now)
+            if claimed:
+                logger.info("Claimed %d account lease(s) (%d worker(s) alive)", len(claimed), live_nodes)
+            owned.extend(claimed)
+
+        db.session.commit()
+        return set(owned)
+
+    def _claim(self, limit: int, now: datetime) -> List[int]:
+        claimable = or_(Account.lease_owner.is_(None), Account.lease_expires_at <= now)
+        candidates = (
+            db.session.query(Account.id)
+            .filter(Account.enabled.is_(True), claimable)
+            .order_by(Account.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        claimed = []
+        for (account_id,) in candidates:
+            # Compare-and-set keeps the claim exclusive where SKIP LOCKED is unavailable
+            updated = Account.query.filter(Account.id == account_id, claimable).update(
+                {
+                    "lease_owner": self.node_id,
+                    "lease_expires_at": now + timedelta(seconds=WORKER_LEASE_SECONDS),
+                    "updated_at": Account.updated_at,
+                },
+                synchronize_session=False,
+            )
+            if updated:
+                claimed.append(account_id)
+        return claimed
@@ -1,58 +1,285 @@
-"""Rule matching engine – evaluates conditions against an email message."""
+"""Rule matching engine – compiles rules into an immutable rule set and evaluates email messages against it."""
 
-import re
 import logging
-from app.models import RuleCondition
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Optional, Pattern, Set, Tuple
+
+import regex
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.extensions import db
+from app.models import DiscordWebhook, NotificationFormat, Rule, RuleCondition
+from app.pattern_index import AhoCorasick, PrefixTrie, SuffixTrie
 
 logger = logging.getLogger(__name__)
 
+# Wall-clock budget for a single regex search; patterns exceeding it count as no match
+REGEX_TIMEOUT_SECONDS = float(os.environ.get("REGEX_TIMEOUT_SECONDS", "0.1"))
 
-def matches_condition(condition: RuleCondition, value: str) -> bool:
-    """Check if *value* satisfies a single condition."""
-    pattern = condition.pattern
-    match_type = condition.match_type
-
-    if match_type == RuleCondition.MATCH_PREFIX:
-        return value.lower().startswith(pattern.lower())
-    elif match_type == RuleCondition.MATCH_SUFFIX:
-        return value.lower().endswith(pattern.lower())
-    elif match_type == RuleCondition.MATCH_CONTAINS:
-        return pattern.lower() in value.lower()
-    elif match_type == RuleCondition.MATCH_REGEX:
-        try:
-            return bool(re.search(pattern, value, re.IGNORECASE))
-        except re.error:
-            return False
-    return False
 
+@lru_cache(maxsize=1024)
+def compile_regex(pattern: str) -> Pattern:
+    """
+    Compile a user pattern (case-insensitive, ``re``-compatible syntax) once per process.
+    Uses the ``regex`` module, whose searches accept a timeout. Raises regex.error if invalid.
+    """
+    return regex.compile(pattern, regex.IGNORECASE | regex.VERSION0)
+
+
+def validate_regex(pattern: str) -> Optional[str]:
+    """Return an error message if *pattern* is not a valid regex, else None."""
+    try:
+        compile_regex(pattern)
+    except regex.error as exc:
+        return str(exc)
+    return None
+
+
+@dataclass(frozen=True)
+class CompiledCondition:
+    """A RuleCondition with its pattern pre-lowercased (or its regex precompiled)."""
+    field: str
+    match_type: str
+    pattern: str
+    needle: str  # lowercased pattern for prefix / suffix / contains
+    regex: Optional[Pattern] = None
+
+    @classmethod
+    def compile(cls, condition: RuleCondition) -> "CompiledCondition":
+        compiled = None
+        if condition.match_type == RuleCondition.MATCH_REGEX:
+            try:
+                compiled = compile_regex(condition.pattern)
+            except regex.error as exc:
+                logger.warning("Invalid regex '%s' in rule %d: %s", condition.pattern, condition.rule_id, exc)
+        return cls(
+            field=condition.field,
+            match_type=condition.match_type,
+            pattern=condition.pattern,
+            needle=condition.pattern.lower(),
+            regex=compiled,
+        )
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """An enabled rule with everything needed to match and notify, detached from the DB session."""
+    id: int
+    name: str
+    position: int
+    account_id: Optional[int]
+    conditions: Tuple[CompiledCondition, ...]
+    webhook_name: Optional[str]
+    webhook_url: Optional[str]
+    format_template: Optional[str]
+
+    @classmethod
+    def compile(cls, rule: Rule) -> "CompiledRule":
+        return cls(
+            id=rule.id,
+            name=rule.name,
+            position=rule.position,
+            account_id=rule.account_id,
+            conditions=tuple(CompiledCondition.compile(cond) for cond in rule.conditions),
+            webhook_name=rule.webhook.name if rule.webhook else None,
+            webhook_url=rule.webhook.url if rule.webhook else None,
+            format_template=rule.notification_format.template if rule.notification_format else None,
+        )
 
-def evaluate_rule(rule, *, from_address: str, to_address: str, subject: str, account_id: int, account_name: str) -> bool:
+
+class FieldIndex:
+    """All prefix / suffix / contains conditions on one header field, matched in one pass each."""
+
+    def __init__(self, conditions: Iterable[Tuple[CompiledCondition, int]]):
+        by_type = {
+            RuleCondition.MATCH_PREFIX: [],
+            RuleCondition.MATCH_SUFFIX: [],
+            RuleCondition.MATCH_CONTAINS: [],
+        }
+        for cond, cid in conditions:
+            by_type[cond.match_type].append((cond.needle, cid))
+        self._indexes = [
+            cls(needles) for cls, needles in (
+                (PrefixTrie, by_type[RuleCondition.MATCH_PREFIX]),
+                (SuffixTrie, by_type[RuleCondition.MATCH_SUFFIX]),
+                (AhoCorasick, by_type[RuleCondition.MATCH_CONTAINS]),
+            ) if needles
+        ]
+
+    def satisfied(self, value_lower: str) -> Set[int]:
+        """IDs of the conditions satisfied by *value_lower*."""
+        found = set()
+        for index in self._indexes:
+            found |= index.search(value_lower)
+        return found
+
+
+class RuleSet:
     """
-    Evaluate all conditions on *rule* against the given email fields.
-    All conditions must match (AND logic).
-    Returns True if every condition passes.
+    Immutable snapshot of all enabled rules in position order.
+
+    Prefix, suffix and contains conditions of every rule are merged into one
+    FieldIndex per header field, so a message is matched with one pass over
+    each field whatever the number of rules. A rule is a candidate once all
+    of those conditions are satisfied; candidates are then checked in
+    position order (account filter, regex conditions evaluated lazily) and
+    the first one wins. Each regex search is limited to REGEX_TIMEOUT_SECONDS.
     """
+
+    def __init__(self, version: tuple, rules: Iterable[CompiledRule]):
+        self.version = version
+        self.rules: Tuple[CompiledRule, ...] = tuple(rules)
+        self._regex_conditions: List[Tuple[CompiledCondition, ...]] = []
+        self._static_counts: List[int] = []
+        self._always_candidates: List[int] = []  # rules with regex conditions only
+        self._condition_rule: List[int] = []  # condition ID -> rule index
+
+        static = {field: [] for field in RuleCondition.FIELD_CHOICES}
+        for idx, rule in enumerate(self.rules):
+            regexes = tuple(c for c in rule.conditions if c.match_type == RuleCondition.MATCH_REGEX)
+            self._regex_conditions.append(regexes)
+            count = 0
+            for cond in rule.conditions:
+                if cond.match_type != RuleCondition.MATCH_REGEX:
+                    static[cond.field].append((cond, len(self._condition_rule)))
+                    self._condition_rule.append(idx)
+                    count += 1
+            self._static_counts.append(count)
+            if count == 0:
+                self._always_candidates.append(idx)
+
+        self._indexes: Mapping[str, FieldIndex] = MappingProxyType(
+            {field: FieldIndex(conds) for field, conds in static.items() if conds}
+        )
+
+    @classmethod
+    def build(cls, version: tuple, rules) -> "RuleSet":
+        compiled = []
+        for rule in rules:
+            rule = CompiledRule.compile(rule)
+            if _can_match(rule):
+                compiled.append(rule)
+            else:
+                logger.debug("Rule '%s' can never match, skipped", rule.name)
+        return cls(version, compiled)
+
+    def first_match(self, account_id: int, *, from_address: str, to_address: str, subject: str,
+                    timed_out: List[CompiledRule] = None) -> Optional[CompiledRule]:
+        """
+        Return the first rule (by position) whose conditions all match, or None.
+        Rules whose regex exceeded the time budget do not match and are appended to *timed_out*.
+        """
+        values = {
+            RuleCondition.FIELD_FROM: from_address,
+            RuleCondition.FIELD_TO: to_address,
+            RuleCondition.FIELD_SUBJECT: subject,
+        }
+
+        hits = {}
+        for field, index in self._indexes.items():
+            for cid in index.satisfied(values[field].lower()):
+                rule_idx = self._condition_rule[cid]
+                hits[rule_idx] = hits.get(rule_idx, 0) + 1
+
+        candidates = [idx for idx, count in hits.items() if count == self._static_counts[idx]]
+        candidates.extend(self._always_candidates)
+
+        for idx in sorted(candidates):
+            rule = self.rules[idx]
+            if rule.account_id is not None and rule.account_id != account_id:
+                logger.debug("Rule '%s' skipped: account filter (%d != %d)", rule.name, rule.account_id, account_id)
+                continue
+            if self._regexes_match(rule, self._regex_conditions[idx], values, timed_out):
+                logger.debug("All conditions passed for rule '%s'", rule.name)
+                return rule
+        return None
+
+    @staticmethod
+    def _regexes_match(rule: CompiledRule, conditions: Tuple[CompiledCondition, ...],
+                       values: Mapping[str, str], timed_out: Optional[List[CompiledRule]]) -> bool:
+        for cond in conditions:
+            try:
+                if cond.regex.search(values[cond.field], timeout=REGEX_TIMEOUT_SECONDS) is None:
+                    return False
+            except TimeoutError:
+                logger.warning("Regex '%s' of rule '%s' exceeded %.2fs – treated as no match",
+                               cond.pattern, rule.name, REGEX_TIMEOUT_SECONDS)
+                if timed_out is not None:
+                    timed_out.append(rule)
+                return False
+        return True
+
+
+def _can_match(rule: CompiledRule) -> bool:
+    """False for rules without conditions or with unknown fields, match types or invalid regexes."""
     if not rule.conditions:
         return False  # No conditions → never match
-
-    logger.debug("Evaluating rule '%s' for account_id=%d (%s)", rule.name, account_id, account_name)
-    
     for cond in rule.conditions:
-        if cond.field == RuleCondition.FIELD_FROM:
-            if not matches_condition(cond, from_address):
-                logger.debug("  Condition failed: FROM '%s' does not match pattern '%s'", from_address, cond.pattern)
-                return False
-        elif cond.field == RuleCondition.FIELD_TO:
-            if not matches_condition(cond, to_address):
-                logger.debug("  Condition failed: TO '%s' does not match pattern '%s'", to_address, cond.pattern)
-                return False
-        elif cond.field == RuleCondition.FIELD_SUBJECT:
-            if not matches_condition(cond, subject):
-                logger.debug("  Condition failed: SUBJECT '%s' does not match pattern '%s'", subject, cond.pattern)
-                return False
-        else:
-            logger.debug("  Condition failed: Unknown field type '%s'", cond.field)
-            return False  # Unknown field type
-    
-    logger.debug("  All conditions passed for rule '%s'", rule.name)
+        if cond.field not in RuleCondition.FIELD_CHOICES or cond.match_type not in RuleCondition.MATCH_CHOICES:
+            return False
+        if cond.match_type == RuleCondition.MATCH_REGEX and cond.regex is None:
+            return False
     return True
+
+
+def rule_set_version() -> tuple:
+    """
+    Cheap change stamp for everything a RuleSet is built from: row count, max
+    ID and max updated_at of rules, conditions, webhooks and formats, in one query.
+    """
+    columns = []
+    for model in (Rule, RuleCondition, DiscordWebhook, NotificationFormat):
+        columns.append(select(func.count(model.id)).scalar_subquery())
+        columns.append(select(func.max(model.id)).scalar_subquery())
+        if hasattr(model, "updated_at"):
+            columns.append(select(func.max(model.updated_at)).scalar_subquery())
+    return tuple(db.session.execute(select(*columns)).one())
+
+
+_rule_set: Optional[RuleSet] = None
+_rule_set_lock = threading.Lock()
+
+
+def load_rule_set() -> RuleSet:
+    """Return the compiled rule set, rebuilding it only if the version stamp changed."""
+    global _rule_set
+    # Read the stamp before the rows: a concurrent edit then at worst causes one extra rebuild
+    version = rule_set_version()
+    with _rule_set_lock:
+        if _rule_set is None or _rule_set.version != version:
+            rules = (
+                Rule.query.filter_by(enabled=True)
+                .options(
+                    selectinload(Rule.conditions),
+                    joinedload(Rule.webhook),
+                    joinedload(Rule.notification_format),
+                )
+                .order_by(Rule.position)
+                .all()
+            )
+            _rule_set = RuleSet.build(version, rules)
+            logger.info("Compiled %d enabled rule(s)", len(_rule_set.rules))
+        return _rule_set
+
+
+def flag_regex_timeouts(rules: Iterable[CompiledRule]):
+    """
+    Mark *rules* as having exceeded the regex budget so the rules page can warn
+    about them. Not committed here, and the UPDATE locks the rules rows: call it
+    right before the commit (the worker does so in save_progress()), never
+    ahead of further mail server I/O.
+    """
+    rule_ids = {rule.id for rule in rules}
+    if not rule_ids:
+        return
+    # Keep updated_at unchanged: the flag must not trigger a rule set rebuild
+    Rule.query.filter(Rule.id.in_(rule_ids)).update(
+        {"regex_timeout_at": datetime.now(timezone.utc), "updated_at": Rule.updated_at},
+        synchronize_session=False,
+    )
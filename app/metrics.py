@@ -0,0 +1,278 @@
+"""
+Worker metrics – in-process counters, gauges and histograms for the polling
+and delivery hot paths.
+
+The worker serves them in the Prometheus text format on METRICS_PORT
+(GET /metrics) and stores a compact snapshot in worker_nodes with every
+heartbeat, which the web app returns from /maintenance/api/status.
+
+Per-account metrics are labelled with the account ID set by account_scope()
+around each poll, so the mail clients need no extra arguments.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from app.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Port of the worker's metrics endpoint (0 disables it)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "0.0.0.0")
+
+# Seconds; covers a fast IMAP command up to a slow mailbox scan
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current_account: ContextVar[str] = ContextVar("metrics_account", default="")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A value that only goes up (events, messages)."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in items]
+
+
+class Gauge(Counter):
+    """A value that is set to the current state (interval, leased accounts)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of durations, as cumulative bucket counts plus sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            items = sorted((key, state[1], state[2]) for key, state in self._values.items())
+        return [
+            {"labels": dict(zip(self.labelnames, key)), "count": count, "sum": round(total, 6)}
+            for key, total, count in items
+        ]
+
+
+REGISTRY: List[_Metric] = []
+
+# ── Polling ──────────────────────────────────────────────
+FETCH_PHASE_SECONDS = Histogram(
+    "mail_notifier_fetch_phase_seconds",
+    "Duration of mail server operations by account and phase (connect, login, search, fetch).",
+    ("account", "phase"),
+)
+ACCOUNT_POLL_SECONDS = Histogram(
+    "mail_notifier_account_poll_seconds", "Duration of one poll of an account.", ("account",)
+)
+ACCOUNT_POLL_FAILURES = Counter(
+    "mail_notifier_account_poll_failures_total", "Polls that ended in a mail server error.", ("account",)
+)
+MESSAGES_SCANNED = Counter(
+    "mail_notifier_messages_scanned_total", "New messages evaluated against the rules.", ("account",)
+)
+MESSAGES_NOTIFIED = Counter(
+    "mail_notifier_messages_notified_total", "Messages that matched a rule and were queued for Discord.", ("account",)
+)
+DEDUP_SKIPPED = Counter(
+    "mail_notifier_dedup_skipped_total", "Messages skipped because their Message-ID was already processed.", ("account",)
+)
+RULE_EVALUATION_SECONDS = Histogram(
+    "mail_notifier_rule_evaluation_seconds",
+    "Time to find the first matching rule for one message.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+# ── Worker loop ──────────────────────────────────────────
+CYCLE_SECONDS = Histogram(
+    "mail_notifier_worker_cycle_seconds", "Duration of one worker loop (triggered and due accounts)."
+)
+POLL_INTERVAL_SECONDS = Gauge(
+    "mail_notifier_worker_poll_interval_seconds", "Global poll interval of the worker."
+)
+LEASED_ACCOUNTS = Gauge(
+    "mail_notifier_leased_accounts", "Accounts currently leased by this worker."
+)
+
+# ── Discord delivery ─────────────────────────────────────
+DISCORD_REQUEST_SECONDS = Histogram(
+    "mail_notifier_discord_request_seconds", "Latency of Discord webhook requests."
+)
+DISCORD_RESPONSES = Counter(
+    "mail_notifier_discord_responses_total",
+    "Discord webhook responses by HTTP status (\"error\" when no response was received).",
+    ("status",),
+)
+DISCORD_CONNECTIONS = Gauge(
+    "mail_notifier_discord_connections",
+    "Requests sent, connections opened and connections reused per Discord host.",
+    ("host", "kind"),
+)
+
+
+@contextmanager
+def account_scope(account_id: int):
+    """Label the per-account metrics recorded in the with-block with *account_id*."""
+    token = _current_account.set(str(account_id))
+    try:
+        yield
+    finally:
+        _current_account.reset(token)
+
+
+def current_account() -> str:
+    """Account ID label of the poll in progress ("" outside account_scope())."""
+    return _current_account.get()
+
+
+@contextmanager
+def fetch_phase(phase: str):
+    """Time a mail server operation of the current account (connect, login, search, fetch), also as a trace span."""
+    with FETCH_PHASE_SECONDS.time(account=current_account(), phase=phase), span(phase):
+        yield
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, List[dict]]:
+    """Compact JSON-able copy of all recorded values (histograms as count and sum)."""
+    return {metric.name: values for metric in REGISTRY if (values := metric.snapshot())}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape would drown the worker log
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread; returns None if disabled or the port is taken."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as exc:
+        logger.warning("Metrics endpoint not started on %s:%d: %s", host, port, exc)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Metrics served on http://%s:%d/metrics", host, port)
+    return server
@@ -18,10 +18,18 @@ class Account(db.Model):
     use_ssl = db.Column(db.Boolean, nullable=False, default=True)
     ssl_mode = db.Column(db.String(20), nullable=False, default="ssl")  # "none", "starttls", "ssl"
     enabled = db.Column(db.Boolean, nullable=False, default=True)
-    last_uid = db.Column(db.Integer, nullable=False, default=0)  # Deprecated: use last_processed_internal_date instead
-    mailbox_name = db.Column(db.String(120), nullable=False, default="INBOX")
+    last_uid = db.Column(db.BigInteger, nullable=False, default=0)  # IMAP UID high-water mark (valid for last_uidvalidity only)
+    last_uidvalidity = db.Column(db.BigInteger, nullable=False, default=0)  # UIDVALIDITY that last_uid belongs to
+    last_uidnext = db.Column(db.BigInteger, nullable=False, default=0)  # STATUS UIDNEXT at the last complete poll
+    last_message_count = db.Column(db.Integer, nullable=False, default=0)  # STATUS MESSAGES at the last complete poll
+    last_highestmodseq = db.Column(db.BigInteger, nullable=False, default=0)  # STATUS HIGHESTMODSEQ (CONDSTORE servers only)
+    mailbox_name = db.Column(db.String(120), nullable=False, default="INBOX")  # Primary folder (watched by IDLE)
+    use_idle = db.Column(db.Boolean, nullable=False, default=False)  # IMAP IDLE push instead of interval polling
+    poll_interval = db.Column(db.Integer, nullable=True)  # Base poll interval in seconds (NULL = global worker interval)
     last_processed_internal_date = db.Column(db.DateTime, nullable=True)  # High-water mark for INTERNALDATE-based polling
-    processed_message_ids = db.Column(db.Text, nullable=False, default="")  # JSON array of Message-IDs for deduplication
+    pop3_seen_uidls = db.Column(db.LargeBinary, nullable=True)  # POP3: 8-byte digests of the UIDLs already examined
+    lease_owner = db.Column(db.String(100), nullable=True, index=True)  # Worker node polling this account
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # Another worker may take the account over after this
     created_at = db.Column(
         db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
     )
@@ -32,10 +40,47 @@ class Account(db.Model):
         onupdate=lambda: datetime.now(timezone.utc),
     )
 
+    extra_mailboxes = db.relationship(
+        "AccountMailbox", back_populates="account", cascade="all, delete-orphan", order_by="AccountMailbox.id"
+    )
+
     def __repr__(self):
         return f"<Account {self.name}>"
 
 
+class AccountMailbox(db.Model):
+    """
+    An additional IMAP folder polled together with its account (over the same
+    connection). Has the same cursor columns as Account, which holds the
+    cursors of the primary mailbox_name.
+    """
+
+    __tablename__ = "account_mailboxes"
+    __table_args__ = (
+        db.UniqueConstraint("account_id", "name", name="uq_account_mailboxes_account_name"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False
+    )
+    name = db.Column(db.String(120), nullable=False)
+    last_uid = db.Column(db.BigInteger, nullable=False, default=0)
+    last_uidvalidity = db.Column(db.BigInteger, nullable=False, default=0)
+    last_uidnext = db.Column(db.BigInteger, nullable=False, default=0)
+    last_message_count = db.Column(db.Integer, nullable=False, default=0)
+    last_highestmodseq = db.Column(db.BigInteger, nullable=False, default=0)
+    last_processed_internal_date = db.Column(db.DateTime, nullable=True)  # NULL until the folder's first poll
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+
+    account = db.relationship("Account", back_populates="extra_mailboxes")
+
+    def __repr__(self):
+        return f"<AccountMailbox {self.name} account_id={self.account_id}>"
+
+
 class DiscordWebhook(db.Model):
     """Discord webhook destination."""
 
@@ -101,6 +146,7 @@ class Rule(db.Model):
     )
     position = db.Column(db.Integer, nullable=False, default=0)
     enabled = db.Column(db.Boolean, nullable=False, default=True)
+    regex_timeout_at = db.Column(db.DateTime, nullable=True)  # Last time a regex condition exceeded the time budget
     created_at = db.Column(
         db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
     )
@@ -149,6 +195,13 @@ class RuleCondition(db.Model):
 
     match_type = db.Column(db.String(20), nullable=False, default=MATCH_CONTAINS)
     pattern = db.Column(db.String(500), nullable=False)
+    # Part of the compiled rule set's version stamp (app.matcher.rule_set_version)
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
 
     rule = db.relationship("Rule", back_populates="conditions")
 
@@ -156,6 +209,23 @@ class RuleCondition(db.Model):
         return f"<RuleCondition {self.field} {self.match_type} '{self.pattern}'>"
 
 
+class ProcessedMessage(db.Model):
+    """Digest of a Message-ID already processed for an account (deduplication, time-bounded)."""
+
+    __tablename__ = "processed_messages"
+
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True
+    )
+    message_hash = db.Column(db.String(32), primary_key=True)  # BLAKE2b-128 of the normalized Message-ID
+    seen_at = db.Column(
+        db.DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc)
+    )
+
+    def __repr__(self):
+        return f"<ProcessedMessage account_id={self.account_id} {self.message_hash}>"
+
+
 class FailureLog(db.Model):
     """Records of failed Discord webhook deliveries (kept 30 days)."""
 
@@ -183,6 +253,54 @@ class FailureLog(db.Model):
         return f"<FailureLog {self.id} @ {self.created_at}>"
 
 
+class NotificationOutbox(db.Model):
+    """
+    A rendered Discord notification waiting for delivery.
+
+    Written in the same transaction as the account cursor, so a notification
+    is recorded exactly once per (account, message, rule) and delivered by the
+    outbox workers independently of mail fetching.
+    """
+
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        db.UniqueConstraint("account_id", "message_key", "rule_id", name="uq_notification_outbox_message_rule"),
+        db.Index("ix_notification_outbox_due", "status", "next_attempt_at"),
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("accounts.id", ondelete="SET NULL"), nullable=True
+    )
+    rule_id = db.Column(
+        db.Integer, db.ForeignKey("rules.id", ondelete="SET NULL"), nullable=True
+    )
+    message_key = db.Column(db.String(500), nullable=False)  # Message-ID (or UID-based fallback)
+    message_uid = db.Column(db.Integer, nullable=True)
+    from_address = db.Column(db.String(500), nullable=True)
+    subject = db.Column(db.String(1000), nullable=True)
+    rule_name = db.Column(db.String(200), nullable=False, default="")
+    webhook_url = db.Column(db.String(500), nullable=False)
+    rendered_message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<NotificationOutbox {self.id} {self.status} rule_id={self.rule_id}>"
+
+
 class WorkerState(db.Model):
     """Singleton row to control the worker daemon from the Web UI."""
 
@@ -192,6 +310,8 @@ class WorkerState(db.Model):
     is_running = db.Column(db.Boolean, nullable=False, default=True)
     poll_interval = db.Column(db.Integer, nullable=False, default=60)
     display_timezone = db.Column(db.String(50), nullable=False, default="UTC")  # IANA timezone name (e.g., "Asia/Tokyo", "UTC")
+    profile_cycles = db.Column(db.Integer, nullable=False, default=0)  # Worker cycles to profile (0 = no request)
+    profile_requested_at = db.Column(db.DateTime, nullable=True)  # Identifies the profile request
     updated_at = db.Column(
         db.DateTime,
         nullable=False,
@@ -200,6 +320,43 @@ class WorkerState(db.Model):
     )
 
 
+class WorkerNode(db.Model):
+    """A running worker process; accounts are leased out between the nodes with a recent heartbeat."""
+
+    __tablename__ = "worker_nodes"
+
+    id = db.Column(db.String(100), primary_key=True)  # hostname-pid-random, or WORKER_NODE_ID
+    started_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    heartbeat_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+    metrics = db.Column(db.Text, nullable=True)  # JSON snapshot of app.metrics, written with each heartbeat
+
+    def __repr__(self):
+        return f"<WorkerNode {self.id} @ {self.heartbeat_at}>"
+
+
+class WorkerProfile(db.Model):
+    """Sampling profile of a few worker cycles, requested from the maintenance page."""
+
+    __tablename__ = "worker_profiles"
+
+    id = db.Column(db.Integer, primary_key=True)
+    node_id = db.Column(db.String(100), nullable=False)
+    cycles = db.Column(db.Integer, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    folded_stacks = db.Column(db.Text, nullable=False)  # "thread;outer;...;inner count" per line
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )
+
+    def __repr__(self):
+        return f"<WorkerProfile {self.id} {self.node_id} @ {self.created_at}>"
+
+
 class WorkerTrigger(db.Model):
     """Trigger record to request immediate polling for a specific account."""
 
@@ -1,103 +1,88 @@
 """
-Shared notification logic – evaluate rules against a message and send Discord notifications.
-Used by both the worker daemon and the "receive now" web route.
+Notification logic – evaluate rules against a message and queue Discord notifications.
+Used by the worker daemon; the "receive now" web route only queues a worker trigger.
 """
 
 import logging
+from typing import List
 
-from app.extensions import db
-from app.models import Rule, FailureLog
-from app.matcher import evaluate_rule
-from app.discord import send_notification
+from app.matcher import CompiledRule, RuleSet, flag_regex_timeouts, load_rule_set
+from app.metrics import RULE_EVALUATION_SECONDS
+from app.outbox import enqueue_notification
+from app.tracing import span
 
 logger = logging.getLogger(__name__)
 
 
-def evaluate_and_notify(account, msg):
+@span("evaluate_and_notify")
+def evaluate_and_notify(account, msg, rule_set: RuleSet = None, timed_out: List[CompiledRule] = None):
     """
-    Evaluate all enabled rules against a single message and send a
-    Discord notification for the first matching rule.
+    Evaluate all enabled rules against a single message and queue a
+    Discord notification for the first matching rule in the outbox.
+    The caller commits the queued notification together with its cursor.
 
-    Returns True if a rule matched and notification was attempted.
-    """
-    rules = Rule.query.order_by(Rule.position).all()
-
-    for rule in rules:
-        if not rule.enabled:
-            continue
+    *rule_set* is the compiled rule set to use (loaded via load_rule_set()
+    if omitted); callers handling many messages should load it once.
 
-        # Check if rule is restricted to a specific account
-        if rule.account_id is not None and rule.account_id != account.id:
-            logger.debug("Rule '%s' skipped: account filter (%d != %d)", rule.name, rule.account_id, account.id)
-            continue
+    Rules whose regex exceeded the time budget are appended to *timed_out*;
+    the caller flags them with flag_regex_timeouts() just before it commits,
+    so no row lock on rules is held while it keeps talking to the mail server.
+    Without *timed_out* they are flagged here (uncommitted).
 
-        matched = evaluate_rule(
-            rule,
+    Returns True if a rule matched and a notification was queued.
+    """
+    if rule_set is None:
+        rule_set = load_rule_set()
+
+    flag_now = timed_out is None
+    if flag_now:
+        timed_out = []
+    with RULE_EVALUATION_SECONDS.time():
+        rule = rule_set.first_match(
+            account.id,
             from_address=msg.from_address,
             to_address=msg.to_address,
             subject=msg.subject,
-            account_id=account.id,
-            account_name=account.name,
+            timed_out=timed_out,
         )
-
-        if not matched:
-            continue
-
-        if not rule.webhook:
-            logger.warning("Rule '%s' matched but has no webhook configured", rule.name)
-            return False
-
-        logger.info("Matched rule '%s' → sending to Discord via '%s'", rule.name, rule.webhook.name)
-
-        # Render notification message
-        fmt = rule.notification_format
-        if fmt and fmt.template:
-            template_vars = {
-                "account_name": account.name,
-                "from_address": msg.from_address,
-                "subject": msg.subject,
-                "rule_name": rule.name,
-                "date": msg.date,
-            }
-            try:
-                rendered = fmt.template.format(**template_vars)
-            except Exception as exc:
-                logger.error("Format rendering failed: %s", exc)
-                rendered = (
-                    f"**アカウント:** {account.name}\n"
-                    f"**ルール:** {rule.name}\n"
-                    f"**送信元:** {msg.from_address}\n"
-                    f"**件名:** {msg.subject}"
-                )
-        else:
+    if flag_now:
+        flag_regex_timeouts(timed_out)
+    if rule is None:
+        return False
+
+    if not rule.webhook_url:
+        logger.warning("Rule '%s' matched but has no webhook configured", rule.name)
+        return False
+
+    logger.info("Matched rule '%s' → queued for Discord via '%s'", rule.name, rule.webhook_name)
+
+    # Render notification message
+    if rule.format_template:
+        template_vars = {
+            "account_name": account.name,
+            "from_address": msg.from_address,
+            "subject": msg.subject,
+            "rule_name": rule.name,
+            "date": msg.date,
+        }
+        try:
+            rendered = rule.format_template.format(**template_vars)
+        except Exception as exc:
+            logger.error("Format rendering failed: %s", exc)
             rendered = (
                 f"**アカウント:** {account.name}\n"
                 f"**ルール:** {rule.name}\n"
                 f"**送信元:** {msg.from_address}\n"
                 f"**件名:** {msg.subject}"
             )
+    else:
+        rendered = (
+            f"**アカウント:** {account.name}\n"
+            f"**ルール:** {rule.name}\n"
+            f"**送信元:** {msg.from_address}\n"
+            f"**件名:** {msg.subject}"
+        )
 
-        # Send to Discord
-        try:
-            send_notification(
-                rule.webhook.url,
-                rendered_message=rendered,
-                rule_name=rule.name,
-                subject=msg.subject,
-            )
-        except Exception as exc:
-            logger.error("Discord send failed: %s", exc)
-            log = FailureLog(
-                account_id=account.id,
-                rule_id=rule.id,
-                message_uid=msg.uid,
-                from_address=msg.from_address,
-                subject=msg.subject,
-                error_message=f"Discord error: {exc}",
-            )
-            db.session.add(log)
-            db.session.commit()
-
-        return True  # first match wins
-
-    return False
+    # Delivered by the outbox workers once the caller commits
+    enqueue_notification(account, msg, rule, rendered)
+    return True  # first match wins
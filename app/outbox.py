@@ -0,0 +1,282 @@
+"""
+Notification outbox – notifications are queued in the notification_outbox table
+in the same transaction as the account cursor, then delivered to Discord by a
+small pool of worker threads, independently of mail fetching.
+
+Notifications for the same webhook that become due together (after an
+OUTBOX_LINGER_SECONDS delay) are packed into multi-embed messages.
+
+Each (account, message, rule) is recorded exactly once (unique key, inserted
+with ON CONFLICT DO NOTHING). Delivery is at-least-once: a row is claimed with
+FOR UPDATE SKIP LOCKED (plus a compare-and-set on next_attempt_at) and leased
+for OUTBOX_LEASE_SECONDS, so the row of a worker that died mid-delivery is
+picked up again.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+
+import requests
+
+from app.discord import (
+    MAX_EMBED_CHARS_PER_MESSAGE,
+    MAX_EMBEDS_PER_MESSAGE,
+    DiscordRateLimited,
+    build_embed,
+    embed_size,
+    send_embeds,
+)
+from app.extensions import db, insert_ignore
+from app.models import FailureLog, NotificationOutbox
+from app.tracing import span, trace
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+
+# Notifications wait this long before delivery so a burst to one webhook can be
+# coalesced into multi-embed messages
+OUTBOX_LINGER_SECONDS = float(os.environ.get("OUTBOX_LINGER_SECONDS", "1.0"))
+
+# Rows claimed per round, and how long an idle delivery thread sleeps between rounds
+OUTBOX_CLAIM_BATCH = 50
+OUTBOX_POLL_SECONDS = 2
+
+# A claimed row becomes claimable again after this (its worker died mid-delivery)
+OUTBOX_LEASE_SECONDS = 120
+
+# Exponential retry backoff: 5s, 10s, 20s, ... capped at one hour
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+# Delivered rows are kept this long (for inspection), failed ones like FailureLog
+SENT_RETENTION_DAYS = 7
+
+# webhook URL -> monotonic time until which Discord asked us to back off (429)
+_rate_limited_until: Dict[str, float] = {}
+_rate_limit_lock = threading.Lock()
+
+
+def message_key(msg) -> str:
+    """Identity of *msg* for the outbox unique key: its Message-ID, or a UID-based fallback."""
+    if msg.message_id:
+        return msg.message_id
+    return f"<uid-{msg.uid}-{int(msg.internal_date.timestamp())}>"
+
+
+def enqueue_notification(account, msg, rule, rendered_message: str):
+    """
+    Queue a notification for delivery. Not committed here: the caller commits
+    it together with the cursor that marks *msg* as processed.
+    """
+    insert_ignore(NotificationOutbox, [{
+        "account_id": account.id,
+        "rule_id": rule.id,
+        "message_key": message_key(msg)[:500],
+        "message_uid": msg.uid,
+        "from_address": (msg.from_address or "")[:500],
+        "subject": (msg.subject or "")[:1000],
+        "rule_name": rule.name,
+        "webhook_url": rule.webhook_url,
+        "rendered_message": rendered_message,
+        "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=OUTBOX_LINGER_SECONDS),
+    }])
+
+
+def claim_due(limit: int = OUTBOX_CLAIM_BATCH) -> List[NotificationOutbox]:
+    """Lease up to *limit* due rows (skipping rows other workers hold) and commit the lease."""
+    now = datetime.now(timezone.utc)
+    candidates = (
+        db.session.query(NotificationOutbox.id, NotificationOutbox.next_attempt_at)
+        .filter(
+            NotificationOutbox.status == NotificationOutbox.STATUS_PENDING,
+            NotificationOutbox.next_attempt_at <= now,
+        )
+        .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    lease_until = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+    claimed = []
+    for row_id, due_at in candidates:
+        # Compare-and-set on next_attempt_at keeps the claim exclusive even
+        # where SKIP LOCKED is unavailable (SQLite in development)
+        updated = NotificationOutbox.query.filter_by(id=row_id, next_attempt_at=due_at).update(
+            {"attempts": NotificationOutbox.attempts + 1, "next_attempt_at": lease_until},
+            synchronize_session=False,
+        )
+        if updated:
+            claimed.append(row_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return NotificationOutbox.query.filter(NotificationOutbox.id.in_(claimed)).order_by(NotificationOutbox.id).all()
+
+
+def deliver_due(limit: int = OUTBOX_CLAIM_BATCH) -> int:
+    """Claim and deliver one round of due notifications; returns the number claimed."""
+    with trace("deliver_outbox"):
+        with span("claim"):
+            rows = claim_due(limit)
+        by_webhook: Dict[str, List[NotificationOutbox]] = {}
+        for row in rows:
+            by_webhook.setdefault(row.webhook_url, []).append(row)
+        for webhook_rows in by_webhook.values():
+            for batch in pack_embeds(webhook_rows):
+                _deliver(batch)
+                with span("commit"):
+                    db.session.commit()
+    return len(rows)
+
+
+def pack_embeds(rows: List[NotificationOutbox]) -> Iterator[List[NotificationOutbox]]:
+    """Split rows for one webhook into messages within Discord's embed count and size limits."""
+    batch, size = [], 0
+    for row in rows:
+        row_size = embed_size(build_embed(row.rendered_message))
+        if batch and (len(batch) >= MAX_EMBEDS_PER_MESSAGE or size + row_size > MAX_EMBED_CHARS_PER_MESSAGE):
+            yield batch
+            batch, size = [], 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        yield batch
+
+
+def _deliver(rows: List[NotificationOutbox]):
+    """Send *rows* (same webhook) as one message and record the outcome on every row."""
+    now = datetime.now(timezone.utc)
+    webhook_url = rows[0].webhook_url
+
+    with _rate_limit_lock:
+        wait = _rate_limited_until.get(webhook_url, 0) - time.monotonic()
+    if wait > 0:
+        # Another notification for this webhook was just rate limited
+        for row in rows:
+            row.attempts -= 1
+            row.next_attempt_at = now + timedelta(seconds=wait)
+        return
+
+    try:
+        send_embeds(webhook_url, [build_embed(row.rendered_message) for row in rows])
+    except DiscordRateLimited as exc:
+        logger.warning("Discord rate limited webhook for rule=%s – retrying in %.1fs", rows[0].rule_name, exc.retry_after)
+        with _rate_limit_lock:
+            _rate_limited_until[webhook_url] = time.monotonic() + exc.retry_after
+        for row in rows:
+            row.attempts -= 1  # not a failure of this notification
+            row.next_attempt_at = now + timedelta(seconds=exc.retry_after)
+            row.last_error = str(exc)
+    except requests.HTTPError as exc:
+        status = exc.response.status_code if exc.response is not None else None
+        if status == 400 and len(rows) > 1:
+            # One embed was rejected: send individually so only that one fails
+            logger.warning("Discord rejected a %d-embed message – sending individually", len(rows))
+            for row in rows:
+                _deliver([row])
+        elif status is not None and 400 <= status < 500:
+            for row in rows:
+                _give_up(row, exc)  # bad request / unknown webhook: retrying will not help
+        else:
+            for row in rows:
+                _retry_later(row, exc, now)
+    except Exception as exc:
+        for row in rows:
+            _retry_later(row, exc, now)
+    else:
+        for row in rows:
+            row.status = NotificationOutbox.STATUS_SENT
+            row.sent_at = now
+            row.last_error = None
+        logger.info("Discord notification sent for %d message(s): %s",
+                    len(rows), ", ".join(sorted({row.rule_name for row in rows})))
+
+
+def _retry_later(row: NotificationOutbox, exc: Exception, now: datetime):
+    if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+        _give_up(row, exc)
+        return
+    delay = min(RETRY_BASE_SECONDS * 2 ** (row.attempts - 1), RETRY_MAX_SECONDS)
+    logger.warning("Discord send failed (attempt %d/%d, retry in %ds): %s",
+                   row.attempts, OUTBOX_MAX_ATTEMPTS, delay, exc)
+    row.next_attempt_at = now + timedelta(seconds=delay)
+    row.last_error = str(exc)
+
+
+def _give_up(row: NotificationOutbox, exc: Exception):
+    logger.error("Discord send failed: %s", exc)
+    row.status = NotificationOutbox.STATUS_FAILED
+    row.last_error = str(exc)
+    db.session.add(FailureLog(
+        account_id=row.account_id,
+        rule_id=row.rule_id,
+        message_uid=row.message_uid,
+        from_address=row.from_address,
+        subject=row.subject,
+        error_message=f"Discord error: {exc}",
+    ))
+
+
+def purge_old(failed_days: int = 30) -> int:
+    """Delete delivered rows older than SENT_RETENTION_DAYS and failed ones older than *failed_days*."""
+    now = datetime.now(timezone.utc)
+    deleted = NotificationOutbox.query.filter(
+        NotificationOutbox.status == NotificationOutbox.STATUS_SENT,
+        NotificationOutbox.created_at < now - timedelta(days=SENT_RETENTION_DAYS),
+    ).delete(synchronize_session=False)
+    deleted += NotificationOutbox.query.filter(
+        NotificationOutbox.status == NotificationOutbox.STATUS_FAILED,
+        NotificationOutbox.created_at < now - timedelta(days=failed_days),
+    ).delete(synchronize_session=False)
+    return deleted
+
+
+class OutboxDispatcher:
+    """Delivery threads draining the outbox, each with its own app context (and DB session)."""
+
+    def __init__(self, app, workers: int = OUTBOX_WORKERS):
+        self._app = app
+        self._workers = workers
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def start(self):
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Outbox dispatcher started with %d delivery thread(s)", self._workers)
+
+    def wake(self):
+        """Deliver newly committed notifications without waiting for the next poll."""
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def _run(self):
+        with self._app.app_context():
+            while not self._stop_event.is_set():
+                try:
+                    claimed = deliver_due()
+                except Exception:
+                    logger.exception("Outbox delivery round failed")
+                    db.session.rollback()
+                    claimed = 0
+                if not claimed:
+                    woken = self._wake_event.wait(OUTBOX_POLL_SECONDS)
+                    self._wake_event.clear()
+                    if woken:
+                        # New notifications were just queued: let the burst linger
+                        self._stop_event.wait(OUTBOX_LINGER_SECONDS)
@@ -0,0 +1,89 @@
+"""Multi-pattern string indexes – find every matching contains / prefix / suffix pattern in one pass."""
+
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Aho–Corasick automaton over a fixed set of needles.
+
+    ``search(text)`` returns the keys of every needle occurring in *text* in
+    a single left-to-right pass, regardless of how many needles there are.
+    """
+
+    def __init__(self, needles: Iterable[Tuple[str, Hashable]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Hashable, ...]] = [()]
+
+        for needle, key in needles:
+            state = 0
+            for ch in needle:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state] += (key,)
+
+        # Breadth-first: failure links point to the longest proper suffix that is also a prefix
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> Set[Hashable]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set(out[0])  # empty needles match everything
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class PrefixTrie:
+    """Character trie; ``search(text)`` returns the keys of every needle that *text* starts with."""
+
+    _KEYS = ""  # children are single characters, so the empty string is free for payloads
+
+    def __init__(self, needles: Iterable[Tuple[str, Hashable]]):
+        self._root: dict = {}
+        for needle, key in needles:
+            node = self._root
+            for ch in needle:
+                node = node.setdefault(ch, {})
+            node.setdefault(self._KEYS, []).append(key)
+
+    def search(self, text: str) -> Set[Hashable]:
+        node = self._root
+        found = set(node.get(self._KEYS, ()))
+        for ch in text:
+            node = node.get(ch)
+            if node is None:
+                break
+            found.update(node.get(self._KEYS, ()))
+        return found
+
+
+class SuffixTrie(PrefixTrie):
+    """``search(text)`` returns the keys of every needle that *text* ends with (e.g. "@example.com")."""
+
+    def __init__(self, needles: Iterable[Tuple[str, Hashable]]):
+        super().__init__((needle[::-1], key) for needle, key in needles)
+
+    def search(self, text: str) -> Set[Hashable]:
+        return super().search(text[::-1])
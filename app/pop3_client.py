@@ -1,15 +1,57 @@
 """POP3 helper – fetch new messages using UIDL + Date-based cursor."""
 
-import email
+import hashlib
 import logging
 import poplib
-from typing import Iterator, Optional, Set
+from typing import Container, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, timezone
 
-from app.imap_client import MailMessage, decode_header_value, parse_internal_date
+from app.imap_client import (
+    MailMessage, decode_header_value, parse_headers, parse_internal_date, prefetch_seen,
+)
+from app.metrics import DEDUP_SKIPPED, current_account, fetch_phase
 
 logger = logging.getLogger(__name__)
 
+# Messages fetched with TOP (and held in memory) before yielding them; with
+# PIPELINING, the TOP commands of a chunk are sent together
+TOP_CHUNK_SIZE = 100
+
+
+class UidlSnapshot:
+    """
+    UIDLs already examined with TOP, so messages left on the server are not
+    downloaded again every poll. Stored as 8-byte digests (serialized by
+    to_bytes()) and pruned to the server's current UIDL listing.
+    """
+
+    DIGEST_SIZE = 8
+
+    def __init__(self, data: Optional[bytes] = None):
+        data = data or b""
+        size = self.DIGEST_SIZE
+        self._digests = {data[i:i + size] for i in range(0, len(data) - size + 1, size)}
+
+    @classmethod
+    def _digest(cls, uidl: str) -> bytes:
+        return hashlib.blake2b(uidl.encode("utf-8", "surrogateescape"), digest_size=cls.DIGEST_SIZE).digest()
+
+    def __contains__(self, uidl: str) -> bool:
+        return self._digest(uidl) in self._digests
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def add(self, uidl: str):
+        self._digests.add(self._digest(uidl))
+
+    def prune(self, listing: Iterable[str]):
+        """Forget UIDLs that are no longer on the server."""
+        self._digests &= {self._digest(uidl) for uidl in listing}
+
+    def to_bytes(self) -> bytes:
+        return b"".join(sorted(self._digests))
+
 
 def fetch_new_messages(
     host: str,
@@ -20,7 +62,8 @@ def fetch_new_messages(
     last_processed_date: Optional[datetime] = None,
     mailbox_name: str = "INBOX",  # ignored for POP3
     ssl_mode: str = None,
-    processed_uidls: Optional[Set[str]] = None,
+    processed_uidls: Optional[Container[str]] = None,
+    uidl_snapshot: Optional[UidlSnapshot] = None,
 ) -> Iterator[MailMessage]:
     """
     Connect via POP3 and fetch new messages using UIDL + Date-based cursor.
@@ -28,131 +71,258 @@ def fetch_new_messages(
     Algorithm:
     1. Connect and authenticate
     2. UIDL to get message-number -> UIDL mapping
-    3. Skip messages whose UIDL (or synthetic Message-ID) is in processed_uidls
-    4. For remaining: TOP to fetch headers only
+    3. Skip messages whose UIDL is in uidl_snapshot, or whose UIDL (or synthetic
+       Message-ID) is in processed_uidls
+    4. For remaining: TOP to fetch headers only, parsing just the fields MailMessage uses,
+       TOP_CHUNK_SIZE messages at a time (pipelined if CAPA lists PIPELINING, RFC 2449)
     5. Parse Date header; client-side filter: only yield if date > last_processed_date
-    6. Return MailMessage objects sorted by date
+    6. Yield each chunk sorted by date before fetching the next
+
+    This is a generator: the connection stays open (and is closed with QUIT)
+    while the caller processes messages.
 
     Args:
         last_processed_date: High-water mark (UTC datetime). If None, initialization mode.
         mailbox_name: Ignored for POP3 (always INBOX).
         ssl_mode: "none", "starttls", or "ssl".
-        processed_uidls: Set of already-processed identifiers for fast lookup.
+        processed_uidls: Already-processed identifiers (set or ProcessedMessages) for fast lookup.
+        uidl_snapshot: UIDLs already examined; pruned to the current listing and,
+            as the stream is consumed, extended with every UIDL that was filtered
+            out or yielded and handled by the caller.
     """
     if processed_uidls is None:
         processed_uidls = set()
 
     try:
-        # Establish connection
-        if ssl_mode:
-            if ssl_mode == "ssl":
-                conn = poplib.POP3_SSL(host, port)
-            elif ssl_mode == "starttls":
-                conn = poplib.POP3(host, port)
-                conn.stls()
-            else:  # "none"
-                conn = poplib.POP3(host, port)
-        else:
-            # Legacy: use_ssl + port-based logic
-            if use_ssl:
-                if port == 995:
-                    conn = poplib.POP3_SSL(host, port)
-                else:
-                    conn = poplib.POP3(host, port)
-                    conn.stls()
-            else:
-                conn = poplib.POP3(host, port)
-
-        conn.user(user)
-        conn.pass_(password)
-
-        # Initialization mode: don't fetch anything on first run
-        if last_processed_date is None:
-            logger.info("POP3 初回実行モード: メールを取得しません（カーソルを初期化してください）")
-            conn.quit()
-            return iter([])
-
-        # Get UIDL listing
-        resp, uidl_list, _ = conn.uidl()
-        if not uidl_list:
-            conn.quit()
-            return iter([])
-
-        # Parse UIDL list: each entry is b"msg_num uidl"
-        msg_uidls = []
-        for entry in uidl_list:
-            line = entry.decode("utf-8", errors="replace") if isinstance(entry, bytes) else entry
-            parts = line.split(None, 1)
-            if len(parts) == 2:
-                msg_uidls.append((int(parts[0]), parts[1]))
-
-        # Filter out already-processed UIDLs
-        new_msgs = []
-        for num, uidl in msg_uidls:
-            if uidl in processed_uidls or f"<pop3-uidl-{uidl}>" in processed_uidls:
-                continue
-            new_msgs.append((num, uidl))
-
-        if not new_msgs:
-            logger.debug("POP3: no new UIDLs found")
-            conn.quit()
-            return iter([])
-
-        logger.debug("POP3: %d new UIDL(s) out of %d total", len(new_msgs), len(msg_uidls))
-
-        messages = []
-        for msg_num, uidl in new_msgs:
+        with fetch_phase("connect"):
+            conn = _connect(host, port, use_ssl, ssl_mode)
+        try:
+            with fetch_phase("login"):
+                conn.user(user)
+                conn.pass_(password)
+
+            # Initialization mode: don't fetch anything on first run
+            if last_processed_date is None:
+                logger.info("POP3 初回実行モード: メールを取得しません（カーソルを初期化してください）")
+                return
+
+            pipelining = _supports_pipelining(conn)
+
+            # Get UIDL listing
+            with fetch_phase("search"):
+                resp, uidl_list, _ = conn.uidl()
+
+            # Parse UIDL list: each entry is b"msg_num uidl"
+            msg_uidls = []
+            for entry in uidl_list or ():
+                line = entry.decode("utf-8", errors="replace") if isinstance(entry, bytes) else entry
+                parts = line.split(None, 1)
+                if len(parts) == 2:
+                    msg_uidls.append((int(parts[0]), parts[1]))
+
+            if uidl_snapshot is not None:
+                uidl_snapshot.prune(uidl for _, uidl in msg_uidls)
+
+            # Filter out already-examined and already-processed UIDLs
+            unexamined = [(num, uidl) for num, uidl in msg_uidls
+                          if uidl_snapshot is None or uidl not in uidl_snapshot]
+            prefetch_seen(processed_uidls, (key for _, uidl in unexamined
+                                                 for key in (uidl, f"<pop3-uidl-{uidl}>")))
+            new_msgs = []
+            for num, uidl in unexamined:
+                if uidl in processed_uidls or f"<pop3-uidl-{uidl}>" in processed_uidls:
+                    DEDUP_SKIPPED.inc(account=current_account())
+                    continue
+                new_msgs.append((num, uidl))
+
+            if not new_msgs:
+                logger.debug("POP3: no new UIDLs found")
+                return
+
+            logger.debug("POP3: %d new UIDL(s) out of %d total", len(new_msgs), len(msg_uidls))
+
+            count = 0
+            for offset in range(0, len(new_msgs), TOP_CHUNK_SIZE):
+                with fetch_phase("fetch"):
+                    messages = _fetch_chunk(conn, new_msgs[offset:offset + TOP_CHUNK_SIZE], last_processed_date,
+                                            pipelining, uidl_snapshot)
+                count += len(messages)
+                # The caller checks each Message-ID: look them up for the whole chunk at once
+                prefetch_seen(processed_uidls, (msg.message_id for _, msg in messages))
+                for uidl, msg in messages:
+                    yield msg
+                    # Resumed: the caller has finished with *msg*
+                    if uidl_snapshot is not None:
+                        uidl_snapshot.add(uidl)
+        finally:
             try:
-                # TOP msg_num 0 -> fetch headers only (0 body lines)
-                resp, header_lines, _ = conn.top(msg_num, 0)
-            except poplib.error_proto as exc:
-                logger.warning("POP3 TOP failed for msg %d (UIDL %s): %s", msg_num, uidl, exc)
-                continue
-
-            raw_header = b"\r\n".join(header_lines)
-            msg = email.message_from_bytes(raw_header)
-
-            # Parse Date header as the "internal date" equivalent
-            date_header = msg.get("Date", "")
-            if not date_header:
-                logger.warning("POP3 msg %d (UIDL %s): no Date header, skipping", msg_num, uidl)
-                continue
-
-            msg_date = parse_internal_date(date_header)
-
-            # Client-side date filter
-            if msg_date <= last_processed_date:
-                logger.debug("POP3 msg %d: date %s <= cursor, skipping", msg_num, msg_date.isoformat())
-                continue
-
-            from_addr = decode_header_value(msg.get("From", ""))
-            to_addr = decode_header_value(msg.get("To", ""))
-            subj = decode_header_value(msg.get("Subject", ""))
-            message_id = msg.get("Message-ID", "").strip()
-
-            # Use UIDL as fallback if no Message-ID header
-            if not message_id:
-                message_id = f"<pop3-uidl-{uidl}>"
-                logger.debug("POP3 msg %d: no Message-ID, using UIDL-based ID: %s", msg_num, message_id)
-
-            messages.append(MailMessage(
-                uid=msg_num,
-                from_address=from_addr,
-                to_address=to_addr,
-                subject=subj,
-                date=date_header,
-                message_id=message_id,
-                internal_date=msg_date,
-            ))
-
-        conn.quit()
-
-        # Sort by date for chronological processing
-        messages.sort(key=lambda m: m.internal_date)
-
-        logger.info("POP3: found %d new message(s) after %s", len(messages), last_processed_date.isoformat())
-        return iter(messages)
+                conn.quit()
+            except (poplib.error_proto, OSError):
+                pass
+
+        logger.info("POP3: found %d new message(s) after %s", count, last_processed_date.isoformat())
 
     except Exception:
         logger.exception("POP3 fetch failed for %s@%s:%s", user, host, port)
         raise
+
+
+def _connect(host: str, port: int, use_ssl: bool, ssl_mode: Optional[str]) -> poplib.POP3:
+    """Open a POP3 connection according to *ssl_mode* (or the legacy use_ssl/port rules)."""
+    if ssl_mode:
+        if ssl_mode == "ssl":
+            return poplib.POP3_SSL(host, port)
+        conn = poplib.POP3(host, port)
+        if ssl_mode == "starttls":
+            conn.stls()
+        return conn
+
+    # Legacy: use_ssl + port-based logic
+    if use_ssl:
+        if port == 995:
+            return poplib.POP3_SSL(host, port)
+        conn = poplib.POP3(host, port)
+        conn.stls()
+        return conn
+    return poplib.POP3(host, port)
+
+
+def _supports_pipelining(conn: poplib.POP3) -> bool:
+    """True if the server lists PIPELINING in its CAPA response (servers without CAPA do not)."""
+    try:
+        return "PIPELINING" in conn.capa()
+    except poplib.error_proto:
+        return False
+
+
+def _is_refusal(exc: poplib.error_proto) -> bool:
+    """
+    True if *exc* is the server's -ERR reply to one command; the connection
+    is still in step. poplib raises error_proto with the status line (bytes)
+    for those, and with a str for its own errors (EOF, line too long), after
+    which no further reply can be read.
+    """
+    return bool(exc.args) and isinstance(exc.args[0], bytes)
+
+
+class _PipelinedTop:
+    """
+    TOP commands sent together and their replies read in order (RFC 2449 PIPELINING).
+
+    poplib has no public API for sending a command without reading its reply,
+    so this relies on two undocumented poplib.POP3 methods: _putline(), which
+    writes a line with CRLF (and poplib's debug output and audit event), and
+    _getlongresp(), which reads one multi-line reply. available() is False if
+    a Python version lacks either; TOP then falls back to conn.top().
+    """
+
+    def __init__(self, conn: poplib.POP3):
+        self._conn = conn
+
+    @staticmethod
+    def available(conn: poplib.POP3) -> bool:
+        return callable(getattr(conn, "_putline", None)) and callable(getattr(conn, "_getlongresp", None))
+
+    def send(self, msg_nums: Iterable[int]):
+        # One write: sent command by command, Nagle would hold back all but the first until it is ACKed
+        self._conn._putline(b"\r\n".join(b"TOP %d 0" % msg_num for msg_num in msg_nums))
+
+    def read(self) -> List[bytes]:
+        """Header lines of the next reply; raises error_proto like conn.top()."""
+        _, header_lines, _ = self._conn._getlongresp()
+        return header_lines
+
+
+def _top_headers(
+    conn: poplib.POP3, msgs: List[Tuple[int, str]], pipelining: bool
+) -> Iterator[Tuple[int, str, Optional[List[bytes]]]]:
+    """
+    TOP msg_num 0 (headers only) for each (msg_num, uidl); yields
+    (msg_num, uidl, header lines), with None for messages the server refused.
+
+    With *pipelining* all commands are written at once and the replies read
+    in order, so a chunk costs one round-trip instead of one per message.
+    The generator must be exhausted to keep the replies in step. A lost
+    connection raises error_proto (or OSError) instead of refusing the rest.
+    """
+    pipeline = None
+    if pipelining:
+        if _PipelinedTop.available(conn):
+            pipeline = _PipelinedTop(conn)
+            pipeline.send(msg_num for msg_num, _ in msgs)
+        else:
+            logger.debug("poplib lacks the internals used for pipelining – sending TOP one at a time")
+    for msg_num, uidl in msgs:
+        try:
+            if pipeline is not None:
+                header_lines = pipeline.read()
+            else:
+                _, header_lines, _ = conn.top(msg_num, 0)
+        except poplib.error_proto as exc:
+            if not _is_refusal(exc):
+                raise
+            # Only the status line of a -ERR reply is sent, so later replies stay in step
+            logger.warning("POP3 TOP failed for msg %d (UIDL %s): %s", msg_num, uidl, exc)
+            header_lines = None
+        yield msg_num, uidl, header_lines
+
+
+def _fetch_chunk(
+    conn: poplib.POP3,
+    msgs: List[Tuple[int, str]],
+    last_processed_date: datetime,
+    pipelining: bool = False,
+    uidl_snapshot: Optional[UidlSnapshot] = None,
+) -> List[Tuple[str, MailMessage]]:
+    """
+    TOP each (msg_num, uidl) in *msgs* and return the new ones as (uidl, message)
+    sorted by date; UIDLs of messages filtered out are added to *uidl_snapshot*.
+    """
+    messages = []
+    for msg_num, uidl, header_lines in _top_headers(conn, msgs, pipelining):
+        if header_lines is None:
+            continue
+
+        raw_header = b"\r\n".join(header_lines)
+        msg = parse_headers(raw_header)
+
+        # Parse Date header as the "internal date" equivalent
+        date_header = msg.get("Date", "")
+        if not date_header:
+            logger.warning("POP3 msg %d (UIDL %s): no Date header, skipping", msg_num, uidl)
+            if uidl_snapshot is not None:
+                uidl_snapshot.add(uidl)
+            continue
+
+        msg_date = parse_internal_date(date_header)
+
+        # Client-side date filter
+        if msg_date <= last_processed_date:
+            logger.debug("POP3 msg %d: date %s <= cursor, skipping", msg_num, msg_date.isoformat())
+            if uidl_snapshot is not None:
+                uidl_snapshot.add(uidl)
+            continue
+
+        from_addr = decode_header_value(msg.get("From", ""))
+        to_addr = decode_header_value(msg.get("To", ""))
+        subj = decode_header_value(msg.get("Subject", ""))
+        message_id = msg.get("Message-ID", "").strip()
+
+        # Use UIDL as fallback if no Message-ID header
+        if not message_id:
+            message_id = f"<pop3-uidl-{uidl}>"
+            logger.debug("POP3 msg %d: no Message-ID, using UIDL-based ID: %s", msg_num, message_id)
+
+        messages.append((uidl, MailMessage(
+            uid=msg_num,
+            from_address=from_addr,
+            to_address=to_addr,
+            subject=subj,
+            date=date_header,
+            message_id=message_id,
+            internal_date=msg_date,
+        )))
+
+    # Sort by date for chronological processing
+    messages.sort(key=lambda item: item[1].internal_date)
+    return messages
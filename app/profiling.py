@@ -0,0 +1,194 @@
+"""
+On-demand profiling of worker cycles.
+
+The maintenance page requests a profile of the next N cycles
+(worker_state.profile_cycles / profile_requested_at). Each worker then samples
+the stacks of its main and poll/outbox threads every PROFILE_SAMPLE_SECONDS
+while a cycle is running (not while it sleeps) and stores the result in
+worker_profiles: folded stacks ("thread;outer;...;inner count" per line, for
+flamegraph.pl or speedscope) plus a text summary of the hottest functions.
+
+The request is never cleared by a worker: every node that was running when it
+was made owes one profile, and is done once it saved a profile after
+profile_requested_at (see profile_pending()).
+
+A sampling profiler is used instead of cProfile because it covers all threads
+at once (cProfile profiles one thread, and only one can run at a time on
+Python 3.12) and its overhead does not grow with the number of calls.
+"""
+
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.extensions import db
+from app.models import WorkerNode, WorkerProfile, WorkerState
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLE_SECONDS = float(os.environ.get("PROFILE_SAMPLE_SECONDS", "0.01"))
+
+# Upper bound for the number of cycles one request may profile
+PROFILE_MAX_CYCLES = 20
+
+# Profiles kept per worker node (older ones are deleted when a new one is saved)
+PROFILE_RETENTION = 20
+
+# Threads worth sampling (IDLE watchers and the event listener only block on sockets)
+_SAMPLED_THREAD_PREFIXES = ("MainThread", "poll", "outbox")
+
+# Functions listed in the text summary
+SUMMARY_TOP = 30
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Background thread counting the folded stacks of the sampled threads."""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._recording = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._recording.set()
+        self._thread.start()
+
+    def pause(self):
+        self._recording.clear()
+
+    def resume(self):
+        self._recording.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._recording.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            if not self._recording.is_set():
+                self._recording.wait()
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            self.samples += 1
+            for ident, frame in frames.items():
+                name = names.get(ident, "")
+                if not name.startswith(_SAMPLED_THREAD_PREFIXES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                # Threads of one pool share a flame graph root
+                stack.append(name.rstrip("0123456789_-"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> str:
+        """Hottest functions by samples on the stack (inclusive) and at the top of it (self)."""
+        inclusive: Counter = Counter()
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            for label in set(frames):
+                inclusive[label] += count
+            if frames:
+                own[frames[-1]] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} sample(s) every {self.interval * 1000:.0f} ms, {total} thread stack(s)", ""]
+        for title, counter in (("Inclusive", inclusive), ("Self", own)):
+            lines.append(f"{title}:")
+            for label, count in counter.most_common(SUMMARY_TOP):
+                lines.append(f"  {count / total * 100:6.2f}%  {count:7d}  {label}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+def profile_pending(state: Optional[WorkerState], node_id: str) -> bool:
+    """
+    True if worker *node_id* still owes a profile for the current request: it
+    was already running when the request was made and has not saved a profile since.
+    """
+    if state is None or not state.profile_cycles or state.profile_requested_at is None:
+        return False
+    requested_at = state.profile_requested_at
+    running = db.session.query(WorkerNode.id).filter(
+        WorkerNode.id == node_id, WorkerNode.started_at <= requested_at
+    ).first()
+    if running is None:
+        return False
+    done = db.session.query(WorkerProfile.id).filter(
+        WorkerProfile.node_id == node_id, WorkerProfile.created_at >= requested_at
+    ).first()
+    return done is None
+
+
+class CycleProfiler:
+    """Samples the next N worker cycles when the maintenance page asks for a profile."""
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self._sampler: Optional[StackSampler] = None
+        self._cycles = 0
+        self._cycles_left = 0
+        self._handled: Optional[Tuple[datetime, int]] = None
+
+    def begin_cycle(self, state: WorkerState):
+        """Call at the start of a cycle: starts a requested profile or resumes sampling."""
+        if self._sampler is not None:
+            self._sampler.resume()
+            return
+        request = (state.profile_requested_at, state.profile_cycles)
+        if not state.profile_cycles or request == self._handled:
+            return
+        self._handled = request
+        if not profile_pending(state, self.node_id):
+            return
+        self._cycles = self._cycles_left = min(state.profile_cycles, PROFILE_MAX_CYCLES)
+        self._sampler = StackSampler()
+        self._sampler.start()
+        logger.info("Profiling the next %d cycle(s)", self._cycles)
+
+    def end_cycle(self):
+        """Call when a cycle's work is done: pauses sampling and saves the profile after the last cycle."""
+        if self._sampler is None:
+            return
+        self._sampler.pause()
+        self._cycles_left -= 1
+        if self._cycles_left > 0:
+            return
+        sampler, self._sampler = self._sampler, None
+        sampler.stop()
+
+        db.session.add(WorkerProfile(
+            node_id=self.node_id,
+            cycles=self._cycles,
+            samples=sampler.samples,
+            folded_stacks=sampler.folded(),
+            summary=sampler.summary(),
+        ))
+        stale = [
+            profile_id for (profile_id,) in db.session.query(WorkerProfile.id)
+            .filter_by(node_id=self.node_id)
+            .order_by(WorkerProfile.id.desc())
+            .offset(PROFILE_RETENTION)
+        ]
+        if stale:
+            WorkerProfile.query.filter(WorkerProfile.id.in_(stale)).delete(synchronize_session=False)
+        db.session.commit()
+        logger.info("Profile of %d cycle(s) saved (%d samples)", self._cycles, sampler.samples)
@@ -1,16 +1,56 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app.extensions import db
-from app.models import Account, Rule, WorkerTrigger
+from app.models import Account, AccountMailbox, Rule, WorkerTrigger
 from app.imap_client_utils import list_mailboxes
+from app.dedup import forget_account
+from app.events import EVENT_ACCOUNTS, EVENT_TRIGGER, notify_worker
 
 accounts_bp = Blueprint("accounts", __name__, url_prefix="/accounts")
+
+
+def _parse_poll_interval(value):
+    """Form value -> seconds (at least 10), or None to use the global interval."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    return max(int(value), 10)
+
+
+def _parse_extra_mailboxes(value, primary):
+    """Form value (one folder per line) -> unique folder names other than the primary one."""
+    names = []
+    for line in (value or "").splitlines():
+        name = line.strip()[:120]
+        if name and name != primary and name not in names:
+            names.append(name)
+    return names
+
+
+def _set_extra_mailboxes(account, names, reset_cursors=False):
+    """Make the account's extra mailboxes match *names*; kept folders keep their cursors unless *reset_cursors*."""
+    existing = {mailbox.name: mailbox for mailbox in account.extra_mailboxes}
+    account.extra_mailboxes = [existing.get(name) or AccountMailbox(name=name) for name in names]
+    if reset_cursors:
+        for mailbox in account.extra_mailboxes:
+            mailbox.last_processed_internal_date = None
+            mailbox.last_uid = 0
+            mailbox.last_uidvalidity = 0
+            mailbox.last_uidnext = 0
+            mailbox.last_message_count = 0
+            mailbox.last_highestmodseq = 0
+
+
 @accounts_bp.route("/<int:account_id>/receive", methods=["POST"])
 def receive_now(account_id):
     account = Account.query.get_or_404(account_id)
-    
+    if not account.enabled:
+        flash(f"{account.name}は無効になっているため受信できません。", "warning")
+        return redirect(url_for("accounts.index"))
+
     # Create a trigger for the worker to process this account immediately
     trigger = WorkerTrigger(account_id=account.id)
     db.session.add(trigger)
+    notify_worker(EVENT_TRIGGER)
     db.session.commit()
     
     flash(f"{account.name}の即時受信をリクエストしました。ワーカーが次のサイクルで処理します。", "success")
@@ -52,8 +92,13 @@ def create():
             ssl_mode=request.form.get("ssl_mode", "ssl"),
             enabled="enabled" in request.form,
             mailbox_name=request.form.get("mailbox_name", "INBOX") if protocol_type == "imap" else "INBOX",
+            use_idle=protocol_type == "imap" and "use_idle" in request.form,
+            poll_interval=_parse_poll_interval(request.form.get("poll_interval")),
         )
+        if protocol_type == "imap":
+            _set_extra_mailboxes(account, _parse_extra_mailboxes(request.form.get("extra_mailboxes"), account.mailbox_name))
         db.session.add(account)
+        notify_worker(EVENT_ACCOUNTS)
         db.session.commit()
         flash("アカウントを作成しました。", "success")
         return redirect(url_for("accounts.index"))
@@ -65,6 +110,7 @@ def edit(account_id):
     account = Account.query.get_or_404(account_id)
     if request.method == "POST":
         old_protocol = account.protocol_type
+        old_mailbox = (account.imap_host, account.imap_user, account.mailbox_name)
         new_protocol = request.form.get("protocol_type", "imap")
         account.name = request.form["name"]
         account.protocol_type = new_protocol
@@ -76,14 +122,31 @@ def edit(account_id):
         account.use_ssl = "use_ssl" in request.form
         account.ssl_mode = request.form.get("ssl_mode", "ssl")
         account.enabled = "enabled" in request.form
+        account.use_idle = new_protocol == "imap" and "use_idle" in request.form
+        account.poll_interval = _parse_poll_interval(request.form.get("poll_interval"))
         if new_protocol == "imap":
             account.mailbox_name = request.form.get("mailbox_name", "INBOX")
+            _set_extra_mailboxes(
+                account,
+                _parse_extra_mailboxes(request.form.get("extra_mailboxes"), account.mailbox_name),
+                reset_cursors=old_protocol != new_protocol or old_mailbox[:2] != (account.imap_host, account.imap_user),
+            )
         else:
             account.mailbox_name = "INBOX"
+            _set_extra_mailboxes(account, [])
         # Reset cursor when protocol changes
         if old_protocol != new_protocol:
             account.last_processed_internal_date = None
-            account.processed_message_ids = ""
+            forget_account(account.id)
+        # UIDs (and POP3 UIDLs) are only meaningful within the mailbox they came from
+        if old_protocol != new_protocol or old_mailbox != (account.imap_host, account.imap_user, account.mailbox_name):
+            account.last_uid = 0
+            account.last_uidvalidity = 0
+            account.last_uidnext = 0
+            account.last_message_count = 0
+            account.last_highestmodseq = 0
+            account.pop3_seen_uidls = None
+        notify_worker(EVENT_ACCOUNTS)
         db.session.commit()
         flash("アカウントを更新しました。", "success")
         return redirect(url_for("accounts.index"))
@@ -94,6 +157,7 @@ def edit(account_id):
 def delete(account_id):
     account = Account.query.get_or_404(account_id)
     db.session.delete(account)
+    notify_worker(EVENT_ACCOUNTS)
     db.session.commit()
     flash("アカウントを削除しました。", "success")
     return redirect(url_for("accounts.index"))
@@ -1,8 +1,12 @@
+import json
 from datetime import datetime, timedelta, timezone
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify
 from app.extensions import db
-from app.models import FailureLog, WorkerState
+from app.events import EVENT_STATE, notify_worker
+from app.leases import WORKER_LEASE_SECONDS
+from app.models import FailureLog, NotificationOutbox, WorkerNode, WorkerProfile, WorkerState
+from app.profiling import PROFILE_MAX_CYCLES, profile_pending
 
 maintenance_bp = Blueprint("maintenance", __name__, url_prefix="/maintenance")
 
@@ -13,7 +17,22 @@ def index():
     logs = (
         FailureLog.query.order_by(FailureLog.created_at.desc()).limit(100).all()
     )
-    return render_template("maintenance/index.html", state=state, logs=logs)
+    profiles = WorkerProfile.query.order_by(WorkerProfile.id.desc()).limit(10).all()
+    # Live workers that have not saved a profile for the current request yet
+    profile_waiting = [
+        node.id for node in _live_nodes() if profile_pending(state, node.id)
+    ]
+    return render_template(
+        "maintenance/index.html", state=state, logs=logs, profiles=profiles, profile_max_cycles=PROFILE_MAX_CYCLES,
+        profile_waiting=profile_waiting,
+    )
+
+
+def _live_nodes():
+    """Worker nodes with a heartbeat within the lease period."""
+    return WorkerNode.query.filter(
+        WorkerNode.heartbeat_at >= datetime.now(timezone.utc) - timedelta(seconds=WORKER_LEASE_SECONDS)
+    ).order_by(WorkerNode.id).all()
 
 
 @maintenance_bp.route("/worker/toggle", methods=["POST"])
@@ -23,6 +42,7 @@ def toggle_worker():
         state = WorkerState(id=1, is_running=True, poll_interval=60)
         db.session.add(state)
     state.is_running = not state.is_running
+    notify_worker(EVENT_STATE)
     db.session.commit()
     status = "再開" if state.is_running else "停止"
     flash(f"ワーカーを{status}しました。", "success")
@@ -36,6 +56,7 @@ def set_interval():
     if interval < 10:
         interval = 10
     state.poll_interval = interval
+    notify_worker(EVENT_STATE)
     db.session.commit()
     flash(f"ポーリング間隔を {interval} 秒に設定しました。", "success")
     return redirect(url_for("maintenance.index"))
@@ -54,6 +75,33 @@ def set_timezone():
     return redirect(url_for("maintenance.index"))
 
 
+@maintenance_bp.route("/worker/profile", methods=["POST"])
+def request_profile():
+    """Ask every worker to profile its next N cycles."""
+    state = WorkerState.query.get(1)
+    if state is None:
+        state = WorkerState(id=1, is_running=True, poll_interval=60)
+        db.session.add(state)
+    cycles = min(max(int(request.form.get("profile_cycles", 3)), 1), PROFILE_MAX_CYCLES)
+    state.profile_cycles = cycles
+    state.profile_requested_at = datetime.now(timezone.utc)
+    notify_worker(EVENT_STATE)
+    db.session.commit()
+    flash(f"次の {cycles} サイクルのプロファイル取得を要求しました。", "success")
+    return redirect(url_for("maintenance.index"))
+
+
+@maintenance_bp.route("/profiles/<int:profile_id>/download")
+def download_profile(profile_id):
+    """Folded stacks of a profile (for flamegraph.pl or speedscope)."""
+    profile = WorkerProfile.query.get_or_404(profile_id)
+    return Response(
+        profile.folded_stacks,
+        mimetype="text/plain",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile.id}.folded"},
+    )
+
+
 @maintenance_bp.route("/logs/clear", methods=["POST"])
 def clear_logs():
     FailureLog.query.delete()
@@ -76,9 +124,25 @@ def cleanup_old_logs():
 @maintenance_bp.route("/api/status")
 def api_status():
     state = WorkerState.query.get(1)
+    nodes = _live_nodes()
     return jsonify(
         {
             "is_running": state.is_running if state else False,
             "poll_interval": state.poll_interval if state else 60,
+            "outbox_pending": NotificationOutbox.query.filter_by(
+                status=NotificationOutbox.STATUS_PENDING
+            ).count(),
+            "worker_nodes": len(nodes),
+            # Same counters and histograms as each worker's /metrics endpoint,
+            # as of its last heartbeat (histograms as count and sum)
+            "workers": [
+                {
+                    "node": node.id,
+                    "started_at": node.started_at.isoformat(),
+                    "heartbeat_at": node.heartbeat_at.isoformat(),
+                    "metrics": json.loads(node.metrics) if node.metrics else {},
+                }
+                for node in nodes
+            ],
         }
     )
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app.extensions import db
+from app.events import EVENT_RULES, notify_worker
 from app.models import NotificationFormat
 
 notification_formats_bp = Blueprint("notification_formats", __name__, url_prefix="/notification_formats")
@@ -17,6 +18,7 @@ def create():
             template=request.form["template"],
         )
         db.session.add(fmt)
+        notify_worker(EVENT_RULES)
         db.session.commit()
         flash("フォーマットを作成しました。", "success")
         return redirect(url_for("notification_formats.index"))
@@ -28,6 +30,7 @@ def edit(format_id):
     if request.method == "POST":
         fmt.name = request.form["name"]
         fmt.template = request.form["template"]
+        notify_worker(EVENT_RULES)
         db.session.commit()
         flash("フォーマットを更新しました。", "success")
         return redirect(url_for("notification_formats.index"))
@@ -37,6 +40,7 @@ def edit(format_id):
 def delete(format_id):
     fmt = NotificationFormat.query.get_or_404(format_id)
     db.session.delete(fmt)
+    notify_worker(EVENT_RULES)
     db.session.commit()
     flash("フォーマットを削除しました。", "success")
     return redirect(url_for("notification_formats.index"))
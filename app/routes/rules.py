@@ -1,6 +1,10 @@
+from datetime import datetime, timezone
+
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.extensions import db
+from app.events import EVENT_RULES, notify_worker
 from app.models import Rule, RuleCondition, Account, DiscordWebhook, NotificationFormat
+from app.matcher import validate_regex
 
 rules_bp = Blueprint("rules", __name__, url_prefix="/rules")
 
@@ -13,7 +17,7 @@ def index():
 
 @rules_bp.route("/new", methods=["GET", "POST"])
 def create():
-    if request.method == "POST":
+    if request.method == "POST" and _validate_conditions(request.form):
         webhook_id = _resolve_webhook(request.form)
         max_pos = db.session.query(db.func.max(Rule.position)).scalar() or 0
         format_id = int(request.form.get("notification_format_id") or 0) or None
@@ -29,6 +33,7 @@ def create():
         db.session.add(rule)
         db.session.flush()
         _save_conditions(rule, request.form)
+        notify_worker(EVENT_RULES)
         db.session.commit()
         flash("ルールを作成しました。", "success")
         return redirect(url_for("rules.index"))
@@ -42,16 +47,18 @@ def create():
 @rules_bp.route("/<int:rule_id>/edit", methods=["GET", "POST"])
 def edit(rule_id):
     rule = Rule.query.get_or_404(rule_id)
-    if request.method == "POST":
+    if request.method == "POST" and _validate_conditions(request.form):
         rule.name = request.form["name"]
         rule.discord_webhook_id = _resolve_webhook(request.form)
         rule.notification_format_id = int(request.form.get("notification_format_id") or 0) or None
         rule.account_id = int(request.form.get("account_id") or 0) or None
         rule.enabled = "enabled" in request.form
+        rule.regex_timeout_at = None
 
         RuleCondition.query.filter_by(rule_id=rule.id).delete()
         _save_conditions(rule, request.form)
 
+        notify_worker(EVENT_RULES)
         db.session.commit()
         flash("ルールを更新しました。", "success")
         return redirect(url_for("rules.index"))
@@ -66,6 +73,7 @@ def edit(rule_id):
 def delete(rule_id):
     rule = Rule.query.get_or_404(rule_id)
     db.session.delete(rule)
+    notify_worker(EVENT_RULES)
     db.session.commit()
     flash("ルールを削除しました。", "success")
     return redirect(url_for("rules.index"))
@@ -78,8 +86,11 @@ def reorder():
     if not order or not isinstance(order, list):
         return jsonify({"error": "invalid payload"}), 400
 
+    # Bump updated_at explicitly so the worker's compiled rule set is rebuilt
+    now = datetime.now(timezone.utc)
     for position, rule_id in enumerate(order, start=1):
-        Rule.query.filter_by(id=rule_id).update({"position": position})
+        Rule.query.filter_by(id=rule_id).update({"position": position, "updated_at": now})
+    notify_worker(EVENT_RULES)
     db.session.commit()
     return jsonify({"status": "ok"})
 
@@ -88,6 +99,7 @@ def reorder():
 def toggle(rule_id):
     rule = Rule.query.get_or_404(rule_id)
     rule.enabled = not rule.enabled
+    notify_worker(EVENT_RULES)
     db.session.commit()
     flash(
         f"ルール「{rule.name}」を{'有効' if rule.enabled else '無効'}にしました。",
@@ -110,8 +122,8 @@ def _resolve_webhook(form):
     return int(webhook_id) if webhook_id else None
 
 
-def _save_conditions(rule, form):
-    """Parse dynamically-added condition rows from the form."""
+def _iter_conditions(form):
+    """Yield (field, match_type, pattern) for the dynamically-added condition rows."""
     idx = 0
     while True:
         field = form.get(f"cond_field_{idx}")
@@ -121,11 +133,30 @@ def _save_conditions(rule, form):
         pattern = form.get(f"cond_pattern_{idx}", "")
 
         if field and pattern:
-            cond = RuleCondition(
-                rule_id=rule.id,
-                field=field,
-                match_type=match_type,
-                pattern=pattern,
-            )
-            db.session.add(cond)
+            yield field, match_type, pattern
         idx += 1
+
+
+def _validate_conditions(form):
+    """Flash an error for every invalid regex pattern; returns True if all are valid."""
+    valid = True
+    for field, match_type, pattern in _iter_conditions(form):
+        if match_type != RuleCondition.MATCH_REGEX:
+            continue
+        error = validate_regex(pattern)
+        if error:
+            flash(f"正規表現「{pattern}」が不正です: {error}", "danger")
+            valid = False
+    return valid
+
+
+def _save_conditions(rule, form):
+    """Parse dynamically-added condition rows from the form."""
+    for field, match_type, pattern in _iter_conditions(form):
+        cond = RuleCondition(
+            rule_id=rule.id,
+            field=field,
+            match_type=match_type,
+            pattern=pattern,
+        )
+        db.session.add(cond)
@@ -0,0 +1,121 @@
+"""Per-account poll scheduling – a due-time priority queue with adaptive intervals and failure backoff."""
+
+import heapq
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Adaptive interval bounds, relative to the account's base interval
+MIN_INTERVAL_SECONDS = 10
+SPEEDUP_FACTOR = 4  # shortest interval = base / 4 while mail keeps arriving
+SLOWDOWN_FACTOR = 4  # longest interval = base * 4 while the mailbox is quiet
+
+# Exponential backoff after consecutive failures (capped)
+BACKOFF_MAX_SECONDS = int(os.environ.get("WORKER_BACKOFF_MAX_SECONDS", "3600"))
+
+
+@dataclass
+class PollOutcome:
+    """Result of one poll of an account, used to adapt its interval."""
+    new_messages: int = 0
+    failed: bool = False
+
+
+@dataclass
+class _AccountSchedule:
+    base_interval: int
+    interval: float
+    due: float
+    failures: int = 0
+
+
+class AccountScheduler:
+    """
+    Keeps every enabled account on a min-heap keyed by its next due time.
+
+    The interval of each account moves between base / SPEEDUP_FACTOR and
+    base * SLOWDOWN_FACTOR: it halves whenever a poll finds new mail and grows
+    by half after a quiet poll. Consecutive failures back off exponentially
+    from the base interval up to BACKOFF_MAX_SECONDS.
+
+    Heap entries are invalidated lazily: an entry is only acted on if its due
+    time still matches the account's current schedule.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._schedules: Dict[int, _AccountSchedule] = {}
+        self._heap: List[Tuple[float, int]] = []
+
+    def sync(self, accounts: Iterable, default_interval: int):
+        """Track exactly *accounts*; new ones are due immediately, base intervals follow the settings."""
+        now = self._clock()
+        seen = set()
+        for account in accounts:
+            seen.add(account.id)
+            base = max(account.poll_interval or default_interval, MIN_INTERVAL_SECONDS)
+            schedule = self._schedules.get(account.id)
+            if schedule is None:
+                self._schedules[account.id] = _AccountSchedule(base_interval=base, interval=base, due=now)
+                heapq.heappush(self._heap, (now, account.id))
+            elif schedule.base_interval != base:
+                schedule.base_interval = base
+                schedule.interval = base
+                self._reschedule(account.id, schedule, min(schedule.due, now + base))
+
+        for account_id in set(self._schedules) - seen:
+            del self._schedules[account_id]
+
+    def pop_due(self) -> List[int]:
+        """Remove and return the IDs of all accounts that are due now."""
+        now = self._clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, account_id = heapq.heappop(self._heap)
+            schedule = self._schedules.get(account_id)
+            if schedule is not None and schedule.due == due_at:
+                due.append(account_id)
+        return due
+
+    def seconds_until_next(self, default: float) -> float:
+        """Seconds until the earliest due account (at most *default*)."""
+        while self._heap:
+            due_at, account_id = self._heap[0]
+            schedule = self._schedules.get(account_id)
+            if schedule is not None and schedule.due == due_at:
+                return max(min(due_at - self._clock(), default), 0)
+            heapq.heappop(self._heap)
+        return default
+
+    def record(self, account_id: int, outcome: Optional[PollOutcome]):
+        """Adapt the account's interval to *outcome* and schedule its next poll."""
+        schedule = self._schedules.get(account_id)
+        if schedule is None:
+            return
+        if outcome is None:
+            # Not polled (e.g. covered by IDLE): check again after the base interval
+            delay = schedule.base_interval
+        elif outcome.failed:
+            schedule.failures += 1
+            delay = min(schedule.base_interval * 2 ** schedule.failures, BACKOFF_MAX_SECONDS)
+            logger.info("Account %d failed %d time(s) in a row – next poll in %ds",
+                        account_id, schedule.failures, delay)
+        else:
+            schedule.failures = 0
+            if outcome.new_messages:
+                schedule.interval = max(schedule.interval / 2,
+                                        schedule.base_interval / SPEEDUP_FACTOR, MIN_INTERVAL_SECONDS)
+            else:
+                schedule.interval = min(schedule.interval * 1.5, schedule.base_interval * SLOWDOWN_FACTOR)
+            delay = schedule.interval
+        self._reschedule(account_id, schedule, self._clock() + delay)
+
+    def _reschedule(self, account_id: int, schedule: _AccountSchedule, due: float):
+        if due == schedule.due:
+            return
+        schedule.due = due
+        heapq.heappush(self._heap, (due, account_id))
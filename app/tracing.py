@@ -0,0 +1,97 @@
+"""
+Span-based tracing of poll cycles and outbox deliveries.
+
+trace() opens the root span of one unit of work (an account poll, an outbox
+delivery round); span() marks a phase inside it (TLS connect, SEARCH, header
+parsing, SQL, rule evaluation, Discord). Spans with the same name under the
+same parent are merged into one node with a count, total and maximum, so a
+poll of thousands of messages stays a small tree. When a trace took at least
+TRACE_SLOW_SECONDS it is logged as one line of JSON.
+
+Outside a trace, or with TRACE_SLOW_SECONDS=0, span() does nothing. Spans
+must not stay open across a generator's yield.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Traces at least this long are logged (0 disables tracing)
+TRACE_SLOW_SECONDS = float(os.environ.get("TRACE_SLOW_SECONDS", "30"))
+
+
+class _Span:
+    __slots__ = ("name", "count", "total", "max", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.children: Dict[str, "_Span"] = {}
+
+    def record(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    def to_dict(self) -> dict:
+        node = {"name": self.name, "count": self.count, "total_ms": round(self.total * 1000, 1)}
+        if self.count > 1:
+            node["max_ms"] = round(self.max * 1000, 1)
+        if self.children:
+            node["spans"] = [child.to_dict() for child in self.children.values()]
+        return node
+
+
+_current: ContextVar[Optional[_Span]] = ContextVar("trace_span", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Time the with-block (or decorated function) as phase *name* of the current trace."""
+    parent = _current.get()
+    if parent is None:
+        yield
+        return
+    node = parent.children.get(name)
+    if node is None:
+        node = parent.children[name] = _Span(name)
+    token = _current.set(node)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        node.record(time.perf_counter() - start)
+        _current.reset(token)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """
+    Root span of one unit of work; logs its span tree as JSON if it took
+    TRACE_SLOW_SECONDS or longer. Inside another trace it is a plain span.
+    """
+    if TRACE_SLOW_SECONDS <= 0 or _current.get() is not None:
+        with span(name):
+            yield
+        return
+    root = _Span(name)
+    token = _current.set(root)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current.reset(token)
+        root.record(elapsed)
+        if elapsed >= TRACE_SLOW_SECONDS:
+            payload = {"trace": name, **attrs, "duration_ms": round(elapsed * 1000, 1)}
+            payload["spans"] = [child.to_dict() for child in root.children.values()]
+            logger.warning("Slow trace %s", json.dumps(payload, ensure_ascii=False, default=str))
@@ -0,0 +1,232 @@
+"""
+Fetch-path benchmark – runs the IMAP and POP3 clients and worker.process_account
+against the in-process fake servers and records throughput and latency.
+
+    python -m benchmarks.bench_fetch --sizes 100,1000,10000,100000 --output before.json
+    python -m benchmarks.bench_fetch --latency-ms 0,20 --header-size 2000 --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Scenarios, each run for every mailbox size and latency:
+- imap_full / pop3_full: first poll of a mailbox of N new messages
+- imap_incremental / pop3_incremental: next poll after INCREMENTAL_NEW messages arrived
+- imap_unchanged: poll of an unchanged mailbox (STATUS only)
+- worker_imap / worker_pop3: process_account() on a fresh SQLite database,
+  with one rule matching every message (outbox rows are queued, not delivered)
+
+Each result records wall time, messages per second, time to the first
+message, and the server's round-trip and command counts. The output is one
+JSON document with the parameters, git revision and Python version, so runs of
+two versions can be compared.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List
+
+# Ensure the project root is importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_servers import FakeIMAPServer, FakePOP3Server, FakeServer, Mailbox  # noqa: E402
+
+# Messages added between the full and the incremental poll
+INCREMENTAL_NEW = 10
+
+SCENARIOS = ("imap", "pop3", "worker")
+
+
+def _measure(messages: Iterator, server: FakeServer) -> dict:
+    """Drain *messages*; wall time, time to the first message and server counters."""
+    before = dict(server.stats)
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in messages:
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+    return _result(count, elapsed, first, server, before)
+
+
+def _result(count: int, elapsed: float, first, server: FakeServer, before: dict) -> dict:
+    delta = {key: value - before.get(key, 0) for key, value in server.stats.items()}
+    return {
+        "yielded": count,
+        "seconds": round(elapsed, 6),
+        "messages_per_second": round(count / elapsed, 1) if elapsed > 0 and count else None,
+        "first_message_seconds": round(first, 6) if first is not None else None,
+        "round_trips": delta.get("round_trips", 0),
+        "commands": sum(v for k, v in delta.items() if k.isupper()),
+        "header_bytes": delta.get("header_bytes", 0),
+    }
+
+
+def bench_imap(size: int, latency: float, header_size: int, capabilities: List[str]) -> Iterable[dict]:
+    from app.imap_client import MailboxCursor, fetch_new_messages
+
+    start = datetime.now(timezone.utc) - timedelta(hours=2)
+    mailbox = Mailbox(size, start=start, header_size=header_size)
+    with FakeIMAPServer({"INBOX": mailbox}, capabilities, latency) as server:
+        cursor = MailboxCursor()
+        since = start - timedelta(seconds=1)
+
+        def poll():
+            return fetch_new_messages("127.0.0.1", server.port, "user", "password", False,
+                                      last_processed_date=since, ssl_mode="none", uid_cursor=cursor)
+
+        yield {"scenario": "imap_full", **_measure(poll(), server)}
+        for _ in range(INCREMENTAL_NEW):
+            mailbox.add()
+        yield {"scenario": "imap_incremental", **_measure(poll(), server)}
+        yield {"scenario": "imap_unchanged", **_measure(poll(), server)}
+
+
+def bench_pop3(size: int, latency: float, header_size: int, capabilities: List[str]) -> Iterable[dict]:
+    from app.pop3_client import UidlSnapshot, fetch_new_messages
+
+    start = datetime.now(timezone.utc) - timedelta(hours=2)
+    mailbox = Mailbox(size, start=start, header_size=header_size)
+    with FakePOP3Server({"INBOX": mailbox}, capabilities, latency) as server:
+        snapshot = UidlSnapshot()
+        since = start - timedelta(seconds=1)
+
+        def poll():
+            return fetch_new_messages("127.0.0.1", server.port, "user", "password", False,
+                                      last_processed_date=since, ssl_mode="none",
+                                      processed_uidls=set(), uidl_snapshot=snapshot)
+
+        yield {"scenario": "pop3_full", **_measure(poll(), server)}
+        for _ in range(INCREMENTAL_NEW):
+            mailbox.add()
+        yield {"scenario": "pop3_incremental", **_measure(poll(), server)}
+
+
+def bench_worker(size: int, latency: float, header_size: int, capabilities: List[str]) -> Iterable[dict]:
+    import worker
+    from app import create_app
+    from app.config import Config
+    from app.extensions import db
+    from app.models import Account, DiscordWebhook, Rule, RuleCondition
+
+    # worker configures INFO logging on import; one line per message would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+        app = create_app(BenchConfig)
+        for protocol, server_class in (("imap", FakeIMAPServer), ("pop3", FakePOP3Server)):
+            start = datetime.now(timezone.utc) - timedelta(hours=2)
+            mailbox = Mailbox(size, start=start, header_size=header_size)
+            with server_class({"INBOX": mailbox}, capabilities, latency) as server, app.app_context():
+                db.drop_all()
+                db.create_all()
+                webhook = DiscordWebhook(name="bench", url="http://127.0.0.1:9/webhook")
+                rule = Rule(name="all", webhook=webhook, position=0,
+                            conditions=[RuleCondition(field="subject", match_type="contains", pattern="message")])
+                account = Account(name=protocol, protocol_type=protocol, imap_host="127.0.0.1",
+                                  imap_port=server.port, imap_user="user", imap_password="password",
+                                  use_ssl=False, ssl_mode="none",
+                                  last_processed_internal_date=start - timedelta(seconds=1))
+                db.session.add_all([webhook, rule, account])
+                db.session.commit()
+
+                before = dict(server.stats)
+                begin = time.perf_counter()
+                outcome = worker.process_account(account)
+                elapsed = time.perf_counter() - begin
+                yield {"scenario": f"worker_{protocol}", **_result(outcome.new_messages, elapsed, None, server, before)}
+                db.session.remove()
+
+
+BENCHMARKS: Dict[str, Callable[..., Iterable[dict]]] = {
+    "imap": bench_imap,
+    "pop3": bench_pop3,
+    "worker": bench_worker,
+}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=_int_list, default=[100, 1000, 10000, 100000],
+                        help="mailbox sizes (comma separated, default 100,1000,10000,100000)")
+    parser.add_argument("--latency-ms", type=_int_list, default=[0],
+                        help="simulated round-trip latencies in ms (comma separated, default 0)")
+    parser.add_argument("--header-size", type=int, default=1500,
+                        help="approximate full header size per message in bytes (default 1500)")
+    parser.add_argument("--imap-capabilities", default="IDLE,CONDSTORE",
+                        help="capabilities of the fake IMAP server (default IDLE,CONDSTORE)")
+    parser.add_argument("--pop3-capabilities", default="PIPELINING",
+                        help="capabilities of the fake POP3 server (default PIPELINING, '' for none)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"benchmarks to run (default {','.join(SCENARIOS)})")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    capabilities = {
+        "imap": [c for c in args.imap_capabilities.split(",") if c],
+        "pop3": [c for c in args.pop3_capabilities.split(",") if c],
+    }
+
+    results = []
+    for name in [s for s in args.scenarios.split(",") if s]:
+        for latency_ms in args.latency_ms:
+            for size in args.sizes:
+                server_caps = capabilities["pop3" if name == "pop3" else "imap"]
+                if name == "worker":
+                    server_caps = capabilities["imap"] + capabilities["pop3"]
+                for result in BENCHMARKS[name](size, latency_ms / 1000, args.header_size, server_caps):
+                    result = {"messages": size, "latency_ms": latency_ms, **result}
+                    results.append(result)
+                    print(f"{result['scenario']:<18} {size:>7} msgs {latency_ms:>4} ms  "
+                          f"{result['seconds']:>9.3f}s  {result['messages_per_second'] or 0:>10.1f} msg/s  "
+                          f"{result['round_trips']:>7} round-trips", file=sys.stderr)
+
+    document = {
+        "benchmark": "fetch",
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            "header_size": args.header_size,
+            "capabilities": capabilities,
+            "incremental_new": INCREMENTAL_NEW,
+        },
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Rule-engine benchmark – matches a synthetic header corpus against synthetic
+rule sets of growing size and records throughput, latency and memory.
+
+    python -m benchmarks.bench_rules --rules 10,100,1000,10000 --output before.json
+    python -m benchmarks.bench_rules --messages 5000 --japanese-share 0.8 --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Scenarios, each run for every rule count:
+- match: RuleSet.build() and RuleSet.first_match() on in-memory rules, no database
+- notify: notify.evaluate_and_notify() with the rule set loaded once through
+  load_rule_set() from SQLite, as the worker does; matches are queued in the outbox
+- notify_reload: evaluate_and_notify() without a rule set, so every message
+  also pays for load_rule_set()'s version check (one rule_set_version() query;
+  the rules do not change, so the set is never rebuilt)
+
+Each result records wall time, messages per second, per-message latency
+percentiles, the number of matches, the time to compile (match) or load
+(notify) the rule set, the memory it retains and the peak memory of a
+second, traced pass over the messages. The rules and messages come from
+benchmarks.corpus with a fixed seed, so two versions measure the same input.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Ensure the project root is importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_fetch import _git_revision, _int_list  # noqa: E402
+from benchmarks.corpus import RuleSpec, generate_headers, generate_rules, rule_stats, to_messages  # noqa: E402
+
+SCENARIOS = ("match", "notify", "notify_reload")
+
+
+def _percentile(sorted_ns: List[int], fraction: float) -> float:
+    """*fraction* percentile of *sorted_ns* in microseconds (nearest rank)."""
+    if not sorted_ns:
+        return 0.0
+    index = min(len(sorted_ns) - 1, max(0, int(round(fraction * len(sorted_ns))) - 1))
+    return round(sorted_ns[index] / 1000, 2)
+
+
+def _run(evaluate: Callable, messages: list) -> dict:
+    """Call *evaluate* for every message; wall time, latency percentiles and match count."""
+    latencies = []
+    matched = 0
+    begin = time.perf_counter()
+    for msg in messages:
+        start = time.perf_counter_ns()
+        if evaluate(msg):
+            matched += 1
+        latencies.append(time.perf_counter_ns() - start)
+    elapsed = time.perf_counter() - begin
+    latencies.sort()
+    return {
+        "seconds": round(elapsed, 6),
+        "messages_per_second": round(len(messages) / elapsed, 1) if elapsed > 0 and messages else None,
+        "p50_us": _percentile(latencies, 0.50),
+        "p90_us": _percentile(latencies, 0.90),
+        "p99_us": _percentile(latencies, 0.99),
+        "max_us": round(latencies[-1] / 1000, 2) if latencies else 0.0,
+        "matched": matched,
+    }
+
+
+def _peak_bytes(evaluate: Callable, messages: list) -> int:
+    """Peak memory allocated while evaluating *messages* (a separate pass: tracing skews the timings)."""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        for msg in messages:
+            evaluate(msg)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def _traced(build: Callable):
+    """Run *build*; its result, wall time and the memory the result retains."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        begin = time.perf_counter()
+        result = build()
+        elapsed = time.perf_counter() - begin
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def _model_rules(specs: List[RuleSpec], webhook) -> list:
+    from app.models import Rule, RuleCondition
+
+    return [
+        Rule(name=spec.name, position=spec.position, account_id=spec.account_id, enabled=True, webhook=webhook,
+             conditions=[RuleCondition(field=c.field, match_type=c.match_type, pattern=c.pattern)
+                         for c in spec.conditions])
+        for spec in specs
+    ]
+
+
+def bench_match(specs: List[RuleSpec], messages: list, accounts: int) -> Iterable[dict]:
+    from app.matcher import RuleSet
+    from app.models import DiscordWebhook
+
+    webhook = DiscordWebhook(name="bench", url="http://127.0.0.1:9/webhook")
+    rules = _model_rules(specs, webhook)
+    for rule_id, rule in enumerate(rules, start=1):
+        rule.id = rule_id
+    rule_set, build_seconds, retained = _traced(lambda: RuleSet.build(("bench",), rules))
+
+    def evaluate(msg):
+        return rule_set.first_match((msg.uid % accounts) + 1, from_address=msg.from_address,
+                                    to_address=msg.to_address, subject=msg.subject) is not None
+
+    result = _run(evaluate, messages)
+    yield {"scenario": "match", **result, "compiled_rules": len(rule_set.rules),
+           "build_seconds": round(build_seconds, 6), "rule_set_bytes": retained,
+           "peak_bytes": _peak_bytes(evaluate, messages)}
+
+
+def bench_notify(specs: List[RuleSpec], messages: list, accounts: int, scenarios: Tuple[str, ...]) -> Iterable[dict]:
+    from app import create_app
+    from app.config import Config
+    from app.extensions import db
+    from app.matcher import load_rule_set
+    from app.models import Account, DiscordWebhook
+    from app.notify import evaluate_and_notify
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            webhook = DiscordWebhook(name="bench", url="http://127.0.0.1:9/webhook")
+            account_rows = [
+                Account(name=f"bench-{n}", protocol_type="imap", imap_host="127.0.0.1", imap_port=143,
+                        imap_user="user", imap_password="password", use_ssl=False, ssl_mode="none")
+                for n in range(1, accounts + 1)
+            ]
+            db.session.add_all([webhook, *account_rows, *_model_rules(specs, webhook)])
+            db.session.commit()
+            by_id = {account.id: account for account in account_rows}
+
+            # Cold load: version stamp, rule query and compilation
+            rule_set, load_seconds, retained = _traced(load_rule_set)
+
+            for scenario in scenarios:
+                given = rule_set if scenario == "notify" else None
+
+                def evaluate(msg):
+                    return evaluate_and_notify(by_id[(msg.uid % accounts) + 1], msg, rule_set=given)
+
+                result = _run(evaluate, messages)
+                db.session.rollback()  # drop the queued notifications so the traced pass queues them again
+                peak = _peak_bytes(evaluate, messages)
+                db.session.rollback()
+                yield {"scenario": scenario, **result, "compiled_rules": len(rule_set.rules),
+                       "build_seconds": round(load_seconds, 6), "rule_set_bytes": retained, "peak_bytes": peak}
+            db.session.remove()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rules", type=_int_list, default=[10, 100, 1000, 10000],
+                        help="rule counts (comma separated, default 10,100,1000,10000)")
+    parser.add_argument("--messages", type=int, default=2000, help="messages per run (default 2000)")
+    parser.add_argument("--accounts", type=int, default=5,
+                        help="accounts the messages and account-scoped rules are spread over (default 5)")
+    parser.add_argument("--account-share", type=float, default=0.3,
+                        help="fraction of the rules limited to one account (default 0.3)")
+    parser.add_argument("--japanese-share", type=float, default=0.5,
+                        help="fraction of Japanese, RFC 2047 encoded subjects (default 0.5)")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the rule and header generators (default 1)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"scenarios to run (default {','.join(SCENARIOS)})")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # worker-style INFO logging would log every match and dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    scenarios = tuple(s for s in args.scenarios.split(",") if s)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    messages = to_messages(generate_headers(args.messages, args.japanese_share, args.seed))
+    results = []
+    rule_counts: Dict[int, dict] = {}
+    for count in args.rules:
+        specs = generate_rules(count, args.accounts, args.account_share, args.seed)
+        by_type, scoped = rule_stats(specs)
+        rule_counts[count] = {"conditions": by_type, "account_scoped": scoped}
+
+        runs = []
+        if "match" in scenarios:
+            runs.append(bench_match(specs, messages, args.accounts))
+        db_scenarios = tuple(s for s in scenarios if s != "match")
+        if db_scenarios:
+            runs.append(bench_notify(specs, messages, args.accounts, db_scenarios))
+        for run in runs:
+            for result in run:
+                result = {"rules": count, "messages": len(messages), **result}
+                results.append(result)
+                print(f"{result['scenario']:<14} {count:>6} rules  {result['seconds']:>8.3f}s  "
+                      f"{result['messages_per_second'] or 0:>10.1f} msg/s  p50 {result['p50_us']:>9.1f}us  "
+                      f"p99 {result['p99_us']:>9.1f}us  {result['matched']:>6} matched  "
+                      f"{result['rule_set_bytes'] / 1024:>9.0f} KiB", file=sys.stderr)
+
+    document = {
+        "benchmark": "rules",
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            "messages": args.messages,
+            "accounts": args.accounts,
+            "account_share": args.account_share,
+            "japanese_share": args.japanese_share,
+            "seed": args.seed,
+            "rule_sets": rule_counts,
+        },
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Compare two benchmark result files written by bench_fetch.py or bench_rules.py.
+
+    python -m benchmarks.compare before.json after.json --threshold 0.10
+
+Prints the change in wall time for every result present in both files and
+exits with status 1 if any got slower by more than *threshold* (a fraction).
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+# Result fields that identify a measurement; everything else is a measured value
+KEY_FIELDS = ("scenario", "rules", "messages", "latency_ms")
+
+
+def _load(path: str) -> Dict[Tuple, dict]:
+    with open(path, encoding="utf-8") as f:
+        document = json.load(f)
+    return {tuple(result.get(field) for field in KEY_FIELDS): result for result in document["results"]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown (fraction of the baseline time) reported as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    baseline = _load(args.baseline)
+    candidate = _load(args.candidate)
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys(), key=lambda k: tuple(str(v) for v in k)):
+        before = baseline[key]["seconds"]
+        after = candidate[key]["seconds"]
+        change = (after - before) / before if before else 0.0
+        regressed = change > args.threshold
+        regressions += regressed
+        label = " ".join(f"{field}={value}" for field, value in zip(KEY_FIELDS, key) if value is not None)
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {label:<60} {before:>10.4f}s -> {after:>10.4f}s  {change:+7.1%}")
+
+    missing = baseline.keys() ^ candidate.keys()
+    if missing:
+        print(f"{len(missing)} result(s) only in one of the files were skipped")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
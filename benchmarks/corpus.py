@@ -0,0 +1,204 @@
+"""
+Synthetic rule sets and header corpora for the rule-engine benchmark.
+
+Both generators are seeded, so the same arguments always give the same rules
+and messages and runs of two versions measure identical input.
+
+- generate_rules(): rules of 1–3 conditions mixing prefix, suffix, contains and
+  regex matches on From, To and Subject, some of them limited to one account
+- generate_headers(): raw From / To / Subject headers, part of the subjects in
+  Japanese and RFC 2047 encoded (UTF-8 or ISO-2022-JP, Base64 or Q)
+- to_messages(): MailMessage objects decoded the way the mail clients do
+
+Patterns and headers are drawn from the same vocabulary, so a share of the
+messages match a rule somewhere in the list, as in a real mailbox.
+"""
+
+import random
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.header import Header
+from typing import List, Optional, Tuple
+
+# Share of the conditions per match type (the rest are contains conditions)
+PREFIX_SHARE = 0.25
+SUFFIX_SHARE = 0.25
+REGEX_SHARE = 0.15
+
+COMPANIES = ("example", "acme", "contoso", "fabrikam", "initech", "globex", "umbrella", "hooli")
+TLDS = ("com", "net", "org", "jp", "co.jp", "ne.jp")
+LOCAL_PARTS = (
+    "info", "noreply", "no-reply", "alerts", "support", "billing", "admin", "notifications",
+    "taro.yamada", "hanako.suzuki", "ichiro.tanaka", "ops", "security", "shop",
+)
+RECIPIENTS = ("me", "team", "ops", "admin", "sales", "dev", "taro", "hanako")
+WORDS_EN = (
+    "invoice", "alert", "report", "meeting", "password", "order", "shipment", "newsletter",
+    "security", "backup", "deploy", "failure", "reminder", "welcome", "receipt", "outage",
+)
+WORDS_JA = (
+    "請求書", "障害", "定期報告", "会議", "パスワード", "注文", "発送", "お知らせ",
+    "セキュリティ", "バックアップ", "リリース", "エラー", "リマインダー", "ご案内", "領収書", "停止",
+)
+TAGS = ("障害", "緊急", "info", "alert", "定期", "ml")
+REPLY_PREFIXES = ("", "", "", "Re: ", "Fwd: ", "RE: ", "転送: ")
+
+
+@dataclass
+class ConditionSpec:
+    field: str
+    match_type: str
+    pattern: str
+
+
+@dataclass
+class RuleSpec:
+    name: str
+    position: int
+    account_id: Optional[int]
+    conditions: List[ConditionSpec] = field(default_factory=list)
+
+
+@dataclass
+class RawHeaders:
+    uid: int
+    from_address: str
+    to_address: str
+    subject: str  # raw, possibly RFC 2047 encoded
+    message_id: str
+
+
+def _domain(rng: random.Random) -> str:
+    return f"{rng.choice(COMPANIES)}{rng.randint(1, 50)}.{rng.choice(TLDS)}"
+
+
+def _word(rng: random.Random) -> str:
+    return rng.choice(WORDS_JA if rng.random() < 0.5 else WORDS_EN)
+
+
+def _static_pattern(rng: random.Random, field_name: str, match_type: str) -> str:
+    """A literal pattern for a prefix / suffix / contains condition on *field_name*."""
+    if field_name == "from":
+        return {
+            "prefix": lambda: f"{rng.choice(LOCAL_PARTS)}@{rng.choice(COMPANIES)}",
+            "suffix": lambda: "@" + _domain(rng),
+            "contains": lambda: _domain(rng),
+        }[match_type]()
+    if field_name == "to":
+        return {
+            "prefix": lambda: f"{rng.choice(RECIPIENTS)}@{rng.choice(COMPANIES)}",
+            "suffix": lambda: "@" + _domain(rng),
+            "contains": lambda: f"{rng.choice(RECIPIENTS)}@{rng.choice(COMPANIES)}{rng.randint(1, 50)}.",
+        }[match_type]()
+    return {
+        "prefix": lambda: f"[{rng.choice(TAGS)}-{rng.randint(1, 99)}",
+        "suffix": lambda: f"{_word(rng)} #{rng.randint(1, 99)}",
+        "contains": lambda: f"{_word(rng)} {_word(rng)}" if rng.random() < 0.5 else f"{_word(rng)}{_word(rng)}",
+    }[match_type]()
+
+
+def _regex_pattern(rng: random.Random, field_name: str) -> str:
+    if field_name == "from":
+        company = rng.choice(COMPANIES)
+        tld = re.escape(rng.choice(TLDS))
+        return rng.choice((
+            rf"^({'|'.join(rng.sample(LOCAL_PARTS, 3))})@",
+            rf"@{company}\d*\.{tld}$",
+            rf"@(mail\.)?{company}{rng.randint(1, 50)}\.",
+        ))
+    if field_name == "to":
+        return rf"^({'|'.join(rng.sample(RECIPIENTS, 2))})@{rng.choice(COMPANIES)}\d+\."
+    word = _word(rng)
+    return rng.choice((
+        rf"\[{rng.choice(TAGS)}-\d+\]",
+        rf"^(re|fwd?|転送):\s*{word}",
+        rf"{word}.*#{rng.randint(1, 9)}\d?$",
+        rf"(?i)\b{rng.choice(WORDS_EN)}s?\b.*{rng.choice(WORDS_JA)}",
+    ))
+
+
+def generate_rules(count: int, accounts: int = 5, account_share: float = 0.3, seed: int = 1) -> List[RuleSpec]:
+    """*count* rules in position order; *account_share* of them limited to one of *accounts* accounts (IDs 1..n)."""
+    rng = random.Random(f"rules-{seed}")
+    rules = []
+    for position in range(count):
+        account_id = rng.randint(1, accounts) if accounts and rng.random() < account_share else None
+        conditions = []
+        fields = rng.sample(("from", "to", "subject"), rng.choices((1, 2, 3), weights=(5, 4, 1))[0])
+        for field_name in fields:
+            roll = rng.random()
+            if roll < REGEX_SHARE:
+                conditions.append(ConditionSpec(field_name, "regex", _regex_pattern(rng, field_name)))
+                continue
+            if roll < REGEX_SHARE + PREFIX_SHARE:
+                match_type = "prefix"
+            elif roll < REGEX_SHARE + PREFIX_SHARE + SUFFIX_SHARE:
+                match_type = "suffix"
+            else:
+                match_type = "contains"
+            conditions.append(ConditionSpec(field_name, match_type, _static_pattern(rng, field_name, match_type)))
+        rules.append(RuleSpec(name=f"rule-{position}", position=position, account_id=account_id,
+                              conditions=conditions))
+    return rules
+
+
+def _encode_subject(rng: random.Random, subject: str) -> str:
+    """RFC 2047 encode *subject* the way Japanese mailers do (mostly UTF-8 Base64, some ISO-2022-JP)."""
+    charset = "iso-2022-jp" if rng.random() < 0.3 else "utf-8"
+    try:
+        return Header(subject, charset, maxlinelen=76).encode()
+    except UnicodeEncodeError:
+        return Header(subject, "utf-8", maxlinelen=76).encode()
+
+
+def generate_headers(count: int, japanese_share: float = 0.5, seed: int = 1) -> List[RawHeaders]:
+    """*count* raw header sets; *japanese_share* of the subjects are Japanese and RFC 2047 encoded."""
+    rng = random.Random(f"headers-{seed}")
+    headers = []
+    for uid in range(1, count + 1):
+        japanese = rng.random() < japanese_share
+        words = WORDS_JA if japanese else WORDS_EN
+        tag = f"[{rng.choice(TAGS)}-{rng.randint(1, 9999)}] " if rng.random() < 0.3 else ""
+        separator = "" if japanese else " "
+        subject = f"{rng.choice(REPLY_PREFIXES)}{tag}{rng.choice(words)}{separator}{rng.choice(words)} #{rng.randint(1, 99)}"
+        if japanese:
+            subject = _encode_subject(rng, subject)
+        sender = f"{rng.choice(LOCAL_PARTS)}@{_domain(rng)}"
+        name = rng.choice(("", "Yamada Taro ", "=?utf-8?b?5bGx55Sw5aSq6YOO?= ", "Support "))
+        headers.append(RawHeaders(
+            uid=uid,
+            from_address=f"{name}<{sender}>" if name else sender,
+            to_address=f"{rng.choice(RECIPIENTS)}@{_domain(rng)}",
+            subject=subject,
+            message_id=f"<bench-{seed}-{uid}@bench.invalid>",
+        ))
+    return headers
+
+
+def to_messages(headers: List[RawHeaders]) -> list:
+    """Decode *headers* into MailMessage objects as the IMAP client does after fetching them."""
+    from app.imap_client import MailMessage, decode_header_value
+
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    return [
+        MailMessage(
+            uid=h.uid,
+            from_address=decode_header_value(h.from_address),
+            to_address=decode_header_value(h.to_address),
+            subject=decode_header_value(h.subject),
+            date="",
+            message_id=h.message_id,
+            internal_date=start + timedelta(seconds=h.uid),
+        )
+        for h in headers
+    ]
+
+
+def rule_stats(rules: List[RuleSpec]) -> Tuple[dict, int]:
+    """Condition count per match type and the number of account-scoped rules."""
+    by_type = {}
+    for rule in rules:
+        for cond in rule.conditions:
+            by_type[cond.match_type] = by_type.get(cond.match_type, 0) + 1
+    return by_type, sum(1 for rule in rules if rule.account_id is not None)
@@ -0,0 +1,415 @@
+"""
+In-process stand-ins for an IMAP4rev1 and a POP3 server, for benchmarking the
+fetch path without a real mail server.
+
+Both serve generated mailboxes of any size from memory and support what the
+worker uses:
+- IMAP: LOGIN, CAPABILITY, SELECT/EXAMINE, STATUS, UID SEARCH (UID range or
+  SINCE), UID FETCH of INTERNALDATE / BODY.PEEK[HEADER.FIELDS (...)] /
+  RFC822.HEADER, NOOP, IDLE, CLOSE, LOGOUT.
+- POP3: CAPA, USER/PASS, UIDL, TOP n 0, QUIT.
+
+Optional capabilities (IDLE and CONDSTORE for IMAP, PIPELINING for POP3) are
+only advertised and honoured when enabled. *latency* seconds are added once
+per round-trip, i.e. only when the client is waiting for a reply; pipelined
+commands that are already queued are answered without the delay. Per-command
+counters are kept in ``server.stats``. To test error handling, the IMAP server
+can leave out INTERNALDATE for chosen messages, and the POP3 server can refuse
+TOP for chosen messages or reset the connection mid-listing.
+"""
+
+import bisect
+import re
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Pads generated headers to the requested size, as relays do with real mail
+_RECEIVED_LINE = (
+    "Received: from mail-out.example.net (mail-out.example.net [192.0.2.10])\r\n"
+    "\tby mx.example.com with ESMTPS id {id}; {date}\r\n"
+)
+
+
+@dataclass
+class FakeMessage:
+    uid: int
+    internal_date: datetime
+    header: bytes
+
+
+class Mailbox:
+    """Messages of one folder in UID order, with a UID index for range lookups."""
+
+    def __init__(self, count: int = 0, start: Optional[datetime] = None, uidvalidity: int = 1,
+                 header_size: int = 0):
+        self.uidvalidity = uidvalidity
+        self.header_size = header_size
+        self.messages: List[FakeMessage] = []
+        self._uids: List[int] = []
+        self.next_uid = 1
+        start = start or datetime.now(timezone.utc) - timedelta(hours=1)
+        for i in range(count):
+            self.add(start + timedelta(seconds=i))
+
+    def add(self, when: Optional[datetime] = None, subject: Optional[str] = None,
+            message_id: Optional[str] = None, header_size: Optional[int] = None) -> int:
+        """Append a message; *header_size* pads the header with Received lines to about that many bytes."""
+        when = when or datetime.now(timezone.utc)
+        uid = self.next_uid
+        self.next_uid += 1
+        date = format_datetime(when)
+        header = (
+            f"From: Sender {uid} <sender{uid}@example.com>\r\n"
+            f"To: me@example.com\r\n"
+            f"Subject: {subject or f'Test message {uid}'}\r\n"
+            f"Date: {date}\r\n"
+            f"Message-ID: {message_id or f'<msg{uid}@example.com>'}\r\n"
+        )
+        target = self.header_size if header_size is None else header_size
+        received = []
+        while len(header) + sum(map(len, received)) < target:
+            received.append(_RECEIVED_LINE.format(id=f"{uid}.{len(received)}", date=date))
+        self.messages.append(FakeMessage(uid, when, ("".join(received) + header + "\r\n").encode()))
+        self._uids.append(uid)
+        return uid
+
+    def in_ranges(self, ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, FakeMessage]]:
+        """(sequence number, message) for every message whose UID lies in one of *ranges*."""
+        found = {}
+        for low, high in ranges:
+            first = bisect.bisect_left(self._uids, low)
+            last = bisect.bisect_right(self._uids, high)
+            for index in range(first, last):
+                found[index] = self.messages[index]
+        return [(index + 1, found[index]) for index in sorted(found)]
+
+
+def imap_date(value: datetime) -> str:
+    return value.strftime("%d-%b-%Y %H:%M:%S +0000")
+
+
+def parse_uid_set(uid_set: str, max_uid: int) -> List[Tuple[int, int]]:
+    """"1:5,7,9:*" -> [(1, 5), (7, 7), (9, max_uid)]."""
+    ranges = []
+    for part in uid_set.split(","):
+        low, _, high = part.partition(":")
+        low = max_uid if low == "*" else int(low)
+        high = low if not high else (max_uid if high == "*" else int(high))
+        ranges.append((min(low, high), max(low, high)))
+    return ranges
+
+
+def filter_headers(header: bytes, fields: Iterable[str]) -> bytes:
+    """The header lines (with continuations) of *fields*, as returned for HEADER.FIELDS."""
+    wanted = {field.lower() for field in fields}
+    out = []
+    keep = False
+    for line in header.split(b"\r\n"):
+        if not line:
+            continue
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                out.append(line)
+            continue
+        keep = line.split(b":", 1)[0].decode("ascii", "replace").lower() in wanted
+        if keep:
+            out.append(line)
+    return b"\r\n".join(out) + b"\r\n\r\n"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Unbuffered, so select() tells whether the client already sent the next command
+    rbufsize = 0
+
+    def setup(self):
+        # Like real servers: replies to pipelined commands must not wait for
+        # the client's delayed ACK (Nagle), which would add ~40 ms per poll
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.wfile.write(data)
+
+    def read_command(self) -> Optional[str]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        if not readable:
+            # Nothing queued behind this command: the client waits a full round-trip for the reply
+            self.server.stats["round_trips"] += 1
+            if self.server.latency:
+                time.sleep(self.server.latency)
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+
+class IMAPHandler(_Handler):
+    def handle(self):
+        server = self.server
+        server.stats["connections"] += 1
+        capabilities = " ".join(["IMAP4rev1", *server.capabilities])
+        self.send(f"* OK [CAPABILITY {capabilities}] fake IMAP ready\r\n")
+        selected: Optional[Mailbox] = None
+        while True:
+            line = self.read_command()
+            if line is None:
+                return
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            server.stats[command] += 1
+
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY {capabilities}\r\n{tag} OK done\r\n")
+            elif command == "LOGIN":
+                self.send(f"{tag} OK logged in\r\n")
+            elif command in ("SELECT", "EXAMINE"):
+                selected = server.mailboxes.get(args.strip('"'))
+                if selected is None:
+                    self.send(f"{tag} NO no such mailbox\r\n")
+                    continue
+                modseq = ""
+                if "CONDSTORE" in server.capabilities:
+                    modseq = f"* OK [HIGHESTMODSEQ {selected.next_uid + 1000}] highest\r\n"
+                self.send(
+                    f"* {len(selected.messages)} EXISTS\r\n* 0 RECENT\r\n"
+                    f"* OK [UIDVALIDITY {selected.uidvalidity}] UIDs valid\r\n"
+                    f"* OK [UIDNEXT {selected.next_uid}] predicted next UID\r\n"
+                    f"{modseq}{tag} OK [READ-ONLY] done\r\n"
+                )
+            elif command == "STATUS":
+                self._status(tag, args)
+            elif command == "NOOP":
+                if selected is not None:
+                    self.send(f"* {len(selected.messages)} EXISTS\r\n")
+                self.send(f"{tag} OK done\r\n")
+            elif command == "UID" and selected is not None:
+                self._uid(tag, args, selected)
+            elif command == "IDLE" and "IDLE" in server.capabilities and selected is not None:
+                if not self._idle(tag, selected):
+                    return
+            elif command == "CLOSE":
+                selected = None
+                self.send(f"{tag} OK done\r\n")
+            elif command == "LOGOUT":
+                self.send(f"* BYE logging out\r\n{tag} OK done\r\n")
+                return
+            else:
+                self.send(f"{tag} BAD unsupported command {command}\r\n")
+
+    def _status(self, tag: str, args: str):
+        match = re.match(r'"?([^"]*?)"? \((.*)\)', args)
+        mailbox = self.server.mailboxes.get(match.group(1)) if match else None
+        if mailbox is None:
+            self.send(f"{tag} NO no such mailbox\r\n")
+            return
+        values = {
+            "MESSAGES": len(mailbox.messages),
+            "UIDNEXT": mailbox.next_uid,
+            "UIDVALIDITY": mailbox.uidvalidity,
+            "UNSEEN": 0,
+        }
+        if "CONDSTORE" in self.server.capabilities:
+            values["HIGHESTMODSEQ"] = mailbox.next_uid + 1000
+        items = [f"{item} {values[item]}" for item in match.group(2).upper().split() if item in values]
+        self.send(f'* STATUS "{match.group(1)}" ({" ".join(items)})\r\n{tag} OK done\r\n')
+
+    def _uid(self, tag: str, args: str, mailbox: Mailbox):
+        subcommand, _, args = args.partition(" ")
+        subcommand = subcommand.upper()
+        max_uid = mailbox.messages[-1].uid if mailbox.messages else 0
+
+        if subcommand == "SEARCH":
+            criteria = args.split()
+            if criteria and criteria[0].upper() == "SINCE":
+                since = datetime.strptime(criteria[1], "%d-%b-%Y").date()
+                uids = [msg.uid for msg in mailbox.messages if msg.internal_date.date() >= since]
+            elif criteria and criteria[0].upper() == "UID":
+                uids = [msg.uid for _, msg in mailbox.in_ranges(parse_uid_set(criteria[1], max_uid))]
+            else:
+                uids = [msg.uid for msg in mailbox.messages]
+            self.send(f"* SEARCH {' '.join(map(str, uids))}\r\n{tag} OK done\r\n")
+
+        elif subcommand == "FETCH":
+            uid_set, _, items = args.partition(" ")
+            items = items.upper()
+            fields = re.search(r"HEADER\.FIELDS \(([^)]*)\)", items)
+            out = []
+            for seq, msg in mailbox.in_ranges(parse_uid_set(uid_set, max_uid)):
+                self.server.stats["fetched"] += 1
+                parts = [f"UID {msg.uid}"]
+                if "INTERNALDATE" in items and msg.uid not in self.server.undated:
+                    parts.append(f'INTERNALDATE "{imap_date(msg.internal_date)}"')
+                literal = None
+                if fields:
+                    literal = filter_headers(msg.header, fields.group(1).split())
+                    parts.append(f"BODY[HEADER.FIELDS ({fields.group(1)})] {{{len(literal)}}}")
+                elif "RFC822.HEADER" in items:
+                    literal = msg.header
+                    parts.append(f"RFC822.HEADER {{{len(literal)}}}")
+                if literal is None:
+                    out.append(f"* {seq} FETCH ({' '.join(parts)})\r\n".encode())
+                else:
+                    self.server.stats["header_bytes"] += len(literal)
+                    out.append(f"* {seq} FETCH ({' '.join(parts)}\r\n".encode() + literal + b")\r\n")
+            self.send(b"".join(out) + f"{tag} OK done\r\n".encode())
+
+        else:
+            self.send(f"{tag} BAD unsupported UID command\r\n")
+
+    def _idle(self, tag: str, mailbox: Mailbox) -> bool:
+        """Report EXISTS for mail added while idling until DONE; False if the client went away."""
+        self.send("+ idling\r\n")
+        known = len(mailbox.messages)
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable:
+                if not self.rfile.readline():
+                    return False
+                self.send(f"{tag} OK IDLE terminated\r\n")
+                return True
+            if len(mailbox.messages) != known:
+                known = len(mailbox.messages)
+                self.send(f"* {known} EXISTS\r\n")
+
+
+class POP3Handler(_Handler):
+    def handle(self):
+        server = self.server
+        server.stats["connections"] += 1
+        mailbox: Mailbox = server.mailboxes["INBOX"]
+        self.send("+OK fake POP3 ready\r\n")
+        while True:
+            line = self.read_command()
+            if line is None:
+                return
+            command, _, args = line.partition(" ")
+            command = command.upper()
+            server.stats[command] += 1
+
+            if command == "CAPA":
+                capabilities = ["TOP", "UIDL", "USER", *server.capabilities]
+                self.send("+OK capability list follows\r\n" + "".join(f"{c}\r\n" for c in capabilities) + ".\r\n")
+            elif command in ("USER", "PASS"):
+                self.send("+OK\r\n")
+            elif command == "UIDL":
+                listing = "".join(f"{seq} uidl-{msg.uid}\r\n" for seq, msg in enumerate(mailbox.messages, 1))
+                self.send("+OK\r\n" + listing + ".\r\n")
+            elif command == "TOP":
+                if server.reset_after_top is not None:
+                    if server.reset_after_top == 0:
+                        server.reset_after_top = None
+                        self._reset()
+                        return
+                    server.reset_after_top -= 1
+                seq = int(args.split()[0])
+                if not 1 <= seq <= len(mailbox.messages) or seq in server.refused_tops:
+                    self.send("-ERR no such message\r\n")
+                    continue
+                header = mailbox.messages[seq - 1].header
+                server.stats["fetched"] += 1
+                server.stats["header_bytes"] += len(header)
+                self.send(b"+OK\r\n" + header + b".\r\n")
+            elif command == "QUIT":
+                self.send("+OK bye\r\n")
+                return
+            else:
+                self.send("-ERR unsupported command\r\n")
+
+    def _reset(self):
+        """Drop the connection with a TCP reset, as when the server or a middlebox aborts it."""
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.request.close()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeServer:
+    """A fake mail server on 127.0.0.1 (random port), served from a background thread."""
+
+    handler = None
+
+    def __init__(self, mailboxes: Dict[str, Mailbox], capabilities: Iterable[str] = (), latency: float = 0.0):
+        self._server = _TCPServer(("127.0.0.1", 0), self.handler)
+        self._server.mailboxes = mailboxes
+        self._server.capabilities = [capability.upper() for capability in capabilities]
+        self._server.latency = latency
+        self._server.stats = Counter()
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def stats(self) -> Counter:
+        return self._server.stats
+
+    @property
+    def latency(self) -> float:
+        return self._server.latency
+
+    @latency.setter
+    def latency(self, value: float):
+        self._server.latency = value
+
+    def start(self) -> "FakeServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeIMAPServer(FakeServer):
+    """IMAP4rev1 stand-in; *capabilities* may include IDLE and CONDSTORE."""
+
+    handler = IMAPHandler
+
+    def __init__(self, mailboxes: Dict[str, Mailbox], capabilities: Iterable[str] = (), latency: float = 0.0):
+        super().__init__(mailboxes, capabilities, latency)
+        self._server.undated = set()
+
+    def omit_internaldate(self, *uids: int):
+        """Leave INTERNALDATE out of FETCH responses for the messages *uids*."""
+        self._server.undated.update(uids)
+
+
+class FakePOP3Server(FakeServer):
+    """POP3 stand-in serving mailboxes["INBOX"]; *capabilities* may include PIPELINING."""
+
+    handler = POP3Handler
+
+    def __init__(self, mailboxes: Dict[str, Mailbox], capabilities: Iterable[str] = (), latency: float = 0.0):
+        super().__init__(mailboxes, capabilities, latency)
+        self._server.refused_tops = set()
+        self._server.reset_after_top = None
+
+    def refuse_top(self, *seqs: int):
+        """Answer TOP for the messages *seqs* with -ERR."""
+        self._server.refused_tops.update(seqs)
+
+    def reset_after_top(self, count: int):
+        """Reset the connection instead of answering the TOP command after the next *count* ones (once)."""
+        self._server.reset_after_top = count
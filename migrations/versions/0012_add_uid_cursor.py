@@ -0,0 +1,47 @@
+"""Add UIDVALIDITY to the IMAP UID cursor
+
+Revision ID: 0012_add_uid_cursor
+Revises: 0011_add_protocol_type
+Create Date: 2026-10-16 00:00:00.000000
+
+Revives accounts.last_uid as a UID high-water mark paired with UIDVALIDITY,
+so polls can search "UID n+1:*" instead of a whole day of INTERNALDATE.
+UIDs are unsigned 32-bit values, so both columns are BIGINT.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0012_add_uid_cursor"
+down_revision = "0011_add_protocol_type"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column(
+        "accounts",
+        "last_uid",
+        existing_type=sa.Integer(),
+        type_=sa.BigInteger(),
+        existing_nullable=False,
+    )
+    # Stale UIDs from the pre-0009 cursor have no UIDVALIDITY; start fresh
+    op.execute("UPDATE accounts SET last_uid = 0")
+    op.add_column(
+        "accounts",
+        sa.Column("last_uidvalidity", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_column("accounts", "last_uidvalidity")
+    op.alter_column(
+        "accounts",
+        "last_uid",
+        existing_type=sa.BigInteger(),
+        type_=sa.Integer(),
+        existing_nullable=False,
+    )
@@ -0,0 +1,29 @@
+"""Add use_idle to accounts
+
+Revision ID: 0013_add_use_idle
+Revises: 0012_add_uid_cursor
+Create Date: 2026-10-16 00:00:00.000000
+
+Per-account switch for IMAP IDLE push mode.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0013_add_use_idle"
+down_revision = "0012_add_uid_cursor"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "accounts",
+        sa.Column("use_idle", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+
+
+def downgrade():
+    op.drop_column("accounts", "use_idle")
@@ -0,0 +1,40 @@
+"""Add mailbox STATUS snapshot to accounts
+
+Revision ID: 0014_add_mailbox_status
+Revises: 0013_add_use_idle
+Create Date: 2026-10-16 00:00:00.000000
+
+Stores UIDNEXT / MESSAGES / HIGHESTMODSEQ from the last complete poll so an
+unchanged mailbox can be skipped after a single STATUS command.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0014_add_mailbox_status"
+down_revision = "0013_add_use_idle"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "accounts",
+        sa.Column("last_uidnext", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "accounts",
+        sa.Column("last_message_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "accounts",
+        sa.Column("last_highestmodseq", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_column("accounts", "last_highestmodseq")
+    op.drop_column("accounts", "last_message_count")
+    op.drop_column("accounts", "last_uidnext")
@@ -0,0 +1,26 @@
+"""Add per-account poll interval
+
+Revision ID: 0015_add_account_poll_interval
+Revises: 0014_add_mailbox_status
+Create Date: 2026-10-16 00:00:00.000000
+
+NULL keeps using the global worker interval.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0015_add_account_poll_interval"
+down_revision = "0014_add_mailbox_status"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("accounts", sa.Column("poll_interval", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("accounts", "poll_interval")
@@ -0,0 +1,27 @@
+"""Add regex timeout flag to rules
+
+Revision ID: 0016_add_rule_regex_timeout
+Revises: 0015_add_account_poll_interval
+Create Date: 2026-10-16 00:00:00.000000
+
+Set by the worker when a regex condition exceeds its evaluation time
+budget; cleared when the rule is saved.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0016_add_rule_regex_timeout"
+down_revision = "0015_add_account_poll_interval"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("rules", sa.Column("regex_timeout_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("rules", "regex_timeout_at")
@@ -0,0 +1,48 @@
+"""Add notification outbox
+
+Revision ID: 0017_add_notification_outbox
+Revises: 0016_add_rule_regex_timeout
+Create Date: 2026-10-16 00:00:00.000000
+
+Matched notifications are queued here together with the cursor update and
+delivered to Discord by the worker's outbox threads.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0017_add_notification_outbox"
+down_revision = "0016_add_rule_regex_timeout"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "notification_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("rule_id", sa.Integer(), sa.ForeignKey("rules.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("message_key", sa.String(500), nullable=False),
+        sa.Column("message_uid", sa.Integer(), nullable=True),
+        sa.Column("from_address", sa.String(500), nullable=True),
+        sa.Column("subject", sa.String(1000), nullable=True),
+        sa.Column("rule_name", sa.String(200), nullable=False, server_default=""),
+        sa.Column("webhook_url", sa.String(500), nullable=False),
+        sa.Column("rendered_message", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("account_id", "message_key", "rule_id", name="uq_notification_outbox_message_rule"),
+    )
+    op.create_index("ix_notification_outbox_due", "notification_outbox", ["status", "next_attempt_at"])
+
+
+def downgrade():
+    op.drop_index("ix_notification_outbox_due", table_name="notification_outbox")
+    op.drop_table("notification_outbox")
@@ -0,0 +1,62 @@
+"""Replace the Message-ID JSON cache with the processed_messages table
+
+Revision ID: 0018_add_processed_messages
+Revises: 0017_add_notification_outbox
+Create Date: 2026-10-16 00:00:00.000000
+
+Each account's accounts.processed_message_ids JSON array is copied into
+processed_messages as (account_id, BLAKE2b digest of the normalized
+Message-ID) rows before the column is dropped. Digests cannot be turned back
+into Message-IDs, so a downgrade restores the column empty.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0018_add_processed_messages"
+down_revision = "0017_add_notification_outbox"
+branch_labels = None
+depends_on = None
+
+
+def _message_hash(message_id):
+    # Same as app.dedup.message_hash (copied so the migration does not depend on app code)
+    normalized = message_id.strip().strip("<>").strip().lower()
+    return hashlib.blake2b(normalized.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def upgrade():
+    processed_messages = op.create_table(
+        "processed_messages",
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("message_hash", sa.String(32), primary_key=True),
+        sa.Column("seen_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_processed_messages_seen_at", "processed_messages", ["seen_at"])
+
+    conn = op.get_bind()
+    now = datetime.now(timezone.utc)
+    for account_id, cache in conn.execute(sa.text("SELECT id, processed_message_ids FROM accounts")):
+        try:
+            message_ids = json.loads(cache) if cache else []
+        except ValueError:
+            continue
+        hashes = {_message_hash(mid) for mid in message_ids if isinstance(mid, str) and mid.strip()}
+        if hashes:
+            op.bulk_insert(processed_messages, [
+                {"account_id": account_id, "message_hash": digest, "seen_at": now} for digest in hashes
+            ])
+
+    op.drop_column("accounts", "processed_message_ids")
+
+
+def downgrade():
+    op.add_column("accounts", sa.Column("processed_message_ids", sa.Text(), nullable=False, server_default=""))
+    op.drop_index("ix_processed_messages_seen_at", table_name="processed_messages")
+    op.drop_table("processed_messages")
@@ -0,0 +1,40 @@
+"""Add account_mailboxes for polling several folders per account
+
+Revision ID: 0019_add_account_mailboxes
+Revises: 0018_add_processed_messages
+Create Date: 2026-10-16 00:00:00.000000
+
+Additional IMAP folders of an account, each with its own UID / STATUS /
+INTERNALDATE cursors. The primary folder keeps using the accounts columns.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0019_add_account_mailboxes"
+down_revision = "0018_add_processed_messages"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "account_mailboxes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("name", sa.String(120), nullable=False),
+        sa.Column("last_uid", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("last_uidvalidity", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("last_uidnext", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("last_message_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_highestmodseq", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("last_processed_internal_date", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint("account_id", "name", name="uq_account_mailboxes_account_name"),
+    )
+
+
+def downgrade():
+    op.drop_table("account_mailboxes")
@@ -0,0 +1,30 @@
+"""Add POP3 seen-UIDL snapshot to accounts
+
+Revision ID: 0020_add_pop3_seen_uidls
+Revises: 0019_add_account_mailboxes
+Create Date: 2026-10-16 00:00:00.000000
+
+Digests of the UIDLs already examined, so messages left on a POP3 server are
+not downloaded with TOP on every poll.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0020_add_pop3_seen_uidls"
+down_revision = "0019_add_account_mailboxes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "accounts",
+        sa.Column("pop3_seen_uidls", sa.LargeBinary(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("accounts", "pop3_seen_uidls")
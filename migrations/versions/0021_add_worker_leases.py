@@ -0,0 +1,45 @@
+"""Add worker nodes and account leases
+
+Revision ID: 0021_add_worker_leases
+Revises: 0020_add_pop3_seen_uidls
+Create Date: 2026-10-16 00:00:00.000000
+
+Worker processes heartbeat in worker_nodes and lease accounts
+(lease_owner / lease_expires_at), so several workers can split the accounts
+and take over those of a worker that stopped.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0021_add_worker_leases"
+down_revision = "0020_add_pop3_seen_uidls"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "worker_nodes",
+        sa.Column("id", sa.String(100), primary_key=True),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=False),
+    )
+    op.add_column(
+        "accounts",
+        sa.Column("lease_owner", sa.String(100), nullable=True),
+    )
+    op.add_column(
+        "accounts",
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_accounts_lease_owner", "accounts", ["lease_owner"])
+
+
+def downgrade():
+    op.drop_index("ix_accounts_lease_owner", table_name="accounts")
+    op.drop_column("accounts", "lease_expires_at")
+    op.drop_column("accounts", "lease_owner")
+    op.drop_table("worker_nodes")
@@ -0,0 +1,30 @@
+"""Add metrics snapshot to worker nodes
+
+Revision ID: 0022_add_worker_node_metrics
+Revises: 0021_add_worker_leases
+Create Date: 2026-10-16 00:00:00.000000
+
+Each worker stores a JSON snapshot of its counters and histograms with every
+heartbeat, so the web app can report them without reaching the worker.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0022_add_worker_node_metrics"
+down_revision = "0021_add_worker_leases"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "worker_nodes",
+        sa.Column("metrics", sa.Text(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("worker_nodes", "metrics")
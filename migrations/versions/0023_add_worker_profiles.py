@@ -0,0 +1,47 @@
+"""Add worker profiles and profile requests
+
+Revision ID: 0023_add_worker_profiles
+Revises: 0022_add_worker_node_metrics
+Create Date: 2026-10-16 00:00:00.000000
+
+The maintenance page asks the worker to profile its next cycles
+(worker_state.profile_cycles / profile_requested_at); the sampled stacks
+are stored in worker_profiles for download.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0023_add_worker_profiles"
+down_revision = "0022_add_worker_node_metrics"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "worker_state",
+        sa.Column("profile_cycles", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "worker_state",
+        sa.Column("profile_requested_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "worker_profiles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("node_id", sa.String(100), nullable=False),
+        sa.Column("cycles", sa.Integer(), nullable=False),
+        sa.Column("samples", sa.Integer(), nullable=False),
+        sa.Column("folded_stacks", sa.Text(), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("worker_profiles")
+    op.drop_column("worker_state", "profile_requested_at")
+    op.drop_column("worker_state", "profile_cycles")
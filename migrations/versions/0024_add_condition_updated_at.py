@@ -0,0 +1,31 @@
+"""Add updated_at to rule conditions
+
+Revision ID: 0024_add_condition_updated_at
+Revises: 0023_add_worker_profiles
+Create Date: 2026-10-16 00:00:00.000000
+
+The compiled rule set is rebuilt when its version stamp changes. Row counts
+and max IDs miss a condition edited in place, so conditions get the same
+updated_at column as rules, webhooks and formats.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0024_add_condition_updated_at"
+down_revision = "0023_add_worker_profiles"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "rule_conditions",
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("now()")),
+    )
+
+
+def downgrade():
+    op.drop_column("rule_conditions", "updated_at")
@@ -0,0 +1,45 @@
+"""Shared fixtures: a Flask app on a temporary SQLite database, with an app context pushed."""
+
+import os
+import sys
+
+import pytest
+
+# Ensure the project root is importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, matcher  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db as _db  # noqa: E402
+from app.models import DiscordWebhook, Rule, RuleCondition  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+
+    # The compiled rule set is cached per process; start every test without one
+    monkeypatch.setattr(matcher, "_rule_set", None)
+    app = create_app(TestConfig)
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def catch_all_rule(db):
+    """A rule matching every message generated by the fake servers."""
+    webhook = DiscordWebhook(name="test", url="http://127.0.0.1:9/webhook")
+    rule = Rule(name="all", webhook=webhook, position=0,
+                conditions=[RuleCondition(field="subject", match_type="contains", pattern="message")])
+    db.session.add_all([webhook, rule])
+    db.session.commit()
+    return rule
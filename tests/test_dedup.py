@@ -0,0 +1,34 @@
+from sqlalchemy import event
+
+from app.dedup import ProcessedMessages
+from app.models import Account
+
+
+def test_only_candidate_digests_are_read(db):
+    account = Account(name="imap", imap_host="127.0.0.1", imap_port=143, imap_user="user", imap_password="password")
+    db.session.add(account)
+    db.session.commit()
+    account_id = account.id
+    stored = ProcessedMessages(account_id)
+    for n in range(1000):
+        stored.add(f"<old{n}@example.com>")
+    stored.flush()
+    db.session.commit()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        processed = ProcessedMessages(account_id)
+        processed.prefetch(["<old1@example.com>", "<new@example.com>", None])
+        assert len(statements) == 1
+        assert "<old1@example.com>" in processed
+        assert "<new@example.com>" not in processed
+        assert len(statements) == 1  # answered from the prefetched batch
+        assert len(processed) == 1
+
+        # A Message-ID that was not prefetched is looked up on its own
+        assert "<old2@example.com>" in processed
+        assert len(statements) == 2
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.imap_client import MailboxCursor, fetch_new_messages
+from app.imap_pool import ImapConnectionPool
+from benchmarks.fake_servers import FakeIMAPServer, Mailbox
+
+
+@pytest.mark.parametrize("capabilities", [(), ("CONDSTORE",)])
+def test_selected_mailbox_is_checked_with_noop_not_status(capabilities):
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    mailbox = Mailbox(3, start=start)
+    pool = ImapConnectionPool()
+    cursor = MailboxCursor()
+
+    with FakeIMAPServer({"INBOX": mailbox}, capabilities) as server:
+        def poll():
+            return [msg.uid for msg in fetch_new_messages(
+                "127.0.0.1", server.port, "user", "password", False, last_processed_date=start - timedelta(seconds=1),
+                ssl_mode="none", uid_cursor=cursor, pool=pool)]
+
+        try:
+            assert poll() == [1, 2, 3]
+            assert server.stats["STATUS"] == 1  # not selected yet
+
+            # Unchanged: the pooled connection still has INBOX selected
+            searches = server.stats["SEARCH"] + server.stats["UID"]
+            assert poll() == []
+            assert server.stats["UID"] + server.stats["SEARCH"] == searches
+
+            mailbox.add(start + timedelta(minutes=5))
+            assert poll() == [4]
+            assert server.stats["STATUS"] == 1
+            assert server.stats["SELECT"] + server.stats["EXAMINE"] == 2
+        finally:
+            pool.close_all()
+
+
+def test_messages_without_internaldate_keep_their_place_in_date_order():
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    mailbox = Mailbox()
+    # Arrival (UID) order differs from date order
+    for minutes in (1, 3, 2, 5, 4):
+        mailbox.add(start + timedelta(minutes=minutes))
+
+    with FakeIMAPServer({"INBOX": mailbox}) as server:
+        server.omit_internaldate(3, 4)
+        uids = [msg.uid for msg in fetch_new_messages(
+            "127.0.0.1", server.port, "user", "password", False, last_processed_date=start,
+            ssl_mode="none", uid_cursor=MailboxCursor(), batch_size=2)]
+
+    # Dated from their Date header in place, not appended after the dated UIDs
+    assert uids == [1, 3, 2, 5, 4]
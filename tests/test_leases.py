@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from app.leases import LeaseManager
+from app.models import Account, WorkerNode
+
+
+def _accounts(db, count):
+    accounts = [
+        Account(name=f"account-{n}", imap_host="127.0.0.1", imap_port=143, imap_user="user", imap_password="password")
+        for n in range(count)
+    ]
+    db.session.add_all(accounts)
+    db.session.commit()
+    return accounts
+
+
+def test_accounts_are_split_between_live_workers(app, db):
+    _accounts(db, 5)
+    first, second = LeaseManager(app, "first"), LeaseManager(app, "second")
+
+    first.heartbeat()
+    assert len(first.rebalance()) == 5
+
+    # A second worker joins: the first hands over its surplus, the second claims it
+    second.heartbeat()
+    kept = first.rebalance()
+    claimed = second.rebalance()
+    assert len(kept) == 3
+    assert len(claimed) == 2
+    assert not kept & claimed
+
+    # Stable once balanced
+    assert first.rebalance() == kept
+    assert second.rebalance() == claimed
+
+
+def test_leases_of_a_dead_worker_are_taken_over(app, db):
+    _accounts(db, 4)
+    first, second = LeaseManager(app, "first"), LeaseManager(app, "second")
+    first.heartbeat()
+    second.heartbeat()
+    first.rebalance()
+    second.rebalance()
+
+    # "first" stops heartbeating: its node and leases expire
+    expired = datetime.now(timezone.utc) - timedelta(minutes=5)
+    WorkerNode.query.filter_by(id="first").update({"heartbeat_at": expired})
+    Account.query.filter_by(lease_owner="first").update({"lease_expires_at": expired})
+    db.session.commit()
+
+    assert len(second.rebalance()) == 4
+
+
+def test_stop_hands_leases_back(app, db):
+    _accounts(db, 2)
+    first = LeaseManager(app, "first")
+    first.heartbeat()
+    first.rebalance()
+
+    first.stop()
+    assert Account.query.filter(Account.lease_owner.isnot(None)).count() == 0
+    assert WorkerNode.query.count() == 0
+
+
+def test_claim_is_a_compare_and_set(app, db):
+    accounts = _accounts(db, 2)
+    contested = accounts[0].id
+    node = LeaseManager(app, "first")
+    node.heartbeat()
+
+    # Another worker claims the first candidate between the SELECT and the UPDATE
+    # (SQLite has no SKIP LOCKED, so only the compare-and-set prevents a double claim)
+    stolen = []
+
+    def steal(conn, cursor, statement, parameters, context, executemany):
+        if not stolen and statement.lstrip().upper().startswith("SELECT ACCOUNTS.ID") \
+                and "lease_owner IS NULL" in statement:
+            stolen.append(contested)
+            conn.connection.cursor().execute(
+                "UPDATE accounts SET lease_owner = 'other', lease_expires_at = ? WHERE id = ?",
+                ((datetime.now(timezone.utc) + timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M:%S.%f"), contested),
+            )
+
+    event.listen(db.engine, "after_cursor_execute", steal)
+    try:
+        assert node.rebalance() == {accounts[1].id}
+    finally:
+        event.remove(db.engine, "after_cursor_execute", steal)
+    assert stolen
+    assert db.session.get(Account, contested).lease_owner == "other"
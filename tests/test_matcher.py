@@ -0,0 +1,19 @@
+import time
+
+from app.matcher import load_rule_set
+
+
+def test_condition_edited_in_place_rebuilds_the_rule_set(db, catch_all_rule):
+    def match(subject):
+        rule = load_rule_set().first_match(1, from_address="a@example.com", to_address="me@example.com",
+                                           subject=subject)
+        return rule.name if rule else None
+
+    assert match("Test message 1") == "all"
+
+    time.sleep(0.01)  # updated_at must differ from the insert timestamp
+    catch_all_rule.conditions[0].pattern = "invoice"
+    db.session.commit()
+
+    assert match("Test message 1") is None
+    assert match("Your invoice") == "all"
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+from app.imap_client import MailMessage
+from app.models import Account, NotificationOutbox, Rule, RuleCondition
+from app.notify import evaluate_and_notify
+
+
+def _flagged_at(db, rule):
+    return db.session.query(Rule.regex_timeout_at).filter_by(id=rule.id).scalar()
+
+
+def test_regex_timeout_flag_is_left_to_the_callers_commit(db, catch_all_rule):
+    slow = Rule(name="slow", position=-1,
+                conditions=[RuleCondition(field="subject", match_type="regex", pattern=r"^(a|aa)+$")])
+    account = Account(name="imap", imap_host="127.0.0.1", imap_port=143, imap_user="user",
+                      imap_password="password")
+    db.session.add_all([slow, account])
+    db.session.commit()
+    msg = MailMessage(uid=1, from_address="sender@example.com", to_address="me@example.com",
+                      subject="a" * 40 + " message", date="", message_id="<slow@example.com>",
+                      internal_date=datetime.now(timezone.utc))
+
+    assert evaluate_and_notify(account, msg)
+    assert _flagged_at(db, slow) is not None
+
+    # Nothing was committed behind the caller's back: the queued row and the
+    # flag are only kept once the caller commits them with its cursor
+    db.session.rollback()
+    assert NotificationOutbox.query.count() == 0
+    assert _flagged_at(db, slow) is None
+
+
+def test_regex_timeouts_are_collected_for_the_caller(db, catch_all_rule):
+    slow = Rule(name="slow", position=-1,
+                conditions=[RuleCondition(field="subject", match_type="regex", pattern=r"^(a|aa)+$")])
+    account = Account(name="imap", imap_host="127.0.0.1", imap_port=143, imap_user="user",
+                      imap_password="password")
+    db.session.add_all([slow, account])
+    db.session.commit()
+    msg = MailMessage(uid=1, from_address="sender@example.com", to_address="me@example.com",
+                      subject="a" * 40 + " message", date="", message_id="<slow@example.com>",
+                      internal_date=datetime.now(timezone.utc))
+
+    # No UPDATE (and so no row lock on rules) until the caller flags them itself
+    timed_out = []
+    assert evaluate_and_notify(account, msg, timed_out=timed_out)
+    assert [rule.id for rule in timed_out] == [slow.id]
+    assert _flagged_at(db, slow) is None
@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from app import discord, outbox
+from app.models import FailureLog, NotificationOutbox
+
+WEBHOOK = "http://127.0.0.1:9/webhook"
+
+
+class _Posts(list):
+    """Descriptions of the embeds posted per send_embeds() call; *fail* may raise instead of posting."""
+    fail = None
+
+
+@pytest.fixture(autouse=True)
+def no_linger(monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_LINGER_SECONDS", 0)
+    monkeypatch.setattr(outbox, "_rate_limited_until", {})
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    posts = _Posts()
+
+    def send_embeds(webhook_url, embeds):
+        descriptions = [embed["description"] for embed in embeds]
+        if posts.fail is not None:
+            posts.fail(descriptions)
+        posts.append(descriptions)
+
+    monkeypatch.setattr(outbox, "send_embeds", send_embeds)
+    return posts
+
+
+@pytest.fixture
+def queue(db):
+    """Queue and commit one notification per text, as the worker does."""
+    def queue(*texts):
+        account = SimpleNamespace(id=1)
+        rule = SimpleNamespace(id=1, name="rule", webhook_url=WEBHOOK)
+        for text in texts:
+            msg = SimpleNamespace(uid=1, message_id=f"<{text}@example.com>", from_address="a@example.com",
+                                  subject=text, internal_date=datetime.now(timezone.utc))
+            outbox.enqueue_notification(account, msg, rule, text)
+        db.session.commit()
+    return queue
+
+
+def _make_due(db):
+    NotificationOutbox.query.update({"next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def _statuses():
+    return [row.status for row in NotificationOutbox.query.order_by(NotificationOutbox.id)]
+
+
+def test_claimed_rows_are_not_claimed_again(db, queue):
+    queue("one", "two", "three")
+    _make_due(db)
+
+    assert [row.rendered_message for row in outbox.claim_due()] == ["one", "two", "three"]
+    # Leased until OUTBOX_LEASE_SECONDS from now: a second claim (another thread or worker) gets nothing
+    assert outbox.claim_due() == []
+
+
+def test_queued_notifications_are_sent_and_not_sent_twice(db, queue, posts):
+    queue("one", "two")
+    _make_due(db)
+
+    assert outbox.deliver_due() == 2
+    assert posts == [["one", "two"]]
+    assert _statuses() == [NotificationOutbox.STATUS_SENT] * 2
+
+    _make_due(db)
+    assert outbox.deliver_due() == 0
+    assert len(posts) == 1
+
+
+def test_failed_delivery_is_retried_with_backoff_then_given_up(db, queue, posts, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+
+    def fail(descriptions):
+        raise requests.ConnectionError("connection refused")
+
+    posts.fail = fail
+    queue("one")
+    _make_due(db)
+
+    before = datetime.now(timezone.utc).replace(tzinfo=None)
+    outbox.deliver_due()
+    row = NotificationOutbox.query.one()
+    assert row.status == NotificationOutbox.STATUS_PENDING
+    assert row.attempts == 1
+    assert row.next_attempt_at >= before + timedelta(seconds=outbox.RETRY_BASE_SECONDS)
+    assert outbox.deliver_due() == 0  # not due yet
+
+    _make_due(db)
+    outbox.deliver_due()
+    assert _statuses() == [NotificationOutbox.STATUS_FAILED]
+    assert FailureLog.query.count() == 1
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def test_pack_embeds_respects_the_count_and_size_limits():
+    rows = [NotificationOutbox(rendered_message=str(n)) for n in range(25)]
+    assert [len(batch) for batch in outbox.pack_embeds(rows)] == [10, 10, 5]
+
+    # Each embed is about 2500 characters, so only two fit in one message
+    big = [NotificationOutbox(rendered_message="x" * 2500) for _ in range(5)]
+    assert [len(batch) for batch in outbox.pack_embeds(big)] == [2, 2, 1]
+
+
+def test_burst_to_one_webhook_is_sent_as_multi_embed_messages(db, queue, posts):
+    queue(*(f"m{n}" for n in range(12)))
+    _make_due(db)
+
+    outbox.deliver_due()
+    assert [len(post) for post in posts] == [10, 2]
+    assert _statuses() == [NotificationOutbox.STATUS_SENT] * 12
+
+
+def test_rate_limit_defers_without_counting_an_attempt(db, queue, posts):
+    def fail(descriptions):
+        raise outbox.DiscordRateLimited(30)
+
+    posts.fail = fail
+    queue("one", "two")
+    _make_due(db)
+
+    before = datetime.now(timezone.utc).replace(tzinfo=None)
+    outbox.deliver_due()
+    rows = NotificationOutbox.query.all()
+    assert {row.status for row in rows} == {NotificationOutbox.STATUS_PENDING}
+    assert {row.attempts for row in rows} == {0}
+    assert all(row.next_attempt_at >= before + timedelta(seconds=30) for row in rows)
+
+    # Later rows for the webhook wait out the same Retry-After without a request
+    posts.fail = None
+    queue("three")
+    _make_due(db)
+    outbox.deliver_due()
+    assert posts == []
+    assert NotificationOutbox.query.filter_by(rendered_message="three").one().attempts == 0
+
+
+def test_rejected_multi_embed_message_is_split_so_only_the_bad_embed_fails(db, queue, posts):
+    def fail(descriptions):
+        if "bad" in descriptions:
+            raise _http_error(400)
+
+    posts.fail = fail
+    queue("one", "bad", "two")
+    _make_due(db)
+
+    outbox.deliver_due()
+    assert posts == [["one"], ["two"]]
+    assert _statuses() == [NotificationOutbox.STATUS_SENT, NotificationOutbox.STATUS_FAILED,
+                           NotificationOutbox.STATUS_SENT]
+
+
+@pytest.mark.parametrize("body, headers, expected", [
+    (b'{"retry_after": 2.5, "global": false}', {"Retry-After": "7"}, 2.5),
+    (b"", {"Retry-After": "7"}, 7.0),
+    (b"", {}, 1.0),
+])
+def test_retry_after_prefers_the_json_body(body, headers, expected):
+    response = requests.Response()
+    response.status_code = 429
+    response._content = body
+    response.headers.update(headers)
+    assert discord._retry_after(response) == expected
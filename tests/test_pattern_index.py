@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from app.matcher import RuleSet
+from app.models import DiscordWebhook, Rule, RuleCondition
+from app.pattern_index import AhoCorasick, PrefixTrie, SuffixTrie
+from benchmarks.corpus import generate_headers, generate_rules, to_messages
+
+NAIVE = {
+    AhoCorasick: lambda text, needle: needle in text,
+    PrefixTrie: lambda text, needle: text.startswith(needle),
+    SuffixTrie: lambda text, needle: text.endswith(needle),
+}
+
+
+def _random_strings(rng, count, max_length, alphabet="abac@.日本"):
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("index_class", [AhoCorasick, PrefixTrie, SuffixTrie])
+def test_index_finds_the_same_needles_as_naive_matching(index_class):
+    # A small alphabet gives overlapping needles, shared prefixes and repeated keys
+    rng = random.Random(index_class.__name__)
+    needles = _random_strings(rng, 200, 6)
+    index = index_class((needle, key) for key, needle in enumerate(needles))
+    naive = NAIVE[index_class]
+
+    for text in _random_strings(rng, 500, 20):
+        expected = {key for key, needle in enumerate(needles) if naive(text, needle)}
+        assert index.search(text) == expected, text
+
+
+def _naive_first_match(rules, account_id, msg):
+    values = {"from": msg.from_address, "to": msg.to_address, "subject": msg.subject}
+    for rule in rules:
+        if rule.account_id is not None and rule.account_id != account_id:
+            continue
+        if all(_naive_condition(cond, values[cond.field]) for cond in rule.conditions):
+            return rule.id
+    return None
+
+
+def _naive_condition(cond, value):
+    if cond.match_type == RuleCondition.MATCH_REGEX:
+        return cond.regex.search(value) is not None
+    value, needle = value.lower(), cond.needle
+    return {
+        RuleCondition.MATCH_PREFIX: value.startswith,
+        RuleCondition.MATCH_SUFFIX: value.endswith,
+        RuleCondition.MATCH_CONTAINS: value.__contains__,
+    }[cond.match_type](needle)
+
+
+def test_rule_set_picks_the_same_rule_as_naive_evaluation():
+    webhook = DiscordWebhook(name="test", url="http://127.0.0.1:9/webhook")
+    rules = [
+        Rule(id=position + 1, name=spec.name, position=spec.position, account_id=spec.account_id, webhook=webhook,
+             conditions=[RuleCondition(field=c.field, match_type=c.match_type, pattern=c.pattern)
+                         for c in spec.conditions])
+        for position, spec in enumerate(generate_rules(300, accounts=3, seed=7))
+    ]
+    rule_set = RuleSet.build(("test",), rules)
+    messages = to_messages(generate_headers(1000, seed=7))
+
+    matched = 0
+    for msg in messages:
+        account_id = msg.uid % 3 + 1
+        rule = rule_set.first_match(account_id, from_address=msg.from_address, to_address=msg.to_address,
+                                    subject=msg.subject)
+        expected = _naive_first_match(rule_set.rules, account_id, msg)
+        assert (rule.id if rule else None) == expected, msg
+        matched += expected is not None
+    assert matched  # the corpus shares its vocabulary with the rules
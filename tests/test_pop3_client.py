@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import pop3_client
+from app.pop3_client import UidlSnapshot, fetch_new_messages
+from benchmarks.fake_servers import FakePOP3Server, Mailbox
+
+
+def _top_round_trips(server):
+    """Round-trips spent on TOP (every other command waits for its reply)."""
+    others = sum(count for command, count in server.stats.items() if command.isupper() and command != "TOP")
+    return server.stats["round_trips"] - others
+
+
+def _poll(server, since, snapshot):
+    return [msg.message_id for msg in fetch_new_messages(
+        "127.0.0.1", server.port, "user", "password", False, last_processed_date=since,
+        ssl_mode="none", uidl_snapshot=snapshot)]
+
+
+@pytest.mark.parametrize("capabilities", [("PIPELINING",), ()])
+def test_refused_top_in_the_middle_of_a_batch(capabilities):
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    with FakePOP3Server({"INBOX": Mailbox(5, start=start)}, capabilities) as server:
+        server.refuse_top(3)
+        snapshot = UidlSnapshot()
+        found = _poll(server, start - timedelta(seconds=1), snapshot)
+
+    # The replies after the -ERR are still matched to their messages
+    assert found == ["<msg1@example.com>", "<msg2@example.com>", "<msg4@example.com>", "<msg5@example.com>"]
+    # The refused message is not marked as examined, so the next poll retries it
+    assert "uidl-3" not in snapshot and "uidl-4" in snapshot
+    if capabilities:
+        assert _top_round_trips(server) == 1
+
+
+def test_pipelining_falls_back_without_poplib_internals(monkeypatch):
+    monkeypatch.setattr(pop3_client._PipelinedTop, "available", staticmethod(lambda conn: False))
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    with FakePOP3Server({"INBOX": Mailbox(3, start=start)}, ("PIPELINING",)) as server:
+        assert len(_poll(server, start - timedelta(seconds=1), UidlSnapshot())) == 3
+        assert _top_round_trips(server) == 3
+
+
+def test_lost_connection_is_not_taken_for_a_refusal():
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    with FakePOP3Server({"INBOX": Mailbox(5, start=start)}) as server:
+        server.reset_after_top(2)
+        with pytest.raises((OSError, pop3_client.poplib.error_proto)):
+            _poll(server, start - timedelta(seconds=1), UidlSnapshot())
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import WorkerNode, WorkerProfile, WorkerState
+from app.profiling import CycleProfiler
+
+
+def _profile_cycle(profiler, state):
+    profiler.begin_cycle(state)
+    profiler.end_cycle()
+
+
+def test_every_running_node_profiles_the_request(db):
+    now = datetime.now(timezone.utc)
+    db.session.add_all([
+        WorkerNode(id="first", started_at=now - timedelta(minutes=5), heartbeat_at=now),
+        WorkerNode(id="second", started_at=now - timedelta(minutes=5), heartbeat_at=now),
+        WorkerState(id=1, profile_cycles=1, profile_requested_at=now),
+    ])
+    db.session.commit()
+    state = db.session.get(WorkerState, 1)
+    first, second = CycleProfiler("first"), CycleProfiler("second")
+
+    # The first node to finish must not cancel the request for the other one
+    _profile_cycle(first, state)
+    _profile_cycle(second, state)
+    assert sorted(p.node_id for p in WorkerProfile.query) == ["first", "second"]
+
+    # Each node profiles a request once, also after a restart with the same node ID
+    _profile_cycle(first, state)
+    _profile_cycle(CycleProfiler("second"), state)
+    assert WorkerProfile.query.count() == 2
+
+
+def test_nodes_started_after_the_request_skip_it(db):
+    now = datetime.now(timezone.utc)
+    db.session.add_all([
+        WorkerNode(id="late", started_at=now + timedelta(seconds=1), heartbeat_at=now),
+        WorkerState(id=1, profile_cycles=1, profile_requested_at=now),
+    ])
+    db.session.commit()
+
+    _profile_cycle(CycleProfiler("late"), db.session.get(WorkerState, 1))
+    assert WorkerProfile.query.count() == 0
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+from app import scheduler
+from app.scheduler import AccountScheduler, PollOutcome
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _account(account_id, poll_interval=60):
+    return SimpleNamespace(id=account_id, poll_interval=poll_interval)
+
+
+def _poll(sched, clock, outcome):
+    """Advance to the account's due time, pop it and record *outcome*; returns the delay."""
+    delay = sched.seconds_until_next(default=1e9)
+    clock.now += delay
+    assert sched.pop_due() == [1]
+    sched.record(1, outcome)
+    return sched.seconds_until_next(default=1e9)
+
+
+def test_failures_back_off_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(scheduler, "BACKOFF_MAX_SECONDS", 600)
+    clock = FakeClock()
+    sched = AccountScheduler(clock=clock)
+    sched.sync([_account(1)], default_interval=60)
+
+    delays = [_poll(sched, clock, PollOutcome(failed=True)) for _ in range(5)]
+    assert delays == [120, 240, 480, 600, 600]
+
+    # One successful poll resets the backoff
+    assert _poll(sched, clock, PollOutcome()) == 90
+
+
+def test_interval_adapts_between_speedup_and_slowdown_bounds():
+    clock = FakeClock()
+    sched = AccountScheduler(clock=clock)
+    sched.sync([_account(1, poll_interval=80)], default_interval=60)
+
+    busy = [_poll(sched, clock, PollOutcome(new_messages=3)) for _ in range(4)]
+    assert busy == [40, 20, 20, 20]  # base / SPEEDUP_FACTOR
+
+    quiet = [_poll(sched, clock, PollOutcome()) for _ in range(8)]
+    assert quiet[0] == 30
+    assert quiet[-1] == 320  # base * SLOWDOWN_FACTOR
+
+
+def test_only_due_accounts_are_popped_and_stale_entries_are_ignored():
+    clock = FakeClock()
+    sched = AccountScheduler(clock=clock)
+    sched.sync([_account(1), _account(2, poll_interval=120)], default_interval=60)
+    assert sorted(sched.pop_due()) == [1, 2]
+
+    sched.record(1, PollOutcome(new_messages=1))
+    sched.record(2, PollOutcome(new_messages=1))
+    clock.now += 30
+    assert sched.pop_due() == [1]
+    assert sched.seconds_until_next(default=1e9) == 30
+
+    # A removed account's heap entry is dropped, not returned
+    sched.sync([_account(1)], default_interval=60)
+    clock.now += 30
+    assert sched.pop_due() == []
@@ -0,0 +1,29 @@
+from app.models import Account, WorkerTrigger
+
+import worker
+
+
+def _account(name, enabled):
+    return Account(name=name, imap_host="127.0.0.1", imap_port=143, imap_user="user",
+                   imap_password="password", enabled=enabled)
+
+
+def test_triggers_of_disabled_accounts_are_discarded(db):
+    enabled, disabled = _account("enabled", True), _account("disabled", False)
+    db.session.add_all([enabled, disabled])
+    db.session.flush()
+    db.session.add_all([WorkerTrigger(account_id=enabled.id), WorkerTrigger(account_id=disabled.id)])
+    db.session.commit()
+
+    assert worker.discard_orphan_triggers() == 1
+    assert [t.account_id for t in WorkerTrigger.query] == [enabled.id]
+
+
+def test_receive_now_rejects_disabled_accounts(app, db):
+    account = _account("disabled", False)
+    db.session.add(account)
+    db.session.commit()
+
+    response = app.test_client().post(f"/accounts/{account.id}/receive")
+    assert response.status_code == 302
+    assert WorkerTrigger.query.count() == 0
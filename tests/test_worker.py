@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+from app import pop3_client
+from app.models import Account, AccountMailbox, NotificationOutbox, Rule, RuleCondition
+from benchmarks.fake_servers import FakeIMAPServer, FakePOP3Server, Mailbox
+
+import worker
+
+
+def _queued_message_keys(db):
+    return {key for key, in db.session.query(NotificationOutbox.message_key)}
+
+
+def test_pop3_failure_in_second_chunk_keeps_older_messages(db, catch_all_rule):
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=2)
+    mailbox = Mailbox()
+    chunk = pop3_client.TOP_CHUNK_SIZE
+    # The first chunk is newer than the second: POP3 lists in arrival order, not by date
+    for i in range(chunk):
+        mailbox.add(start + timedelta(minutes=30, seconds=i))
+    for i in range(10):
+        mailbox.add(start + timedelta(minutes=10, seconds=i))
+    second_chunk = {f"<msg{uid}@example.com>" for uid in range(chunk + 1, chunk + 11)}
+
+    with FakePOP3Server({"INBOX": mailbox}) as server:
+        account = Account(name="pop3", protocol_type="pop3", imap_host="127.0.0.1", imap_port=server.port,
+                          imap_user="user", imap_password="password", use_ssl=False, ssl_mode="none",
+                          last_processed_internal_date=start)
+        db.session.add(account)
+        db.session.commit()
+
+        # The connection is reset in the middle of the second chunk
+        server.reset_after_top(chunk + 5)
+        outcome = worker.process_account(account)
+        assert outcome.failed
+        assert outcome.new_messages == chunk
+        assert not second_chunk & _queued_message_keys(db)
+
+        outcome = worker.process_account(account)
+        assert not outcome.failed
+        assert outcome.new_messages == 10
+        assert second_chunk <= _queued_message_keys(db)
+
+
+def test_regex_timeouts_are_flagged_with_the_cursor(db, catch_all_rule):
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    slow = Rule(name="slow", position=-1,
+                conditions=[RuleCondition(field="subject", match_type="regex", pattern=r"^(a|aa)+$")])
+    mailbox = Mailbox()
+    mailbox.add(start + timedelta(minutes=1), subject="a" * 40 + " message")
+
+    with FakePOP3Server({"INBOX": mailbox}) as server:
+        account = Account(name="pop3", protocol_type="pop3", imap_host="127.0.0.1", imap_port=server.port,
+                          imap_user="user", imap_password="password", use_ssl=False, ssl_mode="none",
+                          last_processed_internal_date=start)
+        db.session.add_all([slow, account])
+        db.session.commit()
+
+        outcome = worker.process_account(account)
+        assert outcome.new_messages == 1
+
+    # Committed by save_progress() together with the queued notification
+    db.session.rollback()
+    assert db.session.query(Rule.regex_timeout_at).filter_by(id=slow.id).scalar() is not None
+    assert _queued_message_keys(db) == {"<msg1@example.com>"}
+
+
+def test_message_in_several_folders_is_notified_once(db, catch_all_rule):
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    inbox, work = Mailbox(), Mailbox()
+    inbox.add(start + timedelta(minutes=1), message_id="<shared@example.com>")
+    inbox.add(start + timedelta(minutes=2), message_id="<inbox@example.com>")
+    # Proton Mail Bridge shows a labelled message in INBOX and in the label's folder
+    work.add(start + timedelta(minutes=1), message_id="<shared@example.com>")
+    work.add(start + timedelta(minutes=3), message_id="<work@example.com>")
+
+    with FakeIMAPServer({"INBOX": inbox, "Labels/Work": work}) as server:
+        account = Account(name="imap", imap_host="127.0.0.1", imap_port=server.port, imap_user="user",
+                          imap_password="password", use_ssl=False, ssl_mode="none",
+                          last_processed_internal_date=start,
+                          extra_mailboxes=[AccountMailbox(name="Labels/Work", last_processed_internal_date=start)])
+        db.session.add(account)
+        db.session.commit()
+
+        outcome = worker.process_account(account)
+        assert outcome.new_messages == 3
+        assert _queued_message_keys(db) == {"<shared@example.com>", "<inbox@example.com>", "<work@example.com>"}
+        # The copy in the second folder is skipped before its headers are fetched
+        assert server.stats["fetched"] == 4 + 3
+
+        # A copy turning up in a folder later is skipped as well
+        work.add(start + timedelta(minutes=4), message_id="<inbox@example.com>")
+        outcome = worker.process_account(account)
+        assert outcome.new_messages == 0
+        assert NotificationOutbox.query.count() == 3
@@ -1,30 +1,73 @@
 """
 Mail Notifier Worker Daemon
 ──────────────────────────
-Periodically polls IMAP accounts using INTERNALDATE-based cursor (high-water mark),
-evaluates rules in position order (first‑match‑wins), sends Discord notifications,
-and logs failures. Controlled via the worker_state table (pause / resume / interval).
+Periodically polls IMAP accounts using a UID + UIDVALIDITY cursor, falling back to
+the INTERNALDATE-based cursor (high-water mark) when UIDVALIDITY changes,
+evaluates rules in position order (first‑match‑wins), queues Discord notifications
+in an outbox delivered by separate threads (with retries), and logs failures.
+Controlled via the worker_state table (pause / resume / interval). With PostgreSQL,
+the web UI NOTIFYs the worker, so triggers and setting changes are picked up
+immediately instead of at the next loop.
+
+Each account is polled on its own schedule (accounts.poll_interval or the global
+interval), shortened while mail keeps arriving, lengthened while it is quiet and
+backed off exponentially after failures.
+
+An IMAP account can watch several folders (accounts.mailbox_name plus
+account_mailboxes), polled one after the other over a single connection, each
+with its own cursors.
 
 Deduplication: Uses Message-ID to avoid processing the same email multiple times
-(important for Proton Mail Bridge where labels = folders).
+(important for Proton Mail Bridge where labels = folders). Processed Message-IDs
+are kept in the processed_messages table for DEDUP_RETENTION_DAYS.
+
+Messages are streamed from the server and cursors are checkpointed every
+WORKER_CHECKPOINT_EVERY messages, so large backlogs are neither held in memory
+nor re-notified from the start after a crash.
+
+Accounts are polled in parallel on a bounded thread pool (WORKER_CONCURRENCY,
+at most WORKER_PER_HOST_CONCURRENCY per mail server), each with its own DB session.
+
+Several workers can run against the same database: each leases its fair share
+of the accounts (see app.leases) and only polls, triggers and IDLE-watches
+those, taking over the accounts of a worker whose heartbeat stopped.
 """
 
-import json
 import logging
 import os
+import signal
 import sys
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 
 # Ensure the project root is importable
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 from app import create_app
 from app.extensions import db
-from app.models import Account, Rule, FailureLog, WorkerState, WorkerTrigger
-from app.imap_client import fetch_new_messages
-from app.pop3_client import fetch_new_messages as pop3_fetch_new_messages
+from app.models import Account, AccountMailbox, Rule, FailureLog, WorkerState, WorkerTrigger
+from app.imap_client import MailboxCursor, MailboxPoll, fetch_mailboxes
+from app.imap_idle import IdleManager
+from app.imap_pool import ImapConnectionPool
+from app.leases import LeaseManager
+from app.pop3_client import UidlSnapshot, fetch_new_messages as pop3_fetch_new_messages
+from app.scheduler import AccountScheduler, PollOutcome
+from app.dedup import ProcessedMessages, purge_expired
+from app.discord import connection_stats
+from app.events import EVENT_RULES, WorkerEvents
+from app.matcher import CompiledRule, flag_regex_timeouts, load_rule_set
+from app import metrics
+from app.profiling import CycleProfiler
+from app.tracing import span, trace
 from app.notify import evaluate_and_notify
+from app.outbox import OutboxDispatcher, purge_old
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,186 +78,503 @@ logger = logging.getLogger("worker")
 # Default poll interval from env; overridden by DB value at runtime
 DEFAULT_INTERVAL = int(os.environ.get("POLL_INTERVAL", "60"))
 
-# Maximum number of Message-IDs to keep for deduplication (FIFO)
-MAX_MESSAGE_IDS = 1000
+# Commit cursors and processed Message-IDs after this many messages, so a crash
+# mid-batch does not re-notify everything that was already sent
+CHECKPOINT_EVERY = int(os.environ.get("WORKER_CHECKPOINT_EVERY", "50"))
+
+# Accounts polled in parallel, overall and per mail server host
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "8"))
+WORKER_PER_HOST_CONCURRENCY = int(os.environ.get("WORKER_PER_HOST_CONCURRENCY", "4"))
 
 
 def cleanup_old_logs():
-    """Remove failure logs older than 30 days."""
+    """Remove failure logs older than 30 days, delivered outbox rows and expired Message-IDs."""
     cutoff = datetime.now(timezone.utc) - timedelta(days=30)
     deleted = FailureLog.query.filter(FailureLog.created_at < cutoff).delete()
+    purged = purge_old()
+    expired = purge_expired()
+    if deleted or purged or expired:
+        db.session.commit()
+        logger.info("Cleaned up %d old failure log(s), %d outbox row(s) and %d processed Message-ID(s)",
+                    deleted, purged, expired)
+
+
+def discard_orphan_triggers() -> int:
+    """
+    Delete triggers of disabled or deleted accounts: no worker leases those
+    accounts, so nobody else would ever remove them. Safe to run on every node.
+    """
+    enabled_ids = select(Account.id).where(Account.enabled.is_(True))
+    deleted = WorkerTrigger.query.filter(WorkerTrigger.account_id.not_in(enabled_ids)).delete(
+        synchronize_session=False)
     if deleted:
         db.session.commit()
-        logger.info("Cleaned up %d old failure log(s)", deleted)
-
-
-def process_account(account: Account):
-    """Fetch new mail for *account* and evaluate rules using INTERNALDATE cursor."""
+        logger.info("Discarded %d trigger(s) of disabled account(s)", deleted)
+    return deleted
+
+
+@dataclass
+class _FolderProgress:
+    """Cursors of one folder being polled; *holder* is the Account (primary mailbox) or an AccountMailbox."""
+    holder: Union[Account, AccountMailbox]
+    cursor: datetime
+    max_internal_date: datetime
+    uid_cursor: Optional[MailboxCursor] = None
+
+
+def load_uid_cursor(holder: Union[Account, AccountMailbox]) -> MailboxCursor:
+    """Build the IMAP UID/STATUS cursor from the stored columns of an account or extra mailbox."""
+    return MailboxCursor(
+        uidvalidity=holder.last_uidvalidity or 0,
+        last_uid=holder.last_uid or 0,
+        uidnext=holder.last_uidnext or 0,
+        messages=holder.last_message_count or 0,
+        highestmodseq=holder.last_highestmodseq or 0,
+    )
+
+
+def store_uid_cursor(holder: Union[Account, AccountMailbox], cursor: MailboxCursor) -> bool:
+    """Copy *cursor* back onto *holder*; returns True if anything changed."""
+    values = {
+        "last_uidvalidity": cursor.uidvalidity,
+        "last_uid": cursor.last_uid,
+        "last_uidnext": cursor.uidnext,
+        "last_message_count": cursor.messages,
+        "last_highestmodseq": cursor.highestmodseq,
+    }
+    changed = False
+    for column, value in values.items():
+        if getattr(holder, column) != value:
+            setattr(holder, column, value)
+            changed = True
+    if changed:
+        logger.debug("UID cursor updated to %d (UIDVALIDITY %d, UIDNEXT %d)",
+                     cursor.last_uid, cursor.uidvalidity, cursor.uidnext)
+    return changed
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Cursors are stored naive (UTC); make them timezone-aware."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def process_account(account: Account, imap_pool: ImapConnectionPool = None) -> PollOutcome:
+    """
+    Fetch new mail for *account* and evaluate rules using INTERNALDATE cursor.
+    IMAP accounts poll their primary mailbox and extra mailboxes over one
+    connection, taken from *imap_pool* when given.
+    """
     protocol = getattr(account, 'protocol_type', 'imap') or 'imap'
     logger.info("Checking %s (%s@%s:%s) [%s]", account.name, account.imap_user, account.imap_host, account.imap_port, protocol.upper())
 
-    # Expire cached objects so we always read the latest notification formats
-    db.session.expire_all()
+    holders = [account] if protocol == 'pop3' else [account, *account.extra_mailboxes]
 
-    # Initialize cursor if this is the first run
-    if account.last_processed_internal_date is None:
-        # Set cursor to current time (don't process existing emails on first run)
-        account.last_processed_internal_date = datetime.now(timezone.utc)
+    # Initialize cursors on the first run of the account or of a newly added folder
+    # (set to current time: don't process existing emails)
+    initialized = [holder for holder in holders if holder.last_processed_internal_date is None]
+    if initialized:
+        now = datetime.now(timezone.utc)
+        for holder in initialized:
+            holder.last_processed_internal_date = now
         db.session.commit()
-        logger.info("初回実行: カーソルを現在時刻に初期化しました")
-        return
-
-    # Ensure cursor is timezone-aware (convert from DB if needed)
-    cursor = account.last_processed_internal_date
-    if cursor.tzinfo is None:
-        cursor = cursor.replace(tzinfo=timezone.utc)
-        logger.debug("Converted naive cursor to UTC-aware")
-
-    # Load deduplication cache
-    try:
-        processed_ids = json.loads(account.processed_message_ids) if account.processed_message_ids else []
-    except json.JSONDecodeError:
-        processed_ids = []
-        logger.warning("Message-ID cache parse error, resetting")
-
-    try:
-        if protocol == 'pop3':
-            processed_set = set(processed_ids)
-            messages = pop3_fetch_new_messages(
-                host=account.imap_host,
-                port=account.imap_port,
-                user=account.imap_user,
-                password=account.imap_password,
-                use_ssl=account.use_ssl,
-                last_processed_date=cursor,
-                ssl_mode=getattr(account, 'ssl_mode', None),
-                processed_uidls=processed_set,
-            )
-        else:
-            messages = fetch_new_messages(
-                host=account.imap_host,
-                port=account.imap_port,
-                user=account.imap_user,
-                password=account.imap_password,
-                use_ssl=account.use_ssl,
-                last_processed_date=cursor,
-                mailbox_name=account.mailbox_name,
-                ssl_mode=getattr(account, 'ssl_mode', None),
-            )
-    except Exception as exc:
-        log = FailureLog(
-            account_id=account.id,
-            error_message=f"{protocol.upper()} error: {exc}",
+        logger.info("初回実行: カーソルを現在時刻に初期化しました (%s)",
+                    ", ".join(account.mailbox_name if holder is account else holder.name for holder in initialized))
+        if account in initialized:
+            return PollOutcome()
+
+    folders: Dict[str, _FolderProgress] = {}
+    for holder in holders:
+        if holder in initialized:
+            continue
+        cursor = _as_utc(holder.last_processed_internal_date)
+        folders[account.mailbox_name if holder is account else holder.name] = _FolderProgress(
+            holder=holder,
+            cursor=cursor,
+            max_internal_date=cursor,
+            uid_cursor=load_uid_cursor(holder) if protocol != 'pop3' else None,
         )
-        db.session.add(log)
-        db.session.commit()
-        return
+    primary = folders[account.mailbox_name]
+
+    # Processed Message-IDs, looked up batch by batch as the clients list candidates
+    processed = ProcessedMessages(account.id)
+
+    uidl_snapshot = None
+    if protocol == 'pop3':
+        # Only UIDLs the server did not list at the last poll are fetched with TOP
+        uidl_snapshot = UidlSnapshot(account.pop3_seen_uidls)
+        messages = pop3_fetch_new_messages(
+            host=account.imap_host,
+            port=account.imap_port,
+            user=account.imap_user,
+            password=account.imap_password,
+            use_ssl=account.use_ssl,
+            last_processed_date=primary.cursor,
+            ssl_mode=getattr(account, 'ssl_mode', None),
+            processed_uidls=processed,
+            uidl_snapshot=uidl_snapshot,
+        )
+    else:
+        messages = fetch_mailboxes(
+            host=account.imap_host,
+            port=account.imap_port,
+            user=account.imap_user,
+            password=account.imap_password,
+            use_ssl=account.use_ssl,
+            mailboxes=[MailboxPoll(name, folder.cursor, folder.uid_cursor) for name, folder in folders.items()],
+            ssl_mode=getattr(account, 'ssl_mode', None),
+            pool=imap_pool,
+            # Message-IDs handled in one folder are skipped (before any header
+            # fetch) in the folders polled after it
+            seen=processed,
+        )
+
+    # Compiled once per poll; only rebuilt when rules, formats or webhooks changed
+    rule_set = load_rule_set()
 
-    max_internal_date = cursor
     processed_count = 0
     skipped_count = 0
+    queued = False  # outbox rows added since the last commit
+    regex_timeouts = []  # flagged with the next commit, see save_progress()
+    fetch_error = None
 
-    for msg in messages:
-        # Deduplication: skip if Message-ID already processed
-        if msg.message_id and msg.message_id in processed_ids:
-            logger.debug("  Duplicate Message-ID %s, skipping", msg.message_id)
-            skipped_count += 1
-            continue
+    try:
+        while True:
+            # Fetch errors (IMAP/POP3) are logged as failures after saving the
+            # progress made so far; errors while processing a message propagate.
+            try:
+                msg = next(messages)
+            except StopIteration:
+                break
+            except Exception as exc:
+                fetch_error = exc
+                break
+
+            # Deduplication: skip if Message-ID already processed
+            if msg.message_id in processed:
+                logger.debug("  Duplicate Message-ID %s, skipping", msg.message_id)
+                skipped_count += 1
+                metrics.DEDUP_SKIPPED.inc(account=account.id)
+                continue
 
-        logger.info("  New mail internal_date=%s from=%s subject=%s", 
-                   msg.internal_date.isoformat(), msg.from_address, msg.subject)
-        
-        evaluate_and_notify(account, msg)
-        processed_count += 1
+            logger.info("  New mail internal_date=%s from=%s subject=%s", 
+                       msg.internal_date.isoformat(), msg.from_address, msg.subject)
 
-        # Update high-water mark
-        if msg.internal_date > max_internal_date:
-            max_internal_date = msg.internal_date
+            metrics.MESSAGES_SCANNED.inc(account=account.id)
+            if evaluate_and_notify(account, msg, rule_set, timed_out=regex_timeouts):
+                metrics.MESSAGES_NOTIFIED.inc(account=account.id)
+                queued = True
+            processed_count += 1
 
-        # Add to deduplication cache
-        if msg.message_id:
-            processed_ids.append(msg.message_id)
+            # Update the folder's high-water mark
+            folder = folders.get(msg.mailbox, primary)
+            if msg.internal_date > folder.max_internal_date:
+                folder.max_internal_date = msg.internal_date
 
-    if processed_count == 0 and skipped_count == 0:
-        logger.debug("No new messages for %s", account.name)
-        return
+            # Recorded with the next checkpoint
+            processed.add(msg.message_id)
+
+            if processed_count % CHECKPOINT_EVERY == 0:
+                save_progress(account, protocol, folders.values(), processed, uidl_snapshot,
+                              checkpoint=True, queued=queued, regex_timeouts=regex_timeouts)
+                queued = False
+    finally:
+        messages.close()
 
-    # Trim deduplication cache (FIFO)
-    if len(processed_ids) > MAX_MESSAGE_IDS:
-        processed_ids = processed_ids[-MAX_MESSAGE_IDS:]
+    # After a fetch error only the checkpoint cursors are safe: the messages not
+    # yet streamed may be older than the newest processed one
+    changed = save_progress(account, protocol, folders.values(), processed, uidl_snapshot,
+                            checkpoint=fetch_error is not None, queued=queued, regex_timeouts=regex_timeouts)
 
-    # Update cursor and cache
-    if max_internal_date > cursor:
-        account.last_processed_internal_date = max_internal_date
-        account.processed_message_ids = json.dumps(processed_ids)
+    if fetch_error is not None:
+        log = FailureLog(
+            account_id=account.id,
+            error_message=f"{protocol.upper()} error: {fetch_error}",
+        )
+        db.session.add(log)
         db.session.commit()
+        return PollOutcome(new_messages=processed_count, failed=True)
+
+    if processed_count == 0 and skipped_count == 0:
+        logger.debug("No new messages for %s", account.name)
+    elif changed:
         logger.info("Cursor updated to %s (%d processed, %d skipped)", 
-                   max_internal_date.isoformat(), processed_count, skipped_count)
-    elif processed_ids:
-        # Update cache even if cursor didn't move
-        account.processed_message_ids = json.dumps(processed_ids)
+                   max(folder.max_internal_date for folder in folders.values()).isoformat(),
+                   processed_count, skipped_count)
+    return PollOutcome(new_messages=processed_count)
+
+
+@span("save_progress")
+def save_progress(account: Account, protocol: str, folders: Iterable[_FolderProgress],
+                  processed: ProcessedMessages, uidl_snapshot: UidlSnapshot = None,
+                  checkpoint: bool = False, queued: bool = False,
+                  regex_timeouts: List[CompiledRule] = None) -> bool:
+    """
+    Persist the date and UID cursors of every polled folder, the processed
+    Message-IDs and the POP3 UIDL snapshot together with any notifications
+    *queued* in the outbox; returns True if anything was committed.
+    Rules in *regex_timeouts* are flagged in the same short transaction (and
+    the list cleared), so their row locks are not held during mail server I/O.
+
+    Messages of a folder are streamed in date order, so at a *checkpoint* its date
+    cursor can advance too – but only to one second before the newest processed
+    message, since later messages may share its timestamp (those already processed
+    are caught by the processed Message-IDs). POP3 is only ordered within a chunk,
+    so its date cursor moves only once the whole listing has been processed.
+    """
+    changed = False
+
+    for folder in folders:
+        new_cursor = folder.max_internal_date
+        if checkpoint:
+            new_cursor = folder.cursor if protocol == 'pop3' else max(
+                folder.cursor, folder.max_internal_date - timedelta(seconds=1))
+        stored_cursor = folder.holder.last_processed_internal_date
+        if stored_cursor is None or new_cursor > _as_utc(stored_cursor):
+            folder.holder.last_processed_internal_date = new_cursor
+            changed = True
+
+        # Persist the UID high-water mark (IMAP only) together with the date cursor
+        if folder.uid_cursor is not None and store_uid_cursor(folder.holder, folder.uid_cursor):
+            changed = True
+
+    if processed.flush():
+        changed = True
+
+    if uidl_snapshot is not None:
+        seen_uidls = uidl_snapshot.to_bytes()
+        if account.pop3_seen_uidls != seen_uidls:
+            account.pop3_seen_uidls = seen_uidls
+            changed = True
+
+    if regex_timeouts:
+        flag_regex_timeouts(regex_timeouts)
+        regex_timeouts.clear()
+        changed = True
+
+    if changed or queued:
         db.session.commit()
+        if checkpoint:
+            logger.debug("Checkpoint for %s (%d processed Message-IDs)", account.name, len(processed))
+    return changed
+
+
+def _poll_account_task(app, account_id: int, imap_pool: ImapConnectionPool = None,
+                       reason: str = None) -> Optional[PollOutcome]:
+    """Run process_account() in a worker thread with its own app context (and thus DB session)."""
+    with app.app_context():
+        account = db.session.get(Account, account_id)
+        if account is None or not account.enabled:
+            return None
+        try:
+            if reason:
+                logger.info("%s for %s", reason, account.name)
+            with metrics.account_scope(account_id), metrics.ACCOUNT_POLL_SECONDS.time(account=account_id), \
+                    trace("poll_account", account=account_id, protocol=account.protocol_type):
+                outcome = process_account(account, imap_pool)
+        except Exception:
+            logger.exception("Unhandled error processing %s", account.name)
+            outcome = PollOutcome(failed=True)
+        if outcome.failed:
+            metrics.ACCOUNT_POLL_FAILURES.inc(account=account_id)
+        return outcome
+
+
+def poll_accounts(app, executor: ThreadPoolExecutor, accounts, imap_pool: ImapConnectionPool = None,
+                  reason: str = None, per_host: int = WORKER_PER_HOST_CONCURRENCY) -> Dict[int, Optional[PollOutcome]]:
+    """
+    Poll *accounts* on *executor*, wait until all of them are done and return
+    their outcomes by account ID (None if the account was gone or disabled).
+
+    At most *per_host* accounts of the same mail server run at once; accounts
+    over that limit wait for a slot instead of occupying an executor thread.
+    """
+    pending = deque((account.id, (account.imap_host or "").lower()) for account in accounts)
+    running = {}  # future -> (account ID, host)
+    per_host_running = {}
+    outcomes = {}
+
+    while pending or running:
+        for _ in range(len(pending)):
+            account_id, host = pending.popleft()
+            if per_host_running.get(host, 0) >= per_host:
+                pending.append((account_id, host))
+                continue
+            future = executor.submit(_poll_account_task, app, account_id, imap_pool, reason)
+            running[future] = (account_id, host)
+            per_host_running[host] = per_host_running.get(host, 0) + 1
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            account_id, host = running.pop(future)
+            per_host_running[host] -= 1
+            outcomes[account_id] = future.result()
+
+    return outcomes
+
+
+def wait_for_idle_wakeups(app, executor: ThreadPoolExecutor, idle_manager: IdleManager, timeout: float,
+                          scheduler: AccountScheduler, outbox: OutboxDispatcher,
+                          imap_pool: ImapConnectionPool = None):
+    """
+    Sleep for *timeout* seconds, processing accounts woken by IMAP IDLE
+    (new mail) as soon as their wakeup arrives. Returns early when a worker
+    event (trigger, setting change) interrupts the wait.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        account_ids = idle_manager.wait(remaining)
+        interrupted = IdleManager.INTERRUPT in account_ids
+        account_ids.discard(IdleManager.INTERRUPT)
+        if account_ids:
+            accounts = Account.query.filter(Account.id.in_(account_ids), Account.enabled.is_(True)).all()
+            for account_id, outcome in poll_accounts(app, executor, accounts, imap_pool, reason="IDLE wakeup").items():
+                scheduler.record(account_id, outcome)
+            outbox.wake()
+        if interrupted:
+            return
 
 
 def run():
     """Main daemon loop."""
     app = create_app()
+    idle_manager = IdleManager()
+    imap_pool = ImapConnectionPool()
+    scheduler = AccountScheduler()
+    executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="poll")
+    outbox = OutboxDispatcher(app)
+    outbox.start()
+    events = WorkerEvents(on_wake=idle_manager.interrupt)
+    leases = LeaseManager(app)
+
+    # docker stop sends SIGTERM: exit through the finally below so leases are handed over at once
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     with app.app_context():
-        logger.info("Worker started – default interval %ds", DEFAULT_INTERVAL)
-
-        while True:
-            # Read worker state from DB (SQLAlchemy 2.x compatible)
-            state = db.session.get(WorkerState, 1)
-            if state is None:
-                state = WorkerState(id=1, is_running=True, poll_interval=DEFAULT_INTERVAL)
-                db.session.add(state)
-                db.session.commit()
-
-            interval = state.poll_interval or DEFAULT_INTERVAL
-
-            if not state.is_running:
-                logger.debug("Worker paused – sleeping %ds", interval)
-                time.sleep(interval)
-                continue
+        events.start(db.engine)
+        leases.start()
+        metrics.start_http_server()
+        logger.info("Worker started – default interval %ds, concurrency %d (%d per host)",
+                    DEFAULT_INTERVAL, WORKER_CONCURRENCY, WORKER_PER_HOST_CONCURRENCY)
+        try:
+            _main_loop(app, executor, idle_manager, imap_pool, scheduler, outbox, events, leases,
+                       CycleProfiler(leases.node_id))
+        finally:
+            db.session.rollback()
+            idle_manager.stop_all()
+            executor.shutdown(wait=False, cancel_futures=True)
+            imap_pool.close_all()
+            outbox.stop()  # lets in-flight deliveries finish so they are not retried as duplicates
+            leases.stop()
+            events.stop()
+
+
+def _main_loop(app, executor: ThreadPoolExecutor, idle_manager: IdleManager, imap_pool: ImapConnectionPool,
+               scheduler: AccountScheduler, outbox: OutboxDispatcher, events: WorkerEvents, leases: LeaseManager,
+               profiler: CycleProfiler):
+    last_cleanup = None
+    while True:
+        received = events.take()
+        if EVENT_RULES in received:
+            # Recompile now rather than in the next poll
+            load_rule_set()
+
+        # Read worker state from DB (SQLAlchemy 2.x compatible)
+        state = db.session.get(WorkerState, 1)
+        if state is None:
+            state = WorkerState(id=1, is_running=True, poll_interval=DEFAULT_INTERVAL)
+            db.session.add(state)
+            db.session.commit()
+
+        # Default base interval for accounts without their own; also bounds
+        # how long triggers wait to be picked up
+        interval = state.poll_interval or DEFAULT_INTERVAL
+        metrics.POLL_INTERVAL_SECONDS.set(interval)
+
+        if not state.is_running:
+            logger.debug("Worker paused – sleeping %ds", interval)
+            db.session.rollback()
+            events.wait(interval)
+            continue
 
-            # Periodic log cleanup
+        # Periodic log cleanup
+        if last_cleanup is None or time.monotonic() - last_cleanup >= interval:
             cleanup_old_logs()
-
-            # Check for triggered accounts (immediate polling requests)
-            triggers = WorkerTrigger.query.all()
-            triggered_account_ids = {t.account_id for t in triggers}
+            last_cleanup = time.monotonic()
+            for host, stats in connection_stats().items():
+                logger.info("Discord %s: %d request(s) over %d connection(s), %d reused",
+                            host, stats["requests"], stats["connections"], stats["reused"])
+                for kind, value in stats.items():
+                    metrics.DISCORD_CONNECTIONS.set(value, host=host, kind=kind)
+
+        cycle_start = time.monotonic()
+        # Samples this cycle if a profile was requested from the maintenance page
+        profiler.begin_cycle(state)
+
+        # Claim or hand over accounts as workers come and go or accounts are added
+        owned_ids = leases.rebalance()
+        metrics.LEASED_ACCOUNTS.set(len(owned_ids))
+
+        # Check for triggered accounts (immediate polling requests); the
+        # triggers of other workers' accounts are left to them
+        discard_orphan_triggers()
+        triggers = WorkerTrigger.query.filter(WorkerTrigger.account_id.in_(owned_ids)).all()
+        triggered_account_ids = {t.account_id for t in triggers}
+        
+        if triggers:
+            logger.info("Processing %d triggered account(s)", len(triggers))
+            triggered = Account.query.filter(
+                Account.id.in_(triggered_account_ids), Account.enabled.is_(True)
+            ).all()
+            for account_id, outcome in poll_accounts(app, executor, triggered, imap_pool,
+                                                     reason="Triggered polling").items():
+                scheduler.record(account_id, outcome)
+            outbox.wake()
             
-            if triggers:
-                logger.info("Processing %d triggered account(s)", len(triggers))
-                for trigger in triggers:
-                    account = Account.query.get(trigger.account_id)
-                    if account and account.enabled:
-                        try:
-                            logger.info("Triggered polling for %s", account.name)
-                            process_account(account)
-                        except Exception:
-                            logger.exception("Error processing triggered account %s", account.name)
-                
-                # Delete all processed triggers
-                for trigger in triggers:
-                    db.session.delete(trigger)
-                db.session.commit()
-
-            # Load active accounts (excluding already triggered ones)
-            accounts = Account.query.filter_by(enabled=True).all()
-
-            for account in accounts:
-                if account.id in triggered_account_ids:
-                    # Already processed in this cycle
-                    continue
-                try:
-                    process_account(account)
-                except Exception:
-                    logger.exception("Unhandled error processing %s", account.name)
-
-            logger.debug("Cycle complete – sleeping %ds", interval)
-            time.sleep(interval)
+            # Delete all processed triggers
+            for trigger in triggers:
+                db.session.delete(trigger)
+            db.session.commit()
+
+        # Load this worker's active accounts and poll the ones that are due
+        accounts = Account.query.filter(
+            Account.id.in_(owned_ids), Account.enabled.is_(True)
+        ).options(selectinload(Account.extra_mailboxes)).all()
+        idle_manager.sync(accounts)
+        scheduler.sync(accounts, interval)
+
+        due_ids = set(scheduler.pop_due())
+        due = []
+        for account in accounts:
+            if account.id not in due_ids:
+                continue
+            if account.id in triggered_account_ids or (
+                idle_manager.is_active(account.id) and not account.extra_mailboxes
+            ):
+                # Already processed in this cycle, or new mail arrives via IDLE wakeups
+                # (which only watch the primary mailbox)
+                scheduler.record(account.id, None)
+            else:
+                due.append(account)
+
+        if due:
+            for account_id, outcome in poll_accounts(app, executor, due, imap_pool).items():
+                scheduler.record(account_id, outcome)
+            outbox.wake()
+
+        # Log out connections of accounts that were disabled, deleted or handed over
+        imap_pool.evict_idle()
+
+        # Release the main thread's snapshot; accounts were updated by the pollers
+        db.session.rollback()
+        metrics.CYCLE_SECONDS.observe(time.monotonic() - cycle_start)
+        profiler.end_cycle()
+
+        sleep_seconds = scheduler.seconds_until_next(interval)
+        logger.debug("%d account(s) polled – next poll due in %.0fs", len(due), sleep_seconds)
+        wait_for_idle_wakeups(app, executor, idle_manager, sleep_seconds, scheduler, outbox, imap_pool)
 
 
 if __name__ == "__main__":